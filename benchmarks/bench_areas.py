@@ -0,0 +1,98 @@
+# Area assignment: address text against coordinates
+#
+# Times the old substring loop over the region's area names (and over every
+# name the matcher knows) against AreaMatcher on synthetic addresses, and a
+# linear point-in-polygon scan over every area against AreaIndex.locate and
+# locate_many on random points inside the Lagos grid bounds. The index must agree with the
+# linear scan on every point. Run from the repository root:
+#
+#   python benchmarks/bench_areas.py --points 100000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lagos_restaurants.areas import Area  # noqa: E402
+from lagos_restaurants.regions import DEFAULT_REGION, Region  # noqa: E402
+
+STREETS = ['Awolowo Road', 'Admiralty Way', 'Allen Avenue', 'Herbert Macaulay Way', 'Adeola Odeku Street',
+           'Lekki-Epe Expressway', 'Ikorodu Road', 'Agege Motor Road', 'Bode Thomas Street']
+
+
+def old_match_area(areas_upper, address):
+    address_upper = address.upper()
+    for area_upper, area in areas_upper:
+        if area_upper in address_upper:
+            return area
+    return None
+
+
+def linear_locate(areas, lat, lng):
+    """Most specific area containing the point, testing every area"""
+    best = None
+    for area in areas:
+        if area.contains(lat, lng) and (best is None or (area.rank, area.size) < (best.rank, best.size)):
+            best = area
+    return best
+
+
+def rate(func, items):
+    """Items per second, best of three runs"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        func(items)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark area assignment")
+    parser.add_argument('--points', type=int, default=100000)
+    args = parser.parse_args()
+
+    region = Region.load(DEFAULT_REGION)
+    index = region.area_index()
+    rng = random.Random(1)
+    bounds = region.bounds
+    points = [(rng.uniform(bounds['south'], bounds['north']), rng.uniform(bounds['west'], bounds['east']))
+              for _ in range(args.points)]
+    names = [area.name for area in index.areas]
+    addresses = [f"{rng.randint(1, 300)} {rng.choice(STREETS)}, {rng.choice(names)}, Lagos, Nigeria"
+                 for _ in range(args.points)]
+
+    linear = [linear_locate(index.areas, lat, lng) for lat, lng in points]
+    assert index.locate_many(points) == linear
+    assert [index.locate(lat, lng) for lat, lng in points] == linear
+    found = sum(1 for area in linear if area is not None)
+
+    areas_upper = [(area.upper(), area) for area in region.areas]
+    region.match_area('')  # build the matcher outside the timings
+    all_names_upper = [(name.upper(), name) for name in region._area_matcher.names]
+    direct = sum(1 for lat, lng in points
+                 if isinstance(index.buckets.get((index._row(lat), index._col(lng))), Area))
+
+    print(f"{len(index.areas)} area polygons, {len(index.buckets):,} buckets; "
+          f"{args.points:,} points ({found:,} inside an area, {direct:,} answered without a polygon test)")
+    print(f"{'lookup':<34} {'per second':>12}")
+    rows = [
+        (f'address: substring loop, {len(areas_upper)} names',
+         lambda items: [old_match_area(areas_upper, a) for a in items], addresses),
+        (f'address: substring loop, {len(all_names_upper)} names',
+         lambda items: [old_match_area(all_names_upper, a) for a in items], addresses),
+        ('address: AreaMatcher', lambda items: [region.match_area(a) for a in items], addresses),
+        ('point: linear polygon scan', lambda items: [linear_locate(index.areas, *p) for p in items], points),
+        ('point: AreaIndex.locate', lambda items: [index.locate(*p) for p in items], points),
+        ('point: AreaIndex.locate_many', index.locate_many, points),
+    ]
+    for name, func, items in rows:
+        print(f"{name:<34} {rate(func, items):>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
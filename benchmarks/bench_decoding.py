@@ -0,0 +1,90 @@
+# Per-response JSON decoding cost for Places responses
+#
+# Times the old path (json.loads(response.text) in the status middleware,
+# the cache middleware and the callback) against places_json() (one parse
+# of response.body shared by all three), with the stdlib parser and with
+# orjson when it is installed, over saved Nearby Search and Place Details
+# payloads. Run from the repository root:
+#
+#   python benchmarks/bench_decoding.py
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import TextResponse  # noqa: E402
+
+from lagos_restaurants import decoding  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURES = {
+    'nearby_search': 'https://maps.googleapis.com/maps/api/place/nearbysearch/json?location=6.45,3.42&radius=3000&key=KEY',
+    'place_details': 'https://maps.googleapis.com/maps/api/place/details/json?place_id=ChIJ&fields=name&key=KEY',
+}
+
+# Consumers of each live response: PlacesStatusMiddleware, PlacesCacheMiddleware, callback
+CONSUMERS = 3
+
+
+def old_path(url, body):
+    response = TextResponse(url=url, body=body, encoding='utf-8')
+    for _ in range(CONSUMERS):
+        json.loads(response.text)
+
+
+def new_path(url, body):
+    response = TextResponse(url=url, body=body, encoding='utf-8')
+    for _ in range(CONSUMERS):
+        decoding.places_json(response)
+
+
+def per_call(func, args, iterations):
+    """Microseconds per call, best of three runs"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(*args)
+        elapsed = (time.perf_counter() - start) / iterations * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Places response decoding")
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    orjson = decoding.orjson
+    print(f"orjson: {'installed' if orjson else 'not installed'}; {CONSUMERS} consumers per live response")
+    print(f"{'payload':<15} {'KiB':>5} {'text+loads':>11} {'loads(bytes)':>12} {'orjson':>8} "
+          f"{'old path':>9} {'new stdlib':>10} {'new orjson':>10} {'speedup':>8}")
+
+    for name, url in FIXTURES.items():
+        with open(os.path.join(FIXTURES_DIR, f"{name}.json"), 'rb') as f:
+            body = f.read()
+
+        # Single parses
+        text_loads = per_call(lambda: json.loads(body.decode('utf-8')), (), args.iterations)
+        bytes_loads = per_call(json.loads, (body,), args.iterations)
+        orjson_loads = per_call(orjson.loads, (body,), args.iterations) if orjson else None
+
+        # Whole response: old three parses against one shared parse
+        old = per_call(old_path, (url, body), args.iterations)
+        decoding.orjson = None
+        new_stdlib = per_call(new_path, (url, body), args.iterations)
+        decoding.orjson = orjson
+        new_fast = per_call(new_path, (url, body), args.iterations) if orjson else None
+
+        best = new_fast if new_fast is not None else new_stdlib
+        print(f"{name:<15} {len(body) / 1024:>5.1f} {text_loads:>9.1f}us {bytes_loads:>10.1f}us "
+              f"{(f'{orjson_loads:.1f}us' if orjson_loads else '-'):>8} {old:>7.1f}us {new_stdlib:>8.1f}us "
+              f"{(f'{new_fast:.1f}us' if new_fast else '-'):>10} {old / best:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
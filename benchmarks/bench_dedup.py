@@ -0,0 +1,91 @@
+# Memory and speed of place_id dedup structures
+#
+# Compares a plain Python set of place_id strings with PlaceIdSet (with
+# and without the Bloom pre-filter) on synthetic 27-character place_ids.
+# Memory is measured with tracemalloc and includes the strings a str set
+# keeps alive; timings are taken in a separate untraced pass. Run from the
+# repository root:
+#
+#   python benchmarks/bench_dedup.py --places 1000000
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lagos_restaurants.dedup import PlaceIdSet  # noqa: E402
+
+ID_CHARS = string.ascii_letters + string.digits + '-_'
+
+
+def place_ids(count, seed):
+    """Synthetic place_ids shaped like Google's (ChIJ + 23 base64url chars)"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield 'ChIJ' + ''.join(rng.choices(ID_CHARS, k=23))
+
+
+def measure_memory(factory, count):
+    """Bytes held after inserting count ids, and the peak while inserting"""
+    tracemalloc.start()
+    seen = factory()
+    for place_id in place_ids(count, seed=1):
+        seen.add(place_id)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(seen) == count
+    return current, peak
+
+
+def measure_speed(factory, ids, hits, misses):
+    """Adds, hit lookups and miss lookups per second, and false hits"""
+    start = time.perf_counter()
+    seen = factory()
+    for place_id in ids:
+        seen.add(place_id)
+    add_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = sum(1 for place_id in hits if place_id in seen)
+    hit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    false_hits = sum(1 for place_id in misses if place_id in seen)
+    miss_seconds = time.perf_counter() - start
+    assert found == len(hits)
+    return len(ids) / add_seconds, len(hits) / hit_seconds, len(misses) / miss_seconds, false_hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark place_id dedup structures")
+    parser.add_argument('--places', type=int, default=1000000, help="place_ids to insert")
+    parser.add_argument('--lookups', type=int, default=200000, help="hit and miss lookups to time")
+    args = parser.parse_args()
+
+    structures = [
+        ('set of str', set),
+        ('PlaceIdSet', PlaceIdSet),
+        ('PlaceIdSet presized', lambda: PlaceIdSet(capacity=args.places)),
+        ('PlaceIdSet + Bloom 1%', lambda: PlaceIdSet(bloom_error_rate=0.01)),
+    ]
+
+    ids = list(place_ids(args.places, seed=1))
+    hits = ids[:args.lookups]
+    misses = list(place_ids(args.lookups, seed=2))
+
+    print(f"{args.places:,} place_ids, {args.lookups:,} hit and miss lookups")
+    print(f"{'structure':<22} {'MiB':>7} {'peak MiB':>8} {'bytes/id':>8} "
+          f"{'adds/s':>10} {'hits/s':>10} {'misses/s':>10} {'false+':>6}")
+    for name, factory in structures:
+        current, peak = measure_memory(factory, args.places)
+        adds, hit_rate, miss_rate, false_hits = measure_speed(factory, ids, hits, misses)
+        print(f"{name:<22} {current / 2 ** 20:>7.1f} {peak / 2 ** 20:>8.1f} {current / args.places:>8.1f} "
+              f"{adds:>10,.0f} {hit_rate:>10,.0f} {miss_rate:>10,.0f} {false_hits:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+# Cost of turning Place Details results into restaurant fields
+#
+# Times the enrichment the spiders did inline before lagos_restaurants.enrichment
+# (copied below as legacy_grid_details and legacy_api_details, helpers and all)
+# against the table-driven FEATURE_ENRICHER and LISTING_ENRICHER, on synthetic
+# Details payloads built from benchmarks/fixtures/place_details.json with
+# randomised features, hours, reviews and addresses. Every record is checked
+# to come out identical before anything is timed. Run from the repository
+# root:
+#
+#   python benchmarks/bench_enrichment.py --payloads 10000
+
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lagos_restaurants.enrichment import FEATURE_ENRICHER, FEATURE_GROUPS, LISTING_ENRICHER  # noqa: E402
+from lagos_restaurants.regions import DEFAULT_REGION, Region  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'place_details.json')
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+HOURS = ['8:00 AM – 10:00 PM', 'Closed', 'Open 24 hours', '11:00 AM – 3:00 PM, 5:00 – 11:00 PM']
+PHONES = ['0803 123 4567', '+234 803 123 4567', '234 1 234 5678', '01-234-5678', None]
+TYPES = ['restaurant', 'food', 'meal_delivery', 'meal_takeaway', 'bar', 'cafe', 'point_of_interest']
+FEATURE_KEYS = sorted({key for fields in FEATURE_GROUPS.values() for _, keys in fields
+                       for key in (keys if isinstance(keys, tuple) else (keys,))})
+
+
+def payloads(count, seed):
+    """(listing, Details result) pairs shaped like the grid spider's"""
+    with open(FIXTURE, 'rb') as f:
+        template = json.load(f)['result']
+    areas = [area for area in Region.load(DEFAULT_REGION).areas]
+    rng = random.Random(seed)
+    for i in range(count):
+        result = {key: value for key, value in template.items() if key not in FEATURE_KEYS}
+        for key in FEATURE_KEYS:
+            roll = rng.random()
+            if roll < 0.4:
+                result[key] = roll < 0.25
+        area = rng.choice(areas)
+        result['formatted_address'] = (f"{rng.randint(1, 300)} Some Street, {area}"
+                                       f"{', ' + str(rng.randint(100000, 109999)) if rng.random() < 0.3 else ''}"
+                                       f", Lagos, Nigeria")
+        result['formatted_phone_number'] = rng.choice(PHONES)
+        if rng.random() < 0.9:
+            result['opening_hours'] = {'weekday_text': [f"{day}: {rng.choice(HOURS)}" for day in DAYS]}
+        else:
+            result.pop('opening_hours', None)
+        result['reviews'] = [dict(review, rating=rng.randint(1, 5))
+                             for review in template.get('reviews', [])[:rng.randint(0, 5)]]
+        listing = {
+            'place_id': f"place-{i}",
+            'name': result.get('name'),
+            'rating': round(rng.uniform(3, 5), 1),
+            'price_level': rng.choice([None, 1, 2, 3, 4]),
+            'types': rng.sample(TYPES, 3),
+        }
+        yield listing, result
+
+
+# The enrichment as it was written inline in the spiders
+
+def legacy_clean_phone_number(phone):
+    if not phone:
+        return None
+    import re
+    cleaned = re.sub(r'[^\d+]', '', phone)
+    if cleaned.startswith('+234'):
+        return cleaned
+    elif cleaned.startswith('234'):
+        return '+' + cleaned
+    elif cleaned.startswith('0') and len(cleaned) == 11:
+        return '+234' + cleaned[1:]
+    return phone
+
+
+def legacy_extract_location_details(address, region):
+    if not address:
+        return {}
+    details = {
+        'full_address': address,
+        'area': None,
+        'state': None,
+        'country': None,
+        'postal_code': None
+    }
+    details['area'] = region.match_area(address)
+    details['state'] = region.match_state(address)
+    address_upper = address.upper()
+    if 'NIGERIA' in address_upper:
+        details['country'] = 'Nigeria'
+    import re
+    postal_match = re.search(r'\b\d{6}\b', address)
+    if postal_match:
+        details['postal_code'] = postal_match.group()
+    return details
+
+
+def legacy_interpret_price_level(price_level):
+    price_map = {
+        0: 'Free',
+        1: 'Inexpensive (₦)',
+        2: 'Moderate (₦₦)',
+        3: 'Expensive (₦₦₦)',
+        4: 'Very Expensive (₦₦₦₦)'
+    }
+    return price_map.get(price_level, 'Price not available')
+
+
+def legacy_parse_opening_hours(weekday_text_list):
+    if not weekday_text_list:
+        return {}
+    parsed_hours = {}
+    days_map = {
+        'Monday': 'monday', 'Tuesday': 'tuesday', 'Wednesday': 'wednesday',
+        'Thursday': 'thursday', 'Friday': 'friday', 'Saturday': 'saturday', 'Sunday': 'sunday'
+    }
+    for day_text in weekday_text_list:
+        for day_name, day_key in days_map.items():
+            if day_text.startswith(day_name):
+                time_part = day_text.replace(f'{day_name}: ', '')
+                if 'Closed' in time_part:
+                    parsed_hours[day_key] = {'status': 'closed', 'hours': None}
+                elif 'Open 24 hours' in time_part:
+                    parsed_hours[day_key] = {'status': 'open_24h', 'hours': '24 hours'}
+                else:
+                    parsed_hours[day_key] = {'status': 'open', 'hours': time_part}
+                break
+    return parsed_hours
+
+
+def legacy_check_24_7_operation(weekday_text_list):
+    if not weekday_text_list:
+        return False
+    open_24h_count = sum(1 for day_text in weekday_text_list if 'Open 24 hours' in day_text)
+    return open_24h_count == 7
+
+
+def legacy_common(restaurant, result, region):
+    restaurant.update({
+        'formatted_address': result.get('formatted_address'),
+        'phone_number': result.get('formatted_phone_number'),
+        'phone_number_cleaned': legacy_clean_phone_number(result.get('formatted_phone_number')),
+        'website': result.get('website'),
+        'google_url': f"https://www.google.com/maps/place/?q=place_id:{restaurant['place_id']}"
+    })
+    restaurant['location_details'] = legacy_extract_location_details(result.get('formatted_address'), region)
+    restaurant['price_range_text'] = legacy_interpret_price_level(restaurant.get('price_level'))
+    opening_hours = result.get('opening_hours', {})
+    restaurant['opening_hours'] = opening_hours.get('weekday_text', [])
+    restaurant['opening_hours_parsed'] = legacy_parse_opening_hours(opening_hours.get('weekday_text', []))
+    restaurant['is_open_24_7'] = legacy_check_24_7_operation(opening_hours.get('weekday_text', []))
+    reviews = result.get('reviews', [])
+    restaurant['all_reviews'] = []
+    restaurant['reviews_count'] = len(reviews)
+    for review in reviews:
+        review_data = {
+            'author_name': review.get('author_name'),
+            'author_url': review.get('author_url'),
+            'language': review.get('language'),
+            'profile_photo_url': review.get('profile_photo_url'),
+            'rating': review.get('rating'),
+            'relative_time_description': review.get('relative_time_description'),
+            'text': review.get('text'),
+            'time': review.get('time'),
+            'translated': review.get('translated', False)
+        }
+        restaurant['all_reviews'].append(review_data)
+    restaurant['editorial_summary'] = result.get('editorial_summary', {}).get('overview')
+    restaurant['google_maps_url'] = result.get('url')
+    return reviews
+
+
+def legacy_reviews_summary(restaurant, reviews):
+    if reviews:
+        ratings = [r.get('rating', 0) for r in reviews if r.get('rating')]
+        if ratings:
+            restaurant['reviews_summary'] = {
+                'total_reviews_fetched': len(reviews),
+                'avg_rating_from_reviews': sum(ratings) / len(ratings),
+                'rating_distribution': {
+                    '5_star': len([r for r in ratings if r == 5]),
+                    '4_star': len([r for r in ratings if r == 4]),
+                    '3_star': len([r for r in ratings if r == 3]),
+                    '2_star': len([r for r in ratings if r == 2]),
+                    '1_star': len([r for r in ratings if r == 1])
+                }
+            }
+
+
+def legacy_grid_details(restaurant, result, region):
+    reviews = legacy_common(restaurant, result, region)
+    restaurant['service_options'] = {
+        'delivery': result.get('serves_delivery') or result.get('delivery'),
+        'takeout': result.get('serves_takeout') or result.get('takeout'),
+        'dine_in': result.get('serves_dine_in'),
+        'curbside_pickup': result.get('curbside_pickup'),
+        'reservable': result.get('reservable')
+    }
+    restaurant['accessibility'] = {
+        'wheelchair_accessible_entrance': result.get('wheelchair_accessible_entrance'),
+        'restroom': result.get('restroom')
+    }
+    restaurant['dining_options'] = {
+        'serves_breakfast': result.get('serves_breakfast'),
+        'serves_lunch': result.get('serves_lunch'),
+        'serves_dinner': result.get('serves_dinner'),
+        'serves_brunch': result.get('serves_brunch'),
+        'serves_beer': result.get('serves_beer'),
+        'serves_wine': result.get('serves_wine'),
+        'serves_vegetarian_food': result.get('serves_vegetarian_food')
+    }
+    restaurant['atmosphere_features'] = {
+        'outdoor_seating': result.get('outdoor_seating'),
+        'live_music': result.get('live_music'),
+        'good_for_children': result.get('good_for_children'),
+        'good_for_groups': result.get('good_for_groups'),
+        'menu_for_children': result.get('menu_for_children'),
+        'lgbtq_friendly': result.get('lgbtq_friendly')
+    }
+    restaurant['offerings'] = {
+        'serves_coffee': result.get('serves_coffee'),
+        'serves_dessert': result.get('serves_dessert'),
+        'serves_happy_hour_food': result.get('serves_happy_hour_food'),
+        'serves_late_night_food': result.get('serves_late_night_food'),
+        'serves_cocktails': result.get('serves_cocktails'),
+        'allows_dogs': result.get('allows_dogs')
+    }
+    restaurant['parking'] = {
+        'wheelchair_accessible_parking': result.get('has_wheelchair_accessible_parking'),
+        'wheelchair_accessible_entrance': result.get('has_wheelchair_accessible_entrance'),
+        'wheelchair_accessible_restroom': result.get('has_wheelchair_accessible_restroom'),
+        'wheelchair_accessible_seating': result.get('has_wheelchair_accessible_seating')
+    }
+    restaurant['children_features'] = {
+        'allows_children': result.get('allows_children'),
+        'high_chairs': result.get('has_high_chairs'),
+        'changing_table': result.get('has_changing_table'),
+        'kids_menu': result.get('has_kids_menu'),
+        'good_for_kids': result.get('good_for_kids'),
+        'playground': result.get('has_playground')
+    }
+    restaurant['planning'] = {
+        'accepts_reservations': result.get('accepts_reservations'),
+        'requires_reservations': result.get('requires_reservations'),
+        'accepts_credit_cards': result.get('accepts_credit_cards'),
+        'accepts_debit_cards': result.get('accepts_debit_cards'),
+        'accepts_cash_only': result.get('accepts_cash_only'),
+        'accepts_nfc': result.get('accepts_nfc')
+    }
+    restaurant['highlights'] = []
+    if restaurant['service_options']['delivery']:
+        restaurant['highlights'].append('Delivery available')
+    if restaurant['service_options']['takeout']:
+        restaurant['highlights'].append('Takeout available')
+    if restaurant['service_options']['dine_in']:
+        restaurant['highlights'].append('Dine-in available')
+    if restaurant['service_options']['reservable']:
+        restaurant['highlights'].append('Reservations accepted')
+    if restaurant['service_options']['curbside_pickup']:
+        restaurant['highlights'].append('Curbside pickup')
+    if restaurant['accessibility']['wheelchair_accessible_entrance']:
+        restaurant['highlights'].append('Wheelchair accessible')
+    if restaurant['dining_options']['serves_vegetarian_food']:
+        restaurant['highlights'].append('Vegetarian options')
+    if restaurant['dining_options']['serves_beer']:
+        restaurant['highlights'].append('Serves beer')
+    if restaurant['dining_options']['serves_wine']:
+        restaurant['highlights'].append('Serves wine')
+    if restaurant['atmosphere_features']['outdoor_seating']:
+        restaurant['highlights'].append('Outdoor seating')
+    if restaurant['atmosphere_features']['live_music']:
+        restaurant['highlights'].append('Live music')
+    if restaurant['atmosphere_features']['good_for_children']:
+        restaurant['highlights'].append('Good for kids')
+    if restaurant['atmosphere_features']['good_for_groups']:
+        restaurant['highlights'].append('Good for groups')
+    if restaurant['atmosphere_features']['lgbtq_friendly']:
+        restaurant['highlights'].append('LGBTQ+ friendly')
+    if restaurant['offerings']['serves_coffee']:
+        restaurant['highlights'].append('Serves coffee')
+    if restaurant['offerings']['serves_dessert']:
+        restaurant['highlights'].append('Serves dessert')
+    if restaurant['offerings']['serves_happy_hour_food']:
+        restaurant['highlights'].append('Happy hour food')
+    if restaurant['offerings']['serves_late_night_food']:
+        restaurant['highlights'].append('Late night food')
+    if restaurant['offerings']['serves_cocktails']:
+        restaurant['highlights'].append('Serves cocktails')
+    if restaurant['offerings']['allows_dogs']:
+        restaurant['highlights'].append('Dog-friendly')
+    if restaurant['children_features']['good_for_kids']:
+        restaurant['highlights'].append('Kid-friendly')
+    if restaurant['children_features']['kids_menu']:
+        restaurant['highlights'].append('Kids menu')
+    if restaurant['children_features']['high_chairs']:
+        restaurant['highlights'].append('High chairs available')
+    if restaurant['children_features']['playground']:
+        restaurant['highlights'].append('Has playground')
+    if restaurant['planning']['accepts_reservations']:
+        restaurant['highlights'].append('Accepts reservations')
+    if restaurant['planning']['accepts_credit_cards']:
+        restaurant['highlights'].append('Accepts credit cards')
+    if restaurant['planning']['accepts_cash_only']:
+        restaurant['highlights'].append('Cash only')
+    legacy_reviews_summary(restaurant, reviews)
+    return restaurant
+
+
+def legacy_api_details(restaurant, result, region):
+    reviews = legacy_common(restaurant, result, region)
+    restaurant['highlights'] = []
+    if restaurant.get('rating') and restaurant['rating'] >= 4.5:
+        restaurant['highlights'].append('Highly rated')
+    if restaurant.get('price_level') == 1:
+        restaurant['highlights'].append('Budget-friendly')
+    elif restaurant.get('price_level') == 4:
+        restaurant['highlights'].append('Fine dining')
+    types = restaurant.get('types', [])
+    if 'meal_delivery' in types:
+        restaurant['highlights'].append('Delivery available')
+    if 'meal_takeaway' in types:
+        restaurant['highlights'].append('Takeout available')
+    if 'bar' in types:
+        restaurant['highlights'].append('Bar available')
+    if 'cafe' in types:
+        restaurant['highlights'].append('Cafe')
+    legacy_reviews_summary(restaurant, reviews)
+    return restaurant
+
+
+def run_once(func, cases, region):
+    """Seconds to enrich every case once, with the collector off (as timeit does)"""
+    listings = [dict(listing) for listing, _ in cases]
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for listing, (_, result) in zip(listings, cases):
+            func(listing, result, region)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def timed(funcs, cases, region, repeat):
+    """Best time of each function, runs interleaved so machine noise hits both alike"""
+    best = [None] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            elapsed = run_once(func, cases, region)
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Place Details enrichment")
+    parser.add_argument('--payloads', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    region = Region.load(DEFAULT_REGION)
+    cases = list(payloads(args.payloads, seed=1))
+    profiles = [
+        ('feature (grid)', legacy_grid_details, FEATURE_ENRICHER.enrich),
+        ('listing (api)', legacy_api_details, LISTING_ENRICHER.enrich),
+    ]
+
+    print(f"{args.payloads:,} synthetic Details payloads")
+    print(f"{'profile':<16} {'legacy':>9} {'engine':>9} {'us/place':>15} {'speedup':>8}")
+    for name, legacy, engine in profiles:
+        for listing, result in cases:
+            expected = legacy(dict(listing), copy.deepcopy(result), region)
+            actual = engine(dict(listing), copy.deepcopy(result), region)
+            assert json.dumps(actual) == json.dumps(expected), listing['place_id']
+
+        old, new = timed([legacy, engine], cases, region, args.repeat)
+        per_place = f"{old / len(cases) * 1e6:.1f} -> {new / len(cases) * 1e6:.1f}"
+        print(f"{name:<16} {old * 1000:>7.1f}ms {new * 1000:>7.1f}ms {per_place:>15} {old / new:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
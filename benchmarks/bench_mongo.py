@@ -0,0 +1,106 @@
+# MongoDB upsert throughput: one update_one per place against bulk writes
+#
+# Enriches synthetic Details payloads (the ones bench_enrichment.py uses)
+# into grid records, maps them with mongo.restaurant_update and writes them
+# to a scratch collection, first as new documents and then again as
+# updates of existing ones. Upserts are sent one update_one at a time (what
+# a naive pipeline does) and as unordered bulk_write batches of several
+# sizes (what MongoPipeline does). Needs pymongo; pass --uri for a real
+# server, or --mock to run in-process on mongomock. mongomock has no round
+# trips to save and scans the collection on every upsert, so it only checks
+# that the writes work; measure against a server. Run from the repository
+# root:
+#
+#   python benchmarks/bench_mongo.py --uri mongodb://localhost:27017 --places 20000
+#   python benchmarks/bench_mongo.py --mock --places 500
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_enrichment import payloads  # noqa: E402
+from lagos_restaurants import mongo  # noqa: E402
+from lagos_restaurants.enrichment import FEATURE_ENRICHER  # noqa: E402
+from lagos_restaurants.regions import DEFAULT_REGION, Region  # noqa: E402
+
+
+def records(count, seed):
+    region = Region.load(DEFAULT_REGION)
+    bounds = region.bounds
+    rng = random.Random(seed)
+    for listing, result in payloads(count, seed):
+        restaurant = dict(listing,
+                          latitude=rng.uniform(bounds['south'], bounds['north']),
+                          longitude=rng.uniform(bounds['west'], bounds['east']),
+                          user_ratings_total=rng.randint(0, 2000),
+                          business_status='OPERATIONAL')
+        yield FEATURE_ENRICHER.enrich(restaurant, result, region)
+
+
+def one_by_one(collection, updates):
+    for filter_, update in updates:
+        collection.update_one(filter_, update, upsert=True)
+
+
+def bulk(batch_size):
+    def write(collection, updates):
+        for start in range(0, len(updates), batch_size):
+            collection.bulk_write([mongo.pymongo.UpdateOne(filter_, update, upsert=True)
+                                   for filter_, update in updates[start:start + batch_size]], ordered=False)
+    return write
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MongoDB upserts of restaurant records")
+    parser.add_argument('--uri', help="MongoDB server to write to (a scratch database is used and dropped)")
+    parser.add_argument('--mock', action='store_true', help="write to an in-process mongomock client")
+    parser.add_argument('--places', type=int, default=5000)
+    parser.add_argument('--batches', default='100,500,1000')
+    args = parser.parse_args()
+
+    if mongo.pymongo is None:
+        sys.exit("pymongo is not installed")
+    if args.mock:
+        import mongomock
+        client = mongomock.MongoClient()
+    elif args.uri:
+        client = mongo.pymongo.MongoClient(args.uri)
+    else:
+        sys.exit("pass --uri mongodb://... or --mock")
+    database = client['bench_lagos_restaurant_directory']
+
+    places = list(records(args.places, seed=1))
+    now = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    updates = [mongo.restaurant_update(record, now) for record in places]
+    mapping = len(places) / (time.perf_counter() - start)
+
+    modes = [('update_one per place', one_by_one)]
+    modes += [(f'bulk_write, batches of {size}', bulk(size)) for size in map(int, args.batches.split(','))]
+
+    print(f"{len(places):,} places, {'mongomock' if args.mock else args.uri}; "
+          f"restaurant_update maps {mapping:,.0f} places/s")
+    print(f"{'upserts':<28} {'insert docs/s':>14} {'update docs/s':>14}")
+    try:
+        for name, write in modes:
+            database.drop_collection('restaurants')
+            collection = database['restaurants']
+            mongo.create_indexes(collection)
+            rates = []
+            for _ in ('insert', 'update'):
+                start = time.perf_counter()
+                write(collection, updates)
+                rates.append(len(updates) / (time.perf_counter() - start))
+            assert collection.count_documents({}) == len(places)
+            print(f"{name:<28} {rates[0]:>14,.0f} {rates[1]:>14,.0f}")
+    finally:
+        client.drop_database('bench_lagos_restaurant_directory')
+
+
+if __name__ == '__main__':
+    main()
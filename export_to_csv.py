@@ -1,15 +1,529 @@
 #!/usr/bin/env python3
 """
 Restaurant Data CSV Exporter
-Converts JSON output from Google Places spiders to CSV format
+Converts JSON output from Google Places spiders to CSV format, or to typed
+Parquet with --format parquet (pip install pyarrow)
+
+Input is streamed record by record (JSON array or JSON Lines, plain, .gz or
+.zst, or a sharded feed directory), so memory stays flat however large the
+dump is.
 """
 
-import json
 import csv
 import sys
+import time
 import argparse
+import contextlib
+import itertools
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from lagos_restaurants.enrichment import FEATURE_GROUPS
+from lagos_restaurants.records import TruncatedInput, iter_part, iter_records, split_records
+
+
+def peak_rss_mb(who=None):
+    """Peak resident memory of this process (or its largest finished child) in MB, None where it can't be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def report(rows, started, processes=1):
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed else 0
+    peak = peak_rss_mb()
+    memory = f", peak RSS {peak:.0f} MB" if peak is not None else ''
+    # Only a --workers run has worker processes to speak of
+    worker_peak = peak_rss_mb(resource.RUSAGE_CHILDREN) if processes > 1 and resource is not None else None
+    if worker_peak:
+        memory += f", {processes} workers up to {worker_peak:.0f} MB each"
+    print(f"Wrote {rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s{memory})")
+
+
+def warn_truncated(message):
+    print(f"⚠️ Warning: {message}; exporting the records before the cut")
+
+
+def truncation_handler(allow_truncated):
+    """on_truncated for the record readers: warn with --allow-truncated, else fail (TruncatedInput)"""
+    return warn_truncated if allow_truncated else None
+
+
+def open_records(json_file, allow_truncated=False):
+    """Stream of the records in json_file, or None if it has none"""
+    restaurants = iter_records(str(json_file), truncation_handler(allow_truncated))
+    first = next(restaurants, None)
+    if first is None:
+        return None
+    return itertools.chain([first], restaurants)
+
+
+# Columns read from nested groups of a record, by dotted path (group.field)
+NESTED_COLUMNS = {
+        # Location details
+        'area': 'location_details.area',
+        'state': 'location_details.state', 
+        'country': 'location_details.country',
+        'postal_code': 'location_details.postal_code',
+        
+        # Service options
+        'delivery': 'service_options.delivery',
+        'takeout': 'service_options.takeout',
+        'dine_in': 'service_options.dine_in',
+        'curbside_pickup': 'service_options.curbside_pickup',
+        'reservable': 'service_options.reservable',
+        
+        # Accessibility
+        'wheelchair_accessible_entrance': 'accessibility.wheelchair_accessible_entrance',
+        'restroom_available': 'accessibility.restroom',
+        
+        # Dining options
+        'serves_breakfast': 'dining_options.serves_breakfast',
+        'serves_lunch': 'dining_options.serves_lunch',
+        'serves_dinner': 'dining_options.serves_dinner',
+        'serves_brunch': 'dining_options.serves_brunch',
+        'serves_beer': 'dining_options.serves_beer',
+        'serves_wine': 'dining_options.serves_wine',
+        'serves_vegetarian_food': 'dining_options.serves_vegetarian_food',
+        
+        # Atmosphere features
+        'outdoor_seating': 'atmosphere_features.outdoor_seating',
+        'live_music': 'atmosphere_features.live_music',
+        'good_for_children': 'atmosphere_features.good_for_children',
+        'good_for_groups': 'atmosphere_features.good_for_groups',
+        'menu_for_children': 'atmosphere_features.menu_for_children',
+        'lgbtq_friendly': 'atmosphere_features.lgbtq_friendly',
+        
+        # Offerings
+        'serves_coffee': 'offerings.serves_coffee',
+        'serves_dessert': 'offerings.serves_dessert',
+        'serves_happy_hour_food': 'offerings.serves_happy_hour_food',
+        'serves_late_night_food': 'offerings.serves_late_night_food',
+        'serves_cocktails': 'offerings.serves_cocktails',
+        'allows_dogs': 'offerings.allows_dogs',
+        
+        # Children features
+        'allows_children': 'children_features.allows_children',
+        'high_chairs': 'children_features.high_chairs',
+        'changing_table': 'children_features.changing_table',
+        'kids_menu': 'children_features.kids_menu',
+        'good_for_kids': 'children_features.good_for_kids',
+        'playground': 'children_features.playground',
+        
+        # Planning
+        'accepts_reservations': 'planning.accepts_reservations',
+        'requires_reservations': 'planning.requires_reservations',
+        'accepts_credit_cards': 'planning.accepts_credit_cards',
+        'accepts_debit_cards': 'planning.accepts_debit_cards',
+        'accepts_cash_only': 'planning.accepts_cash_only',
+        'accepts_nfc': 'planning.accepts_nfc',
+        
+        # Reviews summary
+        'avg_rating_from_reviews': 'reviews_summary.avg_rating_from_reviews',
+        'total_reviews_fetched': 'reviews_summary.total_reviews_fetched',
+}
+
+REVIEW_COLUMNS = [f'review_{i}_{field}' for i in range(1, 6) for field in ('author', 'rating', 'text')]
+
+# Review column field -> key of the review in all_reviews, and text length kept
+REVIEW_FIELDS = {'author': 'author_name', 'rating': 'rating', 'text': 'text'}
+REVIEW_TEXT_LIMIT = 500
+
+
+# Column accessors: compiled once per column, called once per cell. Each
+# returns the cell as written to the CSV: '' for missing values, Yes/No for
+# booleans, comma-joined lists for top-level list fields.
+
+def top_level_column(key):
+    def cell(restaurant):
+        value = restaurant.get(key)
+        if value is None:
+            return ''
+        if value is True:
+            return 'Yes'
+        if value is False:
+            return 'No'
+        if isinstance(value, list):
+            return ', '.join(str(v) for v in value if v)
+        return value
+    return cell
+
+
+def nested_column(key, path):
+    group, field = path.split('.')
+    top_level = top_level_column(key)
+
+    def cell(restaurant):
+        # A top-level field of the same name wins over the nested one
+        if key in restaurant:
+            return top_level(restaurant)
+        values = restaurant.get(group)
+        if not isinstance(values, dict):
+            return ''
+        value = values.get(field)
+        if value is None:
+            return ''
+        if value is True:
+            return 'Yes'
+        if value is False:
+            return 'No'
+        return value
+    return cell
+
+
+def review_column(column):
+    _, number, field = column.split('_')
+    index = int(number) - 1
+    review_key = REVIEW_FIELDS[field]
+    limit = REVIEW_TEXT_LIMIT if field == 'text' else None
+
+    def cell(restaurant):
+        reviews = restaurant.get('all_reviews')
+        if not reviews or len(reviews) <= index:
+            return ''
+        value = reviews[index].get(review_key)
+        if value is None:
+            return ''
+        if value is True:
+            return 'Yes'
+        if value is False:
+            return 'No'
+        if limit is not None:
+            return value[:limit]
+        return value
+    return cell
+
+
+def compile_columns(columns):
+    """Accessor per column, in order; a row is [cell(restaurant) for cell in plan]"""
+    plan = []
+    for column in columns:
+        if column in NESTED_COLUMNS:
+            plan.append(nested_column(column, NESTED_COLUMNS[column]))
+        elif column in REVIEW_COLUMNS:
+            plan.append(review_column(column))
+        else:
+            plan.append(top_level_column(column))
+    return plan
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """Path of a temporary file next to path, moved over path only if the block succeeds
+
+    A failed or interrupted export leaves the previous file (or none) rather
+    than a partial one. A block that wrote nothing leaves path alone.
+    """
+    path = str(path)
+    directory, name = os.path.split(os.path.abspath(path))
+    temporary = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    try:
+        yield temporary
+        if os.path.exists(temporary):
+            os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def write_rows(restaurants, csv_file, columns, header=True):
+    """Write restaurants to csv_file as columns; returns the row count"""
+    plan = compile_columns(columns)
+    rows = 0
+    with atomic_output(csv_file) as temporary, open(temporary, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(columns)
+        for restaurant in restaurants:
+            writer.writerow([cell(restaurant) for cell in plan])
+            rows += 1
+    return rows
+
+
+# --format parquet: the same columns with their types kept. Numbers stay
+# numbers, booleans stay booleans (null where Google doesn't say), list
+# fields are list<string>, the feature columns of each group are one struct
+# column with the group's fields as the record has them, and the review
+# columns are one list of review structs (full text). Values are gathered
+# column by column and written every ROW_GROUP_SIZE records as a row group,
+# so memory is bounded by the row group size (about 200 MB at 10,000 rows
+# with reviews); repeated strings are dictionary encoded.
+
+ROW_GROUP_SIZE = 10000
+FLOAT_COLUMNS = {'rating', 'latitude', 'longitude', 'avg_rating_from_reviews'}
+INT_COLUMNS = {'user_ratings_total', 'price_level', 'reviews_count', 'total_reviews_fetched'}
+LIST_COLUMNS = {'highlights', 'types'}
+DICTIONARY_COLUMNS = {'price_range_text', 'business_status', 'source', 'area', 'state', 'country'}
+REVIEW_FIELDS_TYPED = [('author_name', 'string'), ('rating', 'int32'), ('text', 'string'),
+                       ('time', 'int64'), ('language', 'string')]
+
+
+def arrow_type(column):
+    if column in FLOAT_COLUMNS:
+        return pyarrow.float64()
+    if column in INT_COLUMNS:
+        return pyarrow.int64()
+    if column in LIST_COLUMNS:
+        return pyarrow.list_(pyarrow.string())
+    if column in DICTIONARY_COLUMNS:
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    if column == 'is_open_24_7':
+        return pyarrow.bool_()
+    return pyarrow.string()
+
+
+def typed_column(column):
+    path = NESTED_COLUMNS.get(column)
+    if column in LIST_COLUMNS:
+        def cell(restaurant):
+            value = restaurant.get(column)
+            return [str(v) for v in value if v] if isinstance(value, list) else None
+    elif path is None:
+        def cell(restaurant):
+            return restaurant.get(column)
+    else:
+        group, field = path.split('.')
+
+        def cell(restaurant):
+            if column in restaurant:
+                return restaurant[column]
+            values = restaurant.get(group)
+            return values.get(field) if isinstance(values, dict) else None
+    return cell
+
+
+def group_field_column(group, field):
+    def cell(restaurant):
+        values = restaurant.get(group)
+        return values.get(field) if isinstance(values, dict) else None
+    return cell
+
+
+REVIEW_KEYS = [field for field, _ in REVIEW_FIELDS_TYPED]
+
+
+def reviews_column(restaurant):
+    # Tuples in REVIEW_FIELDS_TYPED order, so whole review dicts aren't held until the row group is written
+    reviews = restaurant.get('all_reviews')
+    if not reviews:
+        return None
+    return [tuple(review.get(key) for key in REVIEW_KEYS) for review in reviews]
+
+
+def compile_parquet_columns(columns):
+    """(arrow field, accessors) per Parquet column of the CSV columns, in order
+
+    A struct column has one accessor per field; other columns have one.
+    """
+    plan = []
+    group_fields = {}
+    for column in columns:
+        if column in REVIEW_COLUMNS:
+            if column == REVIEW_COLUMNS[0]:
+                plan.append(('reviews', [reviews_column]))
+            continue
+        group, _, field = NESTED_COLUMNS.get(column, '').partition('.')
+        if group in FEATURE_GROUPS:
+            # One struct per group, at the position of its first column
+            if group not in group_fields:
+                group_fields[group] = []
+                plan.append((group, []))
+            group_fields[group].append(field)
+            continue
+        plan.append((column, [typed_column(column)]))
+
+    compiled = []
+    for name, cells in plan:
+        if name == 'reviews':
+            review = pyarrow.struct([(field, getattr(pyarrow, kind)()) for field, kind in REVIEW_FIELDS_TYPED])
+            arrow_field = pyarrow.field(name, pyarrow.list_(review))
+        elif name in group_fields:
+            arrow_field = pyarrow.field(name, pyarrow.struct([(field, pyarrow.bool_()) for field in group_fields[name]]))
+            cells = [group_field_column(name, field) for field in group_fields[name]]
+        else:
+            arrow_field = pyarrow.field(name, arrow_type(name))
+        compiled.append((arrow_field, cells))
+    return compiled
+
+
+def dictionary_columns(schema):
+    return [field.name for field in schema if field.name in DICTIONARY_COLUMNS]
+
+
+def write_parquet(restaurants, parquet_file, columns, row_group_size=ROW_GROUP_SIZE):
+    """Write restaurants to parquet_file as typed columns; returns the row count"""
+    if pyarrow is None:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+    plan = compile_parquet_columns(columns)
+    schema = pyarrow.schema([field for field, _ in plan])
+    # One value list per accessor, struct fields included
+    cells = [cell for _, accessors in plan for cell in accessors]
+    rows = 0
+    with atomic_output(parquet_file) as temporary, \
+            pyarrow.parquet.ParquetWriter(temporary, schema, compression='zstd',
+                                          use_dictionary=dictionary_columns(schema)) as writer:
+        batch = [[] for _ in cells]
+        for restaurant in restaurants:
+            for values, cell in zip(batch, cells):
+                values.append(cell(restaurant))
+            rows += 1
+            if len(batch[0]) == row_group_size:
+                write_row_group(writer, plan, schema, batch)
+                batch = [[] for _ in cells]
+        if batch[0]:
+            write_row_group(writer, plan, schema, batch)
+    return rows
+
+
+def write_row_group(writer, plan, schema, batch):
+    arrays = []
+    values = iter(batch)
+    for field, accessors in plan:
+        if pyarrow.types.is_struct(field.type):
+            children = [pyarrow.array(next(values), type=child.type) for child in field.type]
+            arrays.append(pyarrow.StructArray.from_arrays(children, fields=list(field.type)))
+        else:
+            arrays.append(pyarrow.array(next(values), type=field.type))
+    writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema), row_group_size=len(batch[0]))
+
+
+def write_output(restaurants, output, columns, output_format='csv', header=True):
+    if output_format == 'parquet':
+        return write_parquet(restaurants, output, columns)
+    return write_rows(restaurants, output, columns, header)
+
+
+# --workers: the input is cut into parts (shards, byte ranges of JSON Lines;
+# see records.split_records), several per worker so uneven parts even out,
+# and each part is converted in a process of its own. The part files are
+# appended to the output in input order as they finish (CSV bytes copied,
+# Parquet row groups moved over), or kept as they are with --sharded (one
+# complete file per part).
+
+PARTS_PER_WORKER = 4
+
+
+def export_part(part, output, columns, output_format, header, allow_truncated=False):
+    return write_output(iter_part(part, truncation_handler(allow_truncated)), output, columns, output_format,
+                        header)
+
+
+def sharded_path(csv_file, index):
+    root, ext = os.path.splitext(str(csv_file))
+    return f"{root}-{index:05d}{ext or '.csv'}"
+
+
+def append_parquet(writer, part_file):
+    part = pyarrow.parquet.ParquetFile(part_file)
+    for i in range(part.num_row_groups):
+        writer.write_table(part.read_row_group(i))
+    part.close()
+
+
+def write_rows_parallel(parts, csv_file, columns, workers, sharded=False, output_format='csv',
+                        allow_truncated=False):
+    """Convert parts in a pool of workers processes; returns the row count
+
+    Every output file is written under a temporary name and renamed when
+    complete; if any part fails, the shards written by this run are removed.
+    """
+    if sharded:
+        outputs = [sharded_path(csv_file, i) for i in range(len(parts))]
+        futures = []
+        try:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(export_part, part, output, columns, output_format, True, allow_truncated)
+                           for part, output in zip(parts, outputs)]
+                counts = [future.result() for future in futures]
+        except BaseException:
+            for future, output in zip(futures, outputs):
+                if future.done() and not future.cancelled() and future.exception() is None \
+                        and os.path.exists(output):
+                    os.remove(output)
+            raise
+        # Parts without records (e.g. empty shards) leave no file
+        for output, count in zip(outputs, counts):
+            if not count:
+                os.remove(output)
+        return sum(counts)
+
+    scratch = tempfile.mkdtemp(prefix='.export-', dir=os.path.dirname(os.path.abspath(csv_file)))
+    try:
+        outputs = [os.path.join(scratch, f"part-{i:05d}.{output_format}") for i in range(len(parts))]
+        rows = 0
+        writer = None
+        with ProcessPoolExecutor(workers) as pool, atomic_output(csv_file) as temporary:
+            futures = [pool.submit(export_part, part, output, columns, output_format, False, allow_truncated)
+                       for part, output in zip(parts, outputs)]
+            if output_format == 'csv':
+                f = open(temporary, 'w', newline='', encoding='utf-8')
+                csv.writer(f).writerow(columns)
+            try:
+                # Appending in submission order keeps the input order; later parts keep converting meanwhile
+                for future, output in zip(futures, outputs):
+                    count = future.result()
+                    rows += count
+                    if output_format == 'csv':
+                        with open(output, 'r', newline='', encoding='utf-8') as part_file:
+                            shutil.copyfileobj(part_file, f, 1 << 20)
+                    elif count:
+                        if writer is None:
+                            schema = pyarrow.parquet.read_schema(output)
+                            writer = pyarrow.parquet.ParquetWriter(temporary, schema, compression='zstd',
+                                                                   use_dictionary=dictionary_columns(schema))
+                        append_parquet(writer, output)
+                    os.remove(output)
+            finally:
+                if output_format == 'csv':
+                    f.close()
+                elif writer is not None:
+                    writer.close()
+        return rows
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def export_rows(json_file, csv_file, columns, workers=1, sharded=False, output_format='csv',
+                allow_truncated=False):
+    """Write the records of json_file to csv_file; returns the row count, 0 (and no file) if there are
+    none, and the number of processes that converted it
+
+    Input cut off part-way through raises TruncatedInput, unless
+    allow_truncated (the records before the cut are exported, with a warning).
+    """
+    if workers > 1:
+        parts = split_records(str(json_file), workers * PARTS_PER_WORKER)
+        if len(parts) > 1:
+            rows = write_rows_parallel(parts, csv_file, columns, workers, sharded, output_format, allow_truncated)
+            if not rows and not sharded and os.path.exists(csv_file):
+                os.remove(csv_file)
+            return rows, min(workers, len(parts))
+        print("Input can't be split (one compressed file, a JSON array or a small file); converting it in one process")
+
+    restaurants = open_records(json_file, allow_truncated)
+    if restaurants is None:
+        return 0, 1
+    return write_output(restaurants, csv_file, columns, output_format), 1
+
+
 class RestaurantCSVExporter:
     def __init__(self):
         # Define CSV columns and their mappings from JSON
@@ -55,9 +569,21 @@ class RestaurantCSVExporter:
             'is_open_24_7', 'highlights', 'editorial_summary', 'google_maps_url',
             'photo_url', 'types'
         ]
+        
+        # Key metrics only, for --summary
+        self.summary_columns = [
+            'name', 'rating', 'user_ratings_total', 'price_range_text',
+            'area', 'formatted_address', 'phone_number_cleaned', 'website',
+            'highlights', 'delivery', 'takeout', 'dine_in', 'reservable',
+            'serves_vegetarian_food', 'outdoor_seating', 'good_for_children',
+            'google_maps_url'
+        ]
     
     def extract_value(self, restaurant, key):
-        """Extract value from restaurant data with nested key support"""
+        """Extract the raw value of a column from restaurant data with nested key support
+        
+        Exports don't go through this; they use the accessors of compile_columns.
+        """
         if key in restaurant:
             value = restaurant[key]
             # Handle lists and convert to comma-separated strings
@@ -65,73 +591,8 @@ class RestaurantCSVExporter:
                 return ', '.join(str(v) for v in value if v)
             return value
         
-        # Handle nested keys for complex data structures
-        nested_mappings = {
-            # Location details
-            'area': 'location_details.area',
-            'state': 'location_details.state', 
-            'country': 'location_details.country',
-            'postal_code': 'location_details.postal_code',
-            
-            # Service options
-            'delivery': 'service_options.delivery',
-            'takeout': 'service_options.takeout',
-            'dine_in': 'service_options.dine_in',
-            'curbside_pickup': 'service_options.curbside_pickup',
-            'reservable': 'service_options.reservable',
-            
-            # Accessibility
-            'wheelchair_accessible_entrance': 'accessibility.wheelchair_accessible_entrance',
-            'restroom_available': 'accessibility.restroom',
-            
-            # Dining options
-            'serves_breakfast': 'dining_options.serves_breakfast',
-            'serves_lunch': 'dining_options.serves_lunch',
-            'serves_dinner': 'dining_options.serves_dinner',
-            'serves_brunch': 'dining_options.serves_brunch',
-            'serves_beer': 'dining_options.serves_beer',
-            'serves_wine': 'dining_options.serves_wine',
-            'serves_vegetarian_food': 'dining_options.serves_vegetarian_food',
-            
-            # Atmosphere features
-            'outdoor_seating': 'atmosphere_features.outdoor_seating',
-            'live_music': 'atmosphere_features.live_music',
-            'good_for_children': 'atmosphere_features.good_for_children',
-            'good_for_groups': 'atmosphere_features.good_for_groups',
-            'menu_for_children': 'atmosphere_features.menu_for_children',
-            'lgbtq_friendly': 'atmosphere_features.lgbtq_friendly',
-            
-            # Offerings
-            'serves_coffee': 'offerings.serves_coffee',
-            'serves_dessert': 'offerings.serves_dessert',
-            'serves_happy_hour_food': 'offerings.serves_happy_hour_food',
-            'serves_late_night_food': 'offerings.serves_late_night_food',
-            'serves_cocktails': 'offerings.serves_cocktails',
-            'allows_dogs': 'offerings.allows_dogs',
-            
-            # Children features
-            'allows_children': 'children_features.allows_children',
-            'high_chairs': 'children_features.high_chairs',
-            'changing_table': 'children_features.changing_table',
-            'kids_menu': 'children_features.kids_menu',
-            'good_for_kids': 'children_features.good_for_kids',
-            'playground': 'children_features.playground',
-            
-            # Planning
-            'accepts_reservations': 'planning.accepts_reservations',
-            'requires_reservations': 'planning.requires_reservations',
-            'accepts_credit_cards': 'planning.accepts_credit_cards',
-            'accepts_debit_cards': 'planning.accepts_debit_cards',
-            'accepts_cash_only': 'planning.accepts_cash_only',
-            'accepts_nfc': 'planning.accepts_nfc',
-            
-            # Reviews summary
-            'avg_rating_from_reviews': 'reviews_summary.avg_rating_from_reviews',
-            'total_reviews_fetched': 'reviews_summary.total_reviews_fetched',
-        }
-        
-        if key in nested_mappings:
-            nested_key = nested_mappings[key]
+        if key in NESTED_COLUMNS:
+            nested_key = NESTED_COLUMNS[key]
             return self.get_nested_value(restaurant, nested_key)
         
         return None
@@ -149,143 +610,105 @@ class RestaurantCSVExporter:
         
         return value
     
-    def convert_json_to_csv(self, json_file, csv_file, include_reviews=False):
+    def convert_json_to_csv(self, json_file, csv_file, include_reviews=False, workers=1, sharded=False,
+                            output_format='csv', allow_truncated=False):
         """Convert JSON restaurant data to CSV format"""
         try:
-            # Load JSON data
-            with open(json_file, 'r', encoding='utf-8') as f:
-                restaurants = json.load(f)
+            # Records are read one at a time as rows are written
+            print(f"Processing restaurants from {json_file}...")
+            started = time.perf_counter()
             
-            if not restaurants:
+            columns = self.csv_columns + (REVIEW_COLUMNS if include_reviews else [])
+            rows, processes = export_rows(json_file, csv_file, columns, workers, sharded, output_format,
+                                          allow_truncated)
+            if not rows:
                 print(f"No data found in {json_file}")
                 return False
             
-            print(f"Processing {len(restaurants)} restaurants...")
-            
-            # Prepare CSV columns
-            columns = self.csv_columns.copy()
-            
-            # Add review columns if requested
-            if include_reviews:
-                columns.extend([
-                    'review_1_author', 'review_1_rating', 'review_1_text',
-                    'review_2_author', 'review_2_rating', 'review_2_text',
-                    'review_3_author', 'review_3_rating', 'review_3_text',
-                    'review_4_author', 'review_4_rating', 'review_4_text',
-                    'review_5_author', 'review_5_rating', 'review_5_text'
-                ])
-            
-            # Write CSV file
-            with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=columns)
-                writer.writeheader()
-                
-                for restaurant in restaurants:
-                    row = {}
-                    
-                    # Extract standard columns
-                    for col in self.csv_columns:
-                        row[col] = self.extract_value(restaurant, col)
-                    
-                    # Extract reviews if requested
-                    if include_reviews and 'all_reviews' in restaurant:
-                        reviews = restaurant['all_reviews'][:5]  # Get up to 5 reviews
-                        for i, review in enumerate(reviews, 1):
-                            row[f'review_{i}_author'] = review.get('author_name', '')
-                            row[f'review_{i}_rating'] = review.get('rating', '')
-                            row[f'review_{i}_text'] = review.get('text', '')[:500]  # Limit text length
-                    
-                    # Clean up None values
-                    for key, value in row.items():
-                        if value is None:
-                            row[key] = ''
-                        elif isinstance(value, bool):
-                            row[key] = 'Yes' if value else 'No'
-                    
-                    writer.writerow(row)
-            
+            report(rows, started, processes)
             print(f"✅ Successfully exported to {csv_file}")
             return True
             
         except FileNotFoundError:
             print(f"❌ Error: JSON file '{json_file}' not found")
             return False
-        except json.JSONDecodeError:
-            print(f"❌ Error: Invalid JSON format in '{json_file}'")
+        except TruncatedInput as e:
+            print(f"❌ Error: {e} (--allow-truncated exports the records before the cut)")
+            return False
+        except ValueError as e:
+            print(f"❌ Error: Invalid JSON format in '{json_file}': {e}")
             return False
         except Exception as e:
             print(f"❌ Error: {str(e)}")
             return False
     
-    def create_summary_csv(self, json_file, csv_file):
+    def create_summary_csv(self, json_file, csv_file, workers=1, sharded=False, output_format='csv',
+                           allow_truncated=False):
         """Create a summary CSV with key metrics only"""
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                restaurants = json.load(f)
-            
-            if not restaurants:
+            started = time.perf_counter()
+            rows, processes = export_rows(json_file, csv_file, self.summary_columns, workers, sharded,
+                                          output_format, allow_truncated)
+            if not rows:
                 print(f"No data found in {json_file}")
                 return False
             
-            # Summary columns
-            summary_columns = [
-                'name', 'rating', 'user_ratings_total', 'price_range_text',
-                'area', 'formatted_address', 'phone_number_cleaned', 'website',
-                'highlights', 'delivery', 'takeout', 'dine_in', 'reservable',
-                'serves_vegetarian_food', 'outdoor_seating', 'good_for_children',
-                'google_maps_url'
-            ]
-            
-            with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=summary_columns)
-                writer.writeheader()
-                
-                for restaurant in restaurants:
-                    row = {}
-                    for col in summary_columns:
-                        value = self.extract_value(restaurant, col)
-                        if value is None:
-                            row[col] = ''
-                        elif isinstance(value, bool):
-                            row[col] = 'Yes' if value else 'No'
-                        else:
-                            row[col] = value
-                    
-                    writer.writerow(row)
-            
-            print(f"✅ Successfully created summary CSV: {csv_file}")
+            report(rows, started, processes)
+            print(f"✅ Successfully created summary {'Parquet' if output_format == 'parquet' else 'CSV'}: {csv_file}")
             return True
             
+        except TruncatedInput as e:
+            print(f"❌ Error creating summary: {e} (--allow-truncated exports the records before the cut)")
+            return False
         except Exception as e:
             print(f"❌ Error creating summary: {str(e)}")
             return False
 
 def main():
     parser = argparse.ArgumentParser(description='Export restaurant JSON data to CSV format')
-    parser.add_argument('json_file', help='Input JSON file')
-    parser.add_argument('--output', '-o', help='Output CSV file (default: same name as JSON with .csv extension)')
+    parser.add_argument('json_file', help='Input JSON or JSON Lines file (.gz/.zst ok) or sharded feed directory')
+    parser.add_argument('--output', '-o', help='Output file (default: same name as JSON with .csv or .parquet extension)')
     parser.add_argument('--reviews', '-r', action='store_true', help='Include review text in CSV')
     parser.add_argument('--summary', '-s', action='store_true', help='Create summary CSV with key fields only')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Convert in N processes (sharded feeds and uncompressed JSON Lines)')
+    parser.add_argument('--sharded', action='store_true',
+                        help='With --workers, write one CSV per input part (name-00000.csv, ...) instead of merging')
+    parser.add_argument('--format', '-f', choices=['csv', 'parquet'], default='csv',
+                        help='parquet: typed columns, feature groups as structs (needs pyarrow)')
+    parser.add_argument('--allow-truncated', action='store_true',
+                        help='Export the records of input cut off by a crash (with a warning) instead of failing')
     
     args = parser.parse_args()
     
+    if args.format == 'parquet' and pyarrow is None:
+        print("❌ Error: --format parquet needs pyarrow (pip install pyarrow)")
+        sys.exit(1)
+    
     # Determine output filename
     if args.output:
         csv_file = args.output
     else:
         json_path = Path(args.json_file)
-        csv_file = json_path.parent / f"{json_path.stem}.csv"
+        stem = json_path.name
+        for suffix in ('.gz', '.zst', '.json', '.jsonl'):
+            stem = stem.removesuffix(suffix)
+        csv_file = json_path.parent / f"{stem}.{args.format}"
     
     # Create exporter instance
     exporter = RestaurantCSVExporter()
     
     if args.summary:
         # Create summary CSV
-        summary_file = str(csv_file).replace('.csv', '_summary.csv')
-        success = exporter.create_summary_csv(args.json_file, summary_file)
+        root, ext = os.path.splitext(str(csv_file))
+        summary_file = f"{root}_summary{ext}"
+        success = exporter.create_summary_csv(args.json_file, summary_file, args.workers, args.sharded,
+                                              args.format, args.allow_truncated)
     else:
         # Create full CSV
-        success = exporter.convert_json_to_csv(args.json_file, csv_file, include_reviews=args.reviews)
+        success = exporter.convert_json_to_csv(args.json_file, csv_file, include_reviews=args.reviews,
+                                               workers=args.workers, sharded=args.sharded,
+                                               output_format=args.format, allow_truncated=args.allow_truncated)
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,205 @@
+# Area assignment for places from polygons and address text
+#
+# data/areas/<region>.geojson holds the region's local government areas
+# (level "lga") and the neighbourhoods inside them (level "neighbourhood").
+# AreaIndex answers "which area is this point in?" through a grid of
+# buckets over the polygons' extent: each bucket keeps the areas whose
+# bounding box touches it, most specific first, and a bucket lying wholly
+# inside its first area answers without any point-in-polygon test.
+#
+# The bundled LGA polygons are rough boxes, so a point that only falls in
+# an LGA is named after it only when the address names no known area
+# (outside a road name). Records without coordinates and points outside
+# every polygon go by the address alone. AreaMatcher finds every known area
+# name in an address with one compiled regex instead of a substring test
+# per name. The old "first name
+# in the list wins" rule picked Lekki for "Lekki-Epe Expressway, Ajah";
+# the matcher prefers names that are not part of a road name, then
+# neighbourhoods over LGAs, then the earliest name in the address.
+
+import json
+import math
+import os
+import re
+
+from lagos_restaurants.landmask import DATA_DIR, Ring
+
+AREAS_DIR = os.path.join(DATA_DIR, 'areas')
+
+# Bucket size in degrees (~1.1 km at Lagos' latitude)
+BUCKET_DEGREES = 0.01
+
+# Lower ranks win when a point or an address matches several areas
+LEVEL_RANKS = {'neighbourhood': 0, 'lga': 1}
+
+# A name followed by one of these is a road named after the area ("Ikorodu Road")
+ROAD_AFTER = r"(?:-[\w']+)?\s*(?:motor\s+)?(?:road|rd|street|st|expressway|express|way|avenue|ave|close|crescent|drive)\b"
+
+
+class Area:
+    """A named area polygon (outer rings minus holes) with its LGA"""
+
+    def __init__(self, name, level, lga, polygons, aliases=()):
+        self.name = name
+        self.level = level
+        self.lga = lga
+        self.aliases = list(aliases)
+        self.rank = LEVEL_RANKS.get(level, 0)
+        self.polygons = [(Ring(rings[0]), [Ring(hole) for hole in rings[1:]]) for rings in polygons]
+        self.rings = [ring for outer, holes in self.polygons for ring in [outer] + holes]
+        west, south, east, north = zip(*(outer.bbox for outer, _ in self.polygons))
+        self.bbox = (min(west), min(south), max(east), max(north))
+        self.size = sum((ring.bbox[2] - ring.bbox[0]) * (ring.bbox[3] - ring.bbox[1])
+                        for ring, _ in self.polygons)
+
+    def contains(self, lat, lng):
+        for outer, holes in self.polygons:
+            if outer.contains(lng, lat) and not any(hole.contains(lng, lat) for hole in holes):
+                return True
+        return False
+
+    def covers_box(self, west, south, east, north):
+        """True if the whole box lies inside the area"""
+        corners = ((south, west), (north, west), (south, east), (north, east))
+        return (all(self.contains(lat, lng) for lat, lng in corners)
+                and not any(ring.crosses_box(west, south, east, north) for ring in self.rings))
+
+    def __repr__(self):
+        return f"Area({self.name!r}, {self.level!r})"
+
+
+def load_areas(path):
+    """Areas of an area GeoJSON file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    areas = []
+    for feature in data['features']:
+        properties = feature['properties']
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        areas.append(Area(properties['name'], properties.get('level'), properties.get('lga'),
+                          polygons, properties.get('aliases', ())))
+    return areas
+
+
+class AreaIndex:
+    """Grid-bucket spatial index over area polygons"""
+
+    def __init__(self, areas, bucket_degrees=BUCKET_DEGREES):
+        self.areas = areas
+        self.bucket_degrees = bucket_degrees
+        self.west = min(area.bbox[0] for area in areas)
+        self.south = min(area.bbox[1] for area in areas)
+
+        # Bucket -> an Area when the bucket lies wholly inside its best
+        # candidate, else the candidates to test, most specific first
+        candidates = {}
+        for area in sorted(areas, key=lambda area: (area.rank, area.size)):
+            west, south, east, north = area.bbox
+            for row in range(self._row(south), self._row(north) + 1):
+                for col in range(self._col(west), self._col(east) + 1):
+                    candidates.setdefault((row, col), []).append(area)
+
+        self.buckets = {}
+        for (row, col), bucket_areas in candidates.items():
+            south = self.south + row * bucket_degrees
+            west = self.west + col * bucket_degrees
+            first = bucket_areas[0]
+            if first.covers_box(west, south, west + bucket_degrees, south + bucket_degrees):
+                self.buckets[row, col] = first
+            else:
+                self.buckets[row, col] = bucket_areas
+
+    @classmethod
+    def from_geojson(cls, path, bucket_degrees=BUCKET_DEGREES):
+        return cls(load_areas(path), bucket_degrees)
+
+    def _row(self, lat):
+        return math.floor((lat - self.south) / self.bucket_degrees)
+
+    def _col(self, lng):
+        return math.floor((lng - self.west) / self.bucket_degrees)
+
+    def locate(self, lat, lng):
+        """Most specific area containing the point, or None"""
+        bucket = self.buckets.get((self._row(lat), self._col(lng)))
+        if bucket is None or isinstance(bucket, Area):
+            return bucket
+        for area in bucket:
+            if area.contains(lat, lng):
+                return area
+        return None
+
+    def locate_many(self, points):
+        """Areas of a batch of (lat, lng) points (None where a point has no area)"""
+        buckets = self.buckets
+        south, west, size = self.south, self.west, self.bucket_degrees
+        floor = math.floor
+        located = []
+        for lat, lng in points:
+            bucket = buckets.get((floor((lat - south) / size), floor((lng - west) / size)))
+            if bucket is not None and not isinstance(bucket, Area):
+                bucket = next((area for area in bucket if area.contains(lat, lng)), None)
+            located.append(bucket)
+        return located
+
+
+def trie_pattern(words):
+    """Regex matching any of words, factored into a trie so each position is tried once"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [(r'\s+' if char == ' ' else re.escape(char)) + emit(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if '' in node else '')
+
+    return emit(trie)
+
+
+class AreaMatcher:
+    """Finds the best known area name in free text with a single regex scan"""
+
+    def __init__(self, names, areas=()):
+        # Normalised name -> (canonical name, rank); polygons supply levels and aliases
+        self.names = {}
+        for area in areas:
+            for name in [area.name] + area.aliases:
+                self.names.setdefault(self._normalise(name), (area.name, area.rank))
+        for name in names:
+            self.names.setdefault(self._normalise(name), (name, 0))
+        # Group 1 is the name, group 2 the road suffix if the name is part of a road name
+        self.pattern = re.compile(rf"\b({trie_pattern(self.names)})\b({ROAD_AFTER})?")
+
+    @staticmethod
+    def _normalise(name):
+        return ' '.join(name.split()).lower()
+
+    def match(self, text, roads=True):
+        """Canonical name of the best area named in text, or None
+
+        With roads=False a name that is only part of a road name ("Ikorodu
+        Road") does not count.
+        """
+        if not text:
+            return None
+        names = self.names
+        best = None
+        # findall returns matches in address order, so the index ranks by position
+        for position, (found, road) in enumerate(self.pattern.findall(text.lower())):
+            if road and not roads:
+                continue
+            name, rank = names.get(found) or names[self._normalise(found)]
+            key = (road != '', rank, position)
+            if best is None or key < best[0]:
+                best = (key, name)
+        return best[1] if best else None
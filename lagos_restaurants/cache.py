@@ -0,0 +1,260 @@
+# Persistent cache for Google Places API responses
+#
+# A bounded in-memory LRU sits in front of a SQLite file, so entries survive
+# between runs and are shared by every spider pointed at the same file.
+#
+# Place Details results are split into field groups (basic, contact,
+# atmosphere), each stored per place with its own TTL: an address stays
+# good for weeks, a rating or review list only for days. Every field keeps
+# the time it was fetched, so a spider refreshing some fields of a group
+# does not make the others look fresh. A lookup hits when every requested
+# field is cached and fresh, whichever spider asked for it first. Nearby Search and Text Search responses are
+# cached per query parameters and page.
+#
+# Several spiders or workers may share one file. Writes are buffered in
+# memory and flushed in one short BEGIN IMMEDIATE transaction, so the write
+# lock is only held while a batch is written and other processes wait for
+# it (up to BUSY_TIMEOUT) rather than failing with "database is locked".
+
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+DAY = 24 * 60 * 60
+
+# Place Details fields by billing / volatility group
+FIELD_GROUPS = {
+    'basic': {
+        'address_components', 'adr_address', 'business_status', 'formatted_address',
+        'geometry', 'icon', 'icon_background_color', 'icon_mask_base_uri', 'name',
+        'permanently_closed', 'photos', 'place_id', 'plus_code', 'type', 'types',
+        'url', 'utc_offset', 'vicinity', 'wheelchair_accessible_entrance',
+    },
+    'contact': {
+        'current_opening_hours', 'formatted_phone_number', 'international_phone_number',
+        'opening_hours', 'secondary_opening_hours', 'website',
+    },
+}
+# Anything not listed above (ratings, reviews, service options) changes fastest
+DEFAULT_GROUP = 'atmosphere'
+
+# Groups fetched for every place in tiered details mode; the rest are billed
+# at the Atmosphere rate and only refetched when the place has changed
+CHEAP_GROUPS = ('basic', 'contact')
+
+DEFAULT_TTLS = {
+    'basic': 30 * DAY,
+    'contact': 7 * DAY,
+    'atmosphere': 3 * DAY,
+    'search': 3 * DAY,
+}
+
+# Seconds to wait for another process's write lock
+BUSY_TIMEOUT = 30
+
+# Expired entries are kept this long for callers that accept stale data
+# (tiered details refresh, pages of a cached result set) before being purged
+STALE_GRACE = 30 * DAY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def field_group(field):
+    for group, fields in FIELD_GROUPS.items():
+        if field in fields:
+            return group
+    return DEFAULT_GROUP
+
+
+def group_fields(fields):
+    """Split requested Place Details fields into {group: set(fields)}"""
+    groups = {}
+    for field in fields:
+        groups.setdefault(field_group(field), set()).add(field)
+    return groups
+
+
+def split_tiers(fields):
+    """Split Place Details fields into (cheap, expensive) lists"""
+    cheap = [field for field in fields if field_group(field) in CHEAP_GROUPS]
+    expensive = [field for field in fields if field_group(field) not in CHEAP_GROUPS]
+    return cheap, expensive
+
+
+def field_fetches(entry):
+    """{field: [fetched_at, signature]} of a cached details entry"""
+    if 'fetched' in entry:
+        return dict(entry['fetched'])
+    # Entries written before fetch times were kept per field
+    return {field: [entry.get('fetched_at', 0), entry.get('signature')] for field in entry['fields']}
+
+
+def change_signature(place):
+    """Search result values that move when a place gets new ratings or reviews"""
+    return {'rating': place.get('rating'), 'user_ratings_total': place.get('user_ratings_total')}
+
+
+class PlacesCache:
+    """In-memory LRU over a SQLite store, with hit/miss/eviction counters"""
+
+    def __init__(self, path, memory_items=2000, ttls=None, stale_grace=STALE_GRACE,
+                 flush_every=50, flush_interval=5.0):
+        self.path = path
+        self.memory_items = memory_items
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        # key -> entry not yet written to SQLite
+        self.pending = {}
+        self.last_flush = time.monotonic()
+
+        self.memory = OrderedDict()
+        self.stats = {'hit': 0, 'miss': 0, 'store': 0, 'evicted': 0, 'expired': 0}
+
+        # Autocommit; writes take the lock explicitly in flush()
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT * 1000}')
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        expired = self.conn.execute('DELETE FROM entries WHERE expires_at < ?',
+                                    (time.time() - stale_grace,)).rowcount
+        self.stats['expired'] += expired
+
+    # Raw key/value tiers
+
+    def get(self, key, allow_stale=False):
+        """Return the decoded entry for key, or None if missing or expired"""
+        entry = self.memory.get(key) or self.pending.get(key)
+        if entry is not None:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+        else:
+            row = self.conn.execute('SELECT expires_at, value FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            entry = (row[0], json.loads(row[1]))
+            self._remember(key, entry)
+
+        expires_at, value = entry
+        if expires_at < time.time() and not allow_stale:
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        """Store an entry; raises sqlite3.Error if the batch it completes can't be written
+
+        The entry stays pending after a failed flush and goes out with a later batch.
+        """
+        entry = (time.time() + ttl, value)
+        self._remember(key, entry)
+        self.pending[key] = entry
+        self.stats['store'] += 1
+        if (len(self.pending) >= self.flush_every
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+            self.stats['evicted'] += 1
+
+    # Place Details
+
+    def get_details(self, place_id, fields):
+        """Merged cached result for the requested fields, or None on a miss"""
+        result = {}
+        now = time.time()
+        for group, wanted in group_fields(fields).items():
+            # The entry lives as long as its freshest field; check each one
+            entry = self.get(f"details:{place_id}:{group}", allow_stale=True)
+            fetched = field_fetches(entry) if entry is not None else {}
+            ttl = self.ttls[group]
+            if not all(field in fetched and now - fetched[field][0] <= ttl for field in wanted):
+                self.stats['miss'] += 1
+                return None
+            result.update({k: v for k, v in entry['result'].items() if k in wanted})
+        self.stats['hit'] += 1
+        return result
+
+    def get_tier(self, place_id, fields, signature, max_age):
+        """Cached result for fields fetched while the place had this signature
+
+        Unlike get_details this ignores the group TTLs: the tier is reused as
+        long as the place looks unchanged and the data is under max_age.
+        """
+        result = {}
+        now = time.time()
+        for group, wanted in group_fields(fields).items():
+            entry = self.get(f"details:{place_id}:{group}", allow_stale=True)
+            fetched = field_fetches(entry) if entry is not None else {}
+            if not all(field in fetched and fetched[field][1] == signature
+                       and now - fetched[field][0] <= max_age for field in wanted):
+                return None
+            result.update({k: v for k, v in entry['result'].items() if k in wanted})
+        return result
+
+    def set_details(self, place_id, fields, result, signature=None):
+        now = time.time()
+        for group, wanted in group_fields(fields).items():
+            key = f"details:{place_id}:{group}"
+            entry = self.get(key, allow_stale=True) or {'fetched': {}, 'result': {}}
+            # Widen the entry rather than replacing it, so spiders asking for
+            # different field sets share one copy per place and group; only
+            # the fields fetched now get a new time (and, from tiered mode,
+            # a new signature)
+            fetched = field_fetches(entry)
+            for field in wanted:
+                previous = fetched.get(field, [0, None])[1]
+                fetched[field] = [now, signature if signature is not None else previous]
+            values = dict(entry['result'])
+            values.update({k: v for k, v in result.items() if k in wanted})
+            # Stored for the group TTL from now, so the entry outlives its
+            # freshest field (stale fields still serve get_tier)
+            self.set(key, {'fetched': fetched, 'result': values}, self.ttls[group])
+
+    # Nearby Search / Text Search pages
+
+    def get_search(self, query_key, page, allow_stale=False):
+        body = self.get(f"search:{query_key}:{page}", allow_stale)
+        self.stats['hit' if body is not None else 'miss'] += 1
+        # A cached next_page_token has long expired and cannot be followed
+        # live, so a cached result set ends where the crawl that stored it
+        # stopped paginating
+        if (body is not None and body.get('next_page_token')
+                and self.get(f"search:{query_key}:{page + 1}", allow_stale=True) is None):
+            body = dict(body)
+            del body['next_page_token']
+        return body
+
+    def set_search(self, query_key, page, body):
+        self.set(f"search:{query_key}:{page}", body, self.ttls['search'])
+
+    def flush(self):
+        if self.pending:
+            rows = [(key, json.dumps(value), expires_at) for key, (expires_at, value) in self.pending.items()]
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany('INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)',
+                                      rows)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.pending.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
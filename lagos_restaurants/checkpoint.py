@@ -0,0 +1,120 @@
+# Persistent checkpoint store for grid crawls
+#
+# Records finished cells, followed pagination pages and discovered places in
+# a SQLite file so a crashed google_places_grid run can resume without paying
+# for the same Nearby Search and Place Details calls again. Writes are
+# batched into transactions; SQLite's journal makes every commit atomic, so a
+# crash mid-write loses at most the last uncommitted batch, never corrupts
+# what was already flushed.
+
+import json
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    grid_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    results INTEGER NOT NULL DEFAULT 0,
+    meta TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    grid_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    next_page_token TEXT,
+    PRIMARY KEY (grid_id, page)
+);
+CREATE TABLE IF NOT EXISTS places (
+    place_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT
+);
+"""
+
+
+class CheckpointStore:
+    """SQLite-backed crawl checkpoint, flushed every few writes or seconds"""
+
+    def __init__(self, path, flush_every=50, flush_interval=5.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending_writes = 0
+        self.last_flush = time.monotonic()
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def load(self):
+        """Read everything a resumed run needs to skip finished work"""
+        state = {
+            'done_cells': {},
+            'pending_cells': {},
+            'page_tokens': {},
+            'enriched_places': set(),
+            'pending_places': {},
+        }
+
+        for grid_id, status, results, meta in self.conn.execute(
+                'SELECT grid_id, status, results, meta FROM cells'):
+            if status == 'done':
+                state['done_cells'][grid_id] = results
+            else:
+                state['pending_cells'][grid_id] = json.loads(meta) if meta else None
+
+        # Highest processed page per cell and the token it handed out
+        for grid_id, page, token in self.conn.execute(
+                'SELECT grid_id, page, next_page_token FROM pages ORDER BY grid_id, page'):
+            state['page_tokens'][grid_id] = (page, token)
+
+        for place_id, status, data in self.conn.execute(
+                'SELECT place_id, status, data FROM places'):
+            if status == 'enriched':
+                state['enriched_places'].add(place_id)
+            else:
+                state['pending_places'][place_id] = json.loads(data)
+
+        return state
+
+    def mark_cell_pending(self, grid_id, meta):
+        """Remember a cell scheduled mid-crawl (e.g. an adaptive child)"""
+        self._write('INSERT OR IGNORE INTO cells (grid_id, status, meta) VALUES (?, ?, ?)',
+                    (grid_id, 'pending', json.dumps(meta)))
+
+    def mark_cell_done(self, grid_id, results):
+        self._write('INSERT OR REPLACE INTO cells (grid_id, status, results, meta) VALUES (?, ?, ?, NULL)',
+                    (grid_id, 'done', results))
+
+    def mark_page(self, grid_id, page, next_page_token):
+        self._write('INSERT OR REPLACE INTO pages (grid_id, page, next_page_token) VALUES (?, ?, ?)',
+                    (grid_id, page, next_page_token))
+
+    def mark_place_pending(self, place_id, restaurant):
+        """A place whose Place Details request is in flight"""
+        self._write('INSERT OR IGNORE INTO places (place_id, status, data) VALUES (?, ?, ?)',
+                    (place_id, 'pending', json.dumps(restaurant)))
+
+    def mark_place_enriched(self, place_id):
+        # Details themselves live in the shared PlacesCache
+        self._write('INSERT OR REPLACE INTO places (place_id, status, data) VALUES (?, ?, NULL)',
+                    (place_id, 'enriched'))
+
+    def _write(self, sql, params):
+        self.conn.execute(sql, params)
+        self.pending_writes += 1
+        if (self.pending_writes >= self.flush_every
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Commit buffered writes"""
+        self.conn.commit()
+        self.pending_writes = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,150 @@
+# Coverage planning for grid-based Nearby Search crawls
+#
+# A plan is a list of cells, each searched with one circle. The square
+# lattice pairs 3km cells with 3km circles, so every point is covered about
+# three times over. The hexagonal layout places circle centres on a hex
+# lattice and sizes each circle to the hexagon circumradius, which is the
+# thinnest circle covering of the plane (~1.21x overlap).
+
+import math
+
+# Metres per degree of latitude
+METERS_PER_DEGREE = 111320
+
+# Sample lattice used to estimate the overlap ratio of a plan
+OVERLAP_SAMPLES = 60
+
+
+def meters_to_degrees(meters, lat):
+    """Convert a distance in metres to (lat, lng) degree spans at a latitude"""
+    lat_deg = meters / METERS_PER_DEGREE
+    lng_deg = meters / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+    return lat_deg, lng_deg
+
+
+def cell_circumradius(lat, cell_span):
+    """Radius in metres of the circle circumscribing a cell of (lat, lng) span"""
+    half_height = cell_span[0] / 2 * METERS_PER_DEGREE
+    half_width = cell_span[1] / 2 * METERS_PER_DEGREE * math.cos(math.radians(lat))
+    return math.ceil(math.hypot(half_height, half_width))
+
+
+class CoveragePlan:
+    """Cells to search plus the cost and overlap figures for the crawl"""
+
+    def __init__(self, layout, bounds, cells, skipped_cells=0):
+        self.layout = layout
+        self.bounds = bounds
+        self.cells = cells
+        self.skipped_cells = skipped_cells
+
+    @property
+    def centers(self):
+        return [cell['center'] for cell in self.cells]
+
+    @property
+    def call_count(self):
+        """First-page Nearby Search calls (one per cell)"""
+        return len(self.cells)
+
+    @property
+    def max_call_count(self):
+        """Upper bound if every cell paginates to the 3-page limit"""
+        return len(self.cells) * 3
+
+    def mask_land(self, land_mask):
+        """Drop cells with no land in them, returning a new plan"""
+        cells = [cell for cell in self.cells
+                 if land_mask.cell_has_land(cell['center'], cell['cell_span'])]
+        skipped = self.skipped_cells + len(self.cells) - len(cells)
+        return CoveragePlan(self.layout, self.bounds, cells, skipped)
+
+    def overlap_ratio(self):
+        """Average number of circles covering each covered point of the bounds"""
+        bounds = self.bounds
+        mid_lat = (bounds['north'] + bounds['south']) / 2
+        lng_scale = math.cos(math.radians(mid_lat))
+
+        circles = []
+        for cell in self.cells:
+            radius_deg = cell['radius'] / METERS_PER_DEGREE
+            circles.append((cell['center'][0], cell['center'][1] * lng_scale, radius_deg * radius_deg))
+
+        covered = 0
+        hits = 0
+        lat_step = (bounds['north'] - bounds['south']) / OVERLAP_SAMPLES
+        lng_step = (bounds['east'] - bounds['west']) / OVERLAP_SAMPLES
+        for i in range(OVERLAP_SAMPLES):
+            lat = bounds['south'] + (i + 0.5) * lat_step
+            for j in range(OVERLAP_SAMPLES):
+                x = (bounds['west'] + (j + 0.5) * lng_step) * lng_scale
+                depth = 0
+                for c_lat, c_x, r2 in circles:
+                    d_lat = lat - c_lat
+                    d_x = x - c_x
+                    if d_lat * d_lat + d_x * d_x <= r2:
+                        depth += 1
+                if depth:
+                    covered += 1
+                    hits += depth
+
+        return hits / covered if covered else 0.0
+
+    def summary(self):
+        radii = sorted({cell['radius'] for cell in self.cells})
+        radius_text = f"{radii[0]}m" if len(radii) == 1 else f"{radii[0]}-{radii[-1]}m"
+        return (f"{self.layout} plan: {self.call_count} cells, radius {radius_text}, "
+                f"overlap ratio {self.overlap_ratio():.2f}x, "
+                f"{self.call_count}-{self.max_call_count} Nearby Search calls")
+
+
+def square_plan(bounds, grid_size, radius):
+    """Square lattice of grid_size degree cells, each searched with a fixed radius"""
+    cells = []
+
+    lat_steps = math.ceil((bounds['north'] - bounds['south']) / grid_size)
+    lng_steps = math.ceil((bounds['east'] - bounds['west']) / grid_size)
+
+    for i in range(lat_steps):
+        for j in range(lng_steps):
+            lat = bounds['south'] + (i + 0.5) * grid_size
+            lng = bounds['west'] + (j + 0.5) * grid_size
+
+            # Ensure we don't go outside bounds
+            if lat <= bounds['north'] and lng <= bounds['east']:
+                cells.append({
+                    'center': (lat, lng),
+                    'cell_span': (grid_size, grid_size),
+                    'radius': radius
+                })
+
+    return CoveragePlan('square', bounds, cells)
+
+
+def hex_plan(bounds, radius):
+    """Hexagonal lattice of pointy-top cells with the given circumradius in metres
+
+    Rows are 1.5 radii apart and every other row is shifted by half a cell,
+    so the hexagons tile the bounds and each search circle exactly
+    circumscribes its hexagon.
+    """
+    cells = []
+
+    mid_lat = (bounds['north'] + bounds['south']) / 2
+    row_step, _ = meters_to_degrees(1.5 * radius, mid_lat)
+    hex_height, hex_width = meters_to_degrees(2 * radius, mid_lat)
+    hex_width *= math.sqrt(3) / 2
+
+    rows = math.ceil((bounds['north'] - bounds['south']) / row_step) + 1
+    for i in range(rows):
+        lat = bounds['south'] + i * row_step
+        lng = bounds['west'] - (hex_width / 2 if i % 2 else 0)
+        while lng - hex_width / 2 <= bounds['east']:
+            cells.append({
+                'center': (lat, lng),
+                'cell_span': (hex_height, hex_width),
+                'radius': radius
+            })
+            lng += hex_width
+
+    return CoveragePlan('hex', bounds, cells)
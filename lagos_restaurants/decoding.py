@@ -0,0 +1,48 @@
+# Shared JSON decoding for Google Places responses
+#
+# A live Places response used to be parsed three times: by
+# PlacesStatusMiddleware, by PlacesCacheMiddleware and by the callback, each
+# with json.loads(response.text), which first decodes the whole body into a
+# str. places_json() parses response.body once, straight from bytes, with
+# orjson when it is installed (the stdlib parser otherwise), and hands the
+# same dict to every middleware and the callback. Responses built from the
+# cache are registered with the dict they were built from, so a cache hit
+# is not parsed at all.
+#
+# The dicts are shared (the cache keeps them as its in-memory copy), so
+# treat them as read-only.
+
+import json
+import weakref
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Parsed body of each live response; entries go away with their response
+_parsed = weakref.WeakKeyDictionary()
+
+
+def loads(data):
+    """Parse JSON from bytes or str
+
+    Raises json.JSONDecodeError on invalid input (orjson's error subclasses it).
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def places_json(response):
+    """Parsed JSON body of a response, decoded once however many times it is asked for"""
+    data = _parsed.get(response)
+    if data is None:
+        data = _parsed[response] = loads(response.body)
+    return data
+
+
+def remember(response, data):
+    """Register the already-parsed body of a response built from data"""
+    _parsed[response] = data
+    return response
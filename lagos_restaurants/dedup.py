@@ -0,0 +1,142 @@
+# Compact in-memory set of seen place_ids
+#
+# A nationwide crawl keeps every place_id it has seen for dedup. In a
+# Python set each 27-character id costs over 100 bytes (the str object plus
+# its hash-table slot). PlaceIdSet keeps only the 64-bit hash of each id in
+# an open-addressing table backed by array('Q'), 8-16 bytes per id depending
+# on fill. The hash is CPython's own (SipHash, salted per process), which is
+# fine because the set never leaves the process. Two ids share a hash with
+# probability about n^2 / 2^65 (1 in ~37 million at a million places); a
+# collision can only make a place look seen, never duplicate one.
+#
+# The optional Bloom pre-filter (about 1.2 bytes per id at 1% false
+# positives) rejects most unseen ids without probing the table. In CPython a
+# probe is a single array read, so the filter costs more than it saves
+# (benchmarks/bench_dedup.py); it is off unless bloom_error_rate is given.
+
+import math
+from array import array
+
+# Grow the table once it is this full; linear probing slows down sharply above
+MAX_LOAD = 0.7
+MIN_CAPACITY = 1024
+
+# hash() of a str is 64 bits on 64-bit builds; mask it to an unsigned value
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def place_hash(place_id):
+    """64-bit hash of a place_id; 0 is reserved for empty slots"""
+    return (hash(place_id) & HASH_MASK) or 1
+
+
+class BloomFilter:
+    """Bit array answering "definitely not added" for 64-bit hashes"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, h):
+        # Double hashing: k positions from the two halves of the 64-bit hash
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, h):
+        for position in self._positions(h):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, h):
+        bits = self.bits
+        for position in self._positions(h):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class PlaceIdSet:
+    """Set-like container of place_ids stored as 64-bit hashes
+
+    Supports add, update, len and in, which is all the spiders use; the ids
+    themselves are not kept, so it cannot be iterated.
+    """
+
+    def __init__(self, capacity=0, bloom_error_rate=None):
+        size = MIN_CAPACITY
+        while size * MAX_LOAD < capacity:
+            size *= 2
+        self.bloom_error_rate = bloom_error_rate
+        self.count = 0
+        self._allocate(size)
+
+    def _allocate(self, size):
+        self.table = array('Q', [0]) * size
+        self.mask = size - 1
+        self.limit = int(size * MAX_LOAD)
+        self.bloom = BloomFilter(self.limit, self.bloom_error_rate) if self.bloom_error_rate else None
+
+    def _insert(self, h):
+        """Insert a hash; True if it was not present"""
+        table = self.table
+        mask = self.mask
+        i = h & mask
+        while True:
+            slot = table[i]
+            if slot == 0:
+                table[i] = h
+                return True
+            if slot == h:
+                return False
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self.table
+        self._allocate(len(old) * 2)
+        for h in old:
+            if h:
+                self._insert(h)
+                if self.bloom is not None:
+                    self.bloom.add(h)
+
+    def add(self, place_id):
+        h = place_hash(place_id)
+        if self._insert(h):
+            if self.bloom is not None:
+                self.bloom.add(h)
+            self.count += 1
+            if self.count > self.limit:
+                self._grow()
+
+    def update(self, place_ids):
+        for place_id in place_ids:
+            self.add(place_id)
+
+    def __contains__(self, place_id):
+        h = place_hash(place_id)
+        if self.bloom is not None and h not in self.bloom:
+            return False
+
+        table = self.table
+        mask = self.mask
+        i = h & mask
+        while True:
+            slot = table[i]
+            if slot == h:
+                return True
+            if slot == 0:
+                return False
+            i = (i + 1) & mask
+
+    def __len__(self):
+        return self.count
+
+    def memory_bytes(self):
+        """Bytes held by the hash table and Bloom filter"""
+        size = self.table.itemsize * len(self.table)
+        if self.bloom is not None:
+            size += len(self.bloom.bits)
+        return size
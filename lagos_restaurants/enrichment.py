@@ -0,0 +1,341 @@
+# Table-driven enrichment of Place Details results
+#
+# Every Google spider turns a Place Details `result` into the same restaurant
+# fields: contact details, location, price text, parsed opening hours,
+# reviews, feature groups and highlights. The feature groups and highlights
+# are declared as tables below; each enricher flattens them once into
+# (field, keys) tuples and walks those with a plain loop per place, reading
+# only the Details keys the tables name (benchmarks/bench_enrichment.py
+# compares it with the hand-written code it replaces).
+# Regexes are compiled here once instead of on every call.
+#
+# Two profiles are built from the tables. FEATURE_ENRICHER fills the feature
+# groups and derives highlights from them (grid and text search spiders,
+# whose Details requests ask for the feature fields); LISTING_ENRICHER
+# derives highlights from the search listing's rating, price level and
+# types (the API spider, which asks only for basic fields).
+
+import re
+
+from lagos_restaurants.regions import DEFAULT_REGION, Region
+
+PHONE_JUNK_RE = re.compile(r'[^\d+]')
+POSTAL_CODE_RE = re.compile(r'\b\d{6}\b')
+WEEKDAY_RE = re.compile(r'(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)')
+WEEKDAYS = {
+    'Monday': 'monday', 'Tuesday': 'tuesday', 'Wednesday': 'wednesday',
+    'Thursday': 'thursday', 'Friday': 'friday', 'Saturday': 'saturday', 'Sunday': 'sunday'
+}
+
+PRICE_LEVELS = {
+    0: 'Free',
+    1: 'Inexpensive (₦)',
+    2: 'Moderate (₦₦)',
+    3: 'Expensive (₦₦₦)',
+    4: 'Very Expensive (₦₦₦₦)'
+}
+
+# group -> [(field, Details key)]; a tuple of keys takes the first truthy one
+FEATURE_GROUPS = {
+    'service_options': [
+        ('delivery', ('serves_delivery', 'delivery')),
+        ('takeout', ('serves_takeout', 'takeout')),
+        ('dine_in', 'serves_dine_in'),
+        ('curbside_pickup', 'curbside_pickup'),
+        ('reservable', 'reservable'),
+    ],
+    'accessibility': [
+        ('wheelchair_accessible_entrance', 'wheelchair_accessible_entrance'),
+        ('restroom', 'restroom'),
+    ],
+    'dining_options': [
+        ('serves_breakfast', 'serves_breakfast'),
+        ('serves_lunch', 'serves_lunch'),
+        ('serves_dinner', 'serves_dinner'),
+        ('serves_brunch', 'serves_brunch'),
+        ('serves_beer', 'serves_beer'),
+        ('serves_wine', 'serves_wine'),
+        ('serves_vegetarian_food', 'serves_vegetarian_food'),
+    ],
+    'atmosphere_features': [
+        ('outdoor_seating', 'outdoor_seating'),
+        ('live_music', 'live_music'),
+        ('good_for_children', 'good_for_children'),
+        ('good_for_groups', 'good_for_groups'),
+        ('menu_for_children', 'menu_for_children'),
+        ('lgbtq_friendly', 'lgbtq_friendly'),
+    ],
+    'offerings': [
+        ('serves_coffee', 'serves_coffee'),
+        ('serves_dessert', 'serves_dessert'),
+        ('serves_happy_hour_food', 'serves_happy_hour_food'),
+        ('serves_late_night_food', 'serves_late_night_food'),
+        ('serves_cocktails', 'serves_cocktails'),
+        ('allows_dogs', 'allows_dogs'),
+    ],
+    'parking': [
+        ('wheelchair_accessible_parking', 'has_wheelchair_accessible_parking'),
+        ('wheelchair_accessible_entrance', 'has_wheelchair_accessible_entrance'),
+        ('wheelchair_accessible_restroom', 'has_wheelchair_accessible_restroom'),
+        ('wheelchair_accessible_seating', 'has_wheelchair_accessible_seating'),
+    ],
+    'children_features': [
+        ('allows_children', 'allows_children'),
+        ('high_chairs', 'has_high_chairs'),
+        ('changing_table', 'has_changing_table'),
+        ('kids_menu', 'has_kids_menu'),
+        ('good_for_kids', 'good_for_kids'),
+        ('playground', 'has_playground'),
+    ],
+    'planning': [
+        ('accepts_reservations', 'accepts_reservations'),
+        ('requires_reservations', 'requires_reservations'),
+        ('accepts_credit_cards', 'accepts_credit_cards'),
+        ('accepts_debit_cards', 'accepts_debit_cards'),
+        ('accepts_cash_only', 'accepts_cash_only'),
+        ('accepts_nfc', 'accepts_nfc'),
+    ],
+}
+
+# (group, field, highlight) in the order highlights are listed
+FEATURE_HIGHLIGHTS = [
+    ('service_options', 'delivery', 'Delivery available'),
+    ('service_options', 'takeout', 'Takeout available'),
+    ('service_options', 'dine_in', 'Dine-in available'),
+    ('service_options', 'reservable', 'Reservations accepted'),
+    ('service_options', 'curbside_pickup', 'Curbside pickup'),
+    ('accessibility', 'wheelchair_accessible_entrance', 'Wheelchair accessible'),
+    ('dining_options', 'serves_vegetarian_food', 'Vegetarian options'),
+    ('dining_options', 'serves_beer', 'Serves beer'),
+    ('dining_options', 'serves_wine', 'Serves wine'),
+    ('atmosphere_features', 'outdoor_seating', 'Outdoor seating'),
+    ('atmosphere_features', 'live_music', 'Live music'),
+    ('atmosphere_features', 'good_for_children', 'Good for kids'),
+    ('atmosphere_features', 'good_for_groups', 'Good for groups'),
+    ('atmosphere_features', 'lgbtq_friendly', 'LGBTQ+ friendly'),
+    ('offerings', 'serves_coffee', 'Serves coffee'),
+    ('offerings', 'serves_dessert', 'Serves dessert'),
+    ('offerings', 'serves_happy_hour_food', 'Happy hour food'),
+    ('offerings', 'serves_late_night_food', 'Late night food'),
+    ('offerings', 'serves_cocktails', 'Serves cocktails'),
+    ('offerings', 'allows_dogs', 'Dog-friendly'),
+    ('children_features', 'good_for_kids', 'Kid-friendly'),
+    ('children_features', 'kids_menu', 'Kids menu'),
+    ('children_features', 'high_chairs', 'High chairs available'),
+    ('children_features', 'playground', 'Has playground'),
+    ('planning', 'accepts_reservations', 'Accepts reservations'),
+    ('planning', 'accepts_credit_cards', 'Accepts credit cards'),
+    ('planning', 'accepts_cash_only', 'Cash only'),
+]
+
+# (restaurant field, test, argument, highlight) checked against the search listing
+LISTING_HIGHLIGHTS = [
+    ('rating', 'at_least', 4.5, 'Highly rated'),
+    ('price_level', 'equals', 1, 'Budget-friendly'),
+    ('price_level', 'equals', 4, 'Fine dining'),
+    ('types', 'includes', 'meal_delivery', 'Delivery available'),
+    ('types', 'includes', 'meal_takeaway', 'Takeout available'),
+    ('types', 'includes', 'bar', 'Bar available'),
+    ('types', 'includes', 'cafe', 'Cafe'),
+]
+
+# Each listing test, on the field value and the argument
+LISTING_TESTS = {
+    'at_least': lambda value, argument: value is not None and value >= argument,
+    'equals': lambda value, argument: value == argument,
+    'includes': lambda value, argument: value is not None and argument in value,
+}
+
+
+def clean_phone_number(phone):
+    """Clean and standardize phone number format"""
+    if not phone:
+        return None
+
+    # Remove all non-digit characters except +
+    cleaned = PHONE_JUNK_RE.sub('', phone)
+
+    # Format Nigerian numbers
+    if cleaned.startswith('+234'):
+        return cleaned
+    elif cleaned.startswith('234'):
+        return '+' + cleaned
+    elif cleaned.startswith('0') and len(cleaned) == 11:
+        # Convert local format (0xxx) to international (+234xxx)
+        return '+234' + cleaned[1:]
+
+    return phone  # Return original if can't parse
+
+
+def extract_location_details(address, region=None, lat=None, lng=None):
+    """Extract detailed location information from address and coordinates"""
+    if not address:
+        return {}
+
+    # Neighbourhood polygon containing the place, else the best area the
+    # address names, else the (roughly drawn) LGA containing the place, in
+    # the region the place was searched in
+    region = region or Region.load(DEFAULT_REGION)
+    area = region.locate(lat, lng)
+    if area is None:
+        area_name = region.match_area(address)
+    elif area.level == 'lga':
+        area_name = region.match_area(address, roads=False) or area.name
+    else:
+        area_name = area.name
+    postal_match = POSTAL_CODE_RE.search(address)
+    return {
+        'full_address': address,
+        'area': area_name,
+        'state': region.match_state(address),
+        'country': 'Nigeria' if 'NIGERIA' in address.upper() else None,
+        'postal_code': postal_match.group() if postal_match else None
+    }
+
+
+def interpret_price_level(price_level):
+    """Convert Google's price level (0-4) to human-readable text"""
+    return PRICE_LEVELS.get(price_level, 'Price not available')
+
+
+def parse_opening_hours(weekday_text_list):
+    """Parse opening hours into structured format"""
+    parsed_hours = {}
+    for day_text in weekday_text_list or ():
+        # Google writes "Monday: 9:00 AM – 10:00 PM"; anything else goes through the regex
+        day_name, _, time_part = day_text.partition(': ')
+        day_key = WEEKDAYS.get(day_name)
+        if day_key is None:
+            day_match = WEEKDAY_RE.match(day_text)
+            if not day_match:
+                continue
+            day_name = day_match.group()
+            day_key = WEEKDAYS[day_name]
+            time_part = day_text.replace(f'{day_name}: ', '')
+        if 'Closed' in time_part:
+            parsed_hours[day_key] = {'status': 'closed', 'hours': None}
+        elif 'Open 24 hours' in time_part:
+            parsed_hours[day_key] = {'status': 'open_24h', 'hours': '24 hours'}
+        else:
+            parsed_hours[day_key] = {'status': 'open', 'hours': time_part}
+    return parsed_hours
+
+
+def check_24_7_operation(weekday_text_list):
+    """Check if restaurant operates 24/7"""
+    if not weekday_text_list:
+        return False
+    return sum(1 for day_text in weekday_text_list if 'Open 24 hours' in day_text) == 7
+
+
+def summarize_reviews(reviews):
+    """Average rating and star distribution of the fetched reviews, or None without ratings"""
+    ratings = [r['rating'] for r in reviews if r.get('rating')]
+    if not ratings:
+        return None
+    return {
+        'total_reviews_fetched': len(reviews),
+        'avg_rating_from_reviews': sum(ratings) / len(ratings),
+        'rating_distribution': {
+            '5_star': ratings.count(5),
+            '4_star': ratings.count(4),
+            '3_star': ratings.count(3),
+            '2_star': ratings.count(2),
+            '1_star': ratings.count(1)
+        }
+    }
+
+
+class DetailsEnricher:
+    """Adds Place Details fields to a restaurant item
+
+    The feature and highlight tables are flattened into tuples once, when
+    the enricher is built, and fill() walks them for each place.
+    """
+
+    def __init__(self, feature_groups=None, feature_highlights=(), listing_highlights=()):
+        feature_groups = feature_groups or {}
+        # (group, ((field, keys), ...)) with keys always a tuple
+        self.groups = tuple(
+            (group, tuple((field, keys if isinstance(keys, tuple) else (keys,)) for field, keys in fields))
+            for group, fields in feature_groups.items()
+        )
+        # (restaurant field, test function, argument, highlight)
+        self.listing_checks = tuple((field, LISTING_TESTS[test], argument, label)
+                                    for field, test, argument, label in listing_highlights)
+        self.feature_checks = tuple(feature_highlights)
+
+    def fill(self, result, restaurant):
+        """(groups, highlights) from the Details result and the search listing"""
+        get = result.get
+        groups = {}
+        for group, fields in self.groups:
+            values = groups[group] = {}
+            for field, keys in fields:
+                # The first key with a truthy value wins
+                for key in keys:
+                    value = get(key)
+                    if value:
+                        break
+                values[field] = value
+
+        highlights = []
+        for field, test, argument, label in self.listing_checks:
+            if test(restaurant.get(field), argument):
+                highlights.append(label)
+        for group, field, label in self.feature_checks:
+            if groups[group][field]:
+                highlights.append(label)
+        return groups, highlights
+
+    def enrich(self, restaurant, result, region=None):
+        """Add the Details fields of result to restaurant in place"""
+        get = result.get
+        address = get('formatted_address')
+        phone = get('formatted_phone_number')
+        restaurant.update({
+            'formatted_address': address,
+            'phone_number': phone,
+            'phone_number_cleaned': clean_phone_number(phone),
+            'website': get('website'),
+            'google_url': f"https://www.google.com/maps/place/?q=place_id:{restaurant['place_id']}"
+        })
+
+        restaurant['location_details'] = extract_location_details(address, region, restaurant.get('latitude'),
+                                                                  restaurant.get('longitude'))
+        restaurant['price_range_text'] = interpret_price_level(restaurant.get('price_level'))
+
+        weekday_text = get('opening_hours', {}).get('weekday_text', [])
+        restaurant['opening_hours'] = weekday_text
+        restaurant['opening_hours_parsed'] = parse_opening_hours(weekday_text)
+        restaurant['is_open_24_7'] = check_24_7_operation(weekday_text)
+
+        reviews = get('reviews', [])
+        restaurant['all_reviews'] = [{
+            'author_name': review.get('author_name'),
+            'author_url': review.get('author_url'),
+            'language': review.get('language'),
+            'profile_photo_url': review.get('profile_photo_url'),
+            'rating': review.get('rating'),
+            'relative_time_description': review.get('relative_time_description'),
+            'text': review.get('text'),
+            'time': review.get('time'),
+            'translated': review.get('translated', False)
+        } for review in reviews]
+        restaurant['reviews_count'] = len(reviews)
+
+        restaurant['editorial_summary'] = get('editorial_summary', {}).get('overview')
+        restaurant['google_maps_url'] = get('url')
+
+        groups, highlights = self.fill(result, restaurant)
+        restaurant.update(groups)
+        restaurant['highlights'] = highlights
+
+        summary = summarize_reviews(reviews)
+        if summary:
+            restaurant['reviews_summary'] = summary
+        return restaurant
+
+
+FEATURE_ENRICHER = DetailsEnricher(FEATURE_GROUPS, FEATURE_HIGHLIGHTS)
+LISTING_ENRICHER = DetailsEnricher(listing_highlights=LISTING_HIGHLIGHTS)
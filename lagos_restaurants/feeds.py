@@ -0,0 +1,170 @@
+# Sharded JSON Lines crawl output
+#
+# -o file.json writes one JSON array that has to be loaded whole to be read
+# back, and a crash leaves it without its closing bracket. ShardedFeed
+# writes every scraped item as one JSON line instead, into numbered shards
+# (items-00000.jsonl.gz, items-00001.jsonl.gz, ...) that rotate after
+# FEED_SHARD_MAX_ITEMS items or FEED_SHARD_MAX_BYTES bytes on disk,
+# optionally gzip or zstd compressed. Each shard is an independent file, so
+# downstream jobs can process them in parallel. manifest.json lists the
+# shards with their record counts and is rewritten whenever a shard is
+# opened or closed.
+#
+# Compressed shards are flushed to a decompressible boundary every
+# FLUSH_EVERY items, so after a crash lagos_restaurants.records reads a
+# shard up to its last complete line.
+
+import gzip
+import json
+import os
+import time
+import zlib
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from itemadapter import ItemAdapter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST = 'manifest.json'
+
+# Shard file extension per compression
+EXTENSIONS = {None: '.jsonl', 'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+
+class ShardWriter:
+    """JSON Lines written to rotating, optionally compressed shards plus a manifest"""
+
+    FLUSH_EVERY = 1000
+
+    def __init__(self, directory, prefix='items', compression=None, max_items=None, max_bytes=None):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown feed compression {compression!r}, use one of gzip, zstd or none")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd feed compression needs the zstandard package (pip install zstandard)")
+        self.directory = directory
+        self.prefix = prefix
+        self.compression = compression
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.shards = []
+        self.raw = None
+        self.stream = None
+        self.records = 0
+        self.unflushed = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        if self.stream is None:
+            self._open_shard()
+        self.stream.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.records += 1
+        self.unflushed += 1
+        if self.unflushed >= self.FLUSH_EVERY:
+            self._flush()
+
+        shard = self.shards[-1]
+        shard['records'] += 1
+        if ((self.max_items and shard['records'] >= self.max_items)
+                or (self.max_bytes and self.raw.tell() >= self.max_bytes)):
+            self._close_shard()
+
+    def close(self, complete=True):
+        if self.stream is not None:
+            self._close_shard()
+        self._write_manifest(complete)
+
+    def _open_shard(self):
+        name = f"{self.prefix}-{len(self.shards):05d}{EXTENSIONS[self.compression]}"
+        self.raw = open(os.path.join(self.directory, name), 'wb')
+        if self.compression == 'gzip':
+            self.stream = gzip.GzipFile(filename='', mode='wb', fileobj=self.raw, compresslevel=6)
+        elif self.compression == 'zstd':
+            self.stream = zstandard.ZstdCompressor(level=3).stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+        self.shards.append({'path': name, 'records': 0, 'bytes': 0, 'complete': False})
+        self._write_manifest(False)
+
+    def _flush(self):
+        # A sync/block flush ends the compressed data at a point a reader can decode up to
+        if self.compression == 'gzip':
+            self.stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == 'zstd':
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        self.raw.flush()
+        self.unflushed = 0
+
+    def _close_shard(self):
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+        shard = self.shards[-1]
+        shard['bytes'] = os.path.getsize(os.path.join(self.directory, shard['path']))
+        shard['complete'] = True
+        self.raw = self.stream = None
+        self.unflushed = 0
+        self._write_manifest(False)
+
+    def _write_manifest(self, complete):
+        manifest = {
+            'format': 'jsonl',
+            'compression': self.compression,
+            'records': self.records,
+            'complete': complete,
+            'shards': self.shards,
+        }
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+class ShardedFeed:
+    """Write scraped items to a ShardWriter in FEED_SHARDS (%(name)s and %(time)s are filled in).
+
+    Items are taken from the item_scraped signal, so they are exactly the
+    items a regular -o feed would get. The manifest is marked complete when
+    the spider finishes normally.
+    """
+
+    def __init__(self, crawler, writer):
+        self.crawler = crawler
+        self.writer = writer
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        template = settings.get('FEED_SHARDS')
+        if not template:
+            raise NotConfigured
+        directory = template % {
+            'name': crawler.spidercls.name,
+            'time': time.strftime('%Y-%m-%dT%H-%M-%S', time.gmtime()),
+        }
+        compression = settings.get('FEED_SHARD_COMPRESSION') or None
+        writer = ShardWriter(
+            directory,
+            compression=None if compression == 'none' else compression,
+            max_items=settings.getint('FEED_SHARD_MAX_ITEMS', 50000),
+            max_bytes=settings.getint('FEED_SHARD_MAX_BYTES', 128 * 1024 * 1024)
+        )
+        s = cls(crawler, writer)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def item_scraped(self, item, spider):
+        self.writer.write(ItemAdapter(item).asdict())
+
+    def spider_closed(self, spider, reason):
+        self.writer.close(complete=reason == 'finished')
+        stats = self.crawler.stats
+        stats.set_value('feed_shards/records', self.writer.records)
+        stats.set_value('feed_shards/shards', len(self.writer.shards))
+        spider.logger.info(f"Wrote {self.writer.records} items to {len(self.writer.shards)} shards "
+                           f"in {self.writer.directory}")
@@ -0,0 +1,476 @@
+# Shared crawl frontier for running the grid spider as several workers
+#
+# Requests (grid cells, next-page tokens, Place Details lookups) are kept as
+# tasks in a store every worker can reach: a SQLite file for workers on one
+# machine, or a Redis server (-a frontier=redis://host:6379/0) for workers
+# on several. A worker claims a few tasks at a time with a lease. The task
+# is marked done once its callback has run. If the lease runs out first
+# (the worker crashed or was killed), any worker can claim the task again.
+#
+# Tasks are keyed by request fingerprint, so a cell or place queued by two
+# workers is stored once. The same store holds the place_ids seen by any
+# worker (cross-worker deduplication) and the per-grid yields for the cell
+# priors.
+
+import pickle
+import sqlite3
+import time
+import weakref
+from collections import deque
+
+from scrapy.utils.request import request_from_dict
+
+from lagos_restaurants.scheduler import DelayedScheduler
+
+# A claimed task not finished within this many seconds is handed to another worker
+DEFAULT_LEASE_SECONDS = 300
+
+# Tasks whose lease ran out this many times are given up on
+MAX_ATTEMPTS = 3
+
+# Workers extend the leases of tasks waiting in their queues, but only for
+# this many lease periods, so a request lost without a callback cannot keep
+# its task (and the worker) alive forever. Leases are only renewed while the
+# task's request still exists (queued, held back until its not_before,
+# downloading or in its callback); a task whose request was dropped without
+# its failure being reported is retried straight away.
+MAX_LEASE_RENEWALS = 3
+
+# How long an empty claim or a pending count is trusted before asking the store again
+POLL_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    request BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'ready',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, priority);
+CREATE TABLE IF NOT EXISTS places (
+    place_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS grid_results (
+    grid_id TEXT PRIMARY KEY,
+    found INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS elections (
+    name TEXT PRIMARY KEY,
+    worker TEXT NOT NULL
+);
+"""
+
+
+def open_frontier(url, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Open the frontier at a SQLite path or a redis:// URL"""
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisFrontier(url, worker_id, lease_seconds)
+    return SqliteFrontier(url, worker_id, lease_seconds)
+
+
+class SqliteFrontier:
+    """Frontier in a SQLite file shared by worker processes on one machine"""
+
+    def __init__(self, path, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        # Task ids this worker holds a lease on, with the time they were claimed
+        self.held = {}
+        # Task id -> its current request, for as long as that request is referenced anywhere
+        self.in_flight = weakref.WeakValueDictionary()
+        self.lost = 0
+        self.claiming = True
+        self.next_renewal = 0
+
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def _transaction(self, work):
+        # BEGIN IMMEDIATE takes the write lock up front so two workers never
+        # claim the same task
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = work()
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return result
+
+    def add(self, task_id, priority, request):
+        """Store a serialized request; False if the task is already known"""
+        return self.conn.execute('INSERT OR IGNORE INTO tasks (task_id, priority, request) VALUES (?, ?, ?)',
+                                 (task_id, priority, request)).rowcount == 1
+
+    def claim(self, limit):
+        """Lease up to limit tasks, highest priority first: [(task_id, request, attempts)]"""
+        if not self.claiming:
+            return []
+
+        def work():
+            now = time.time()
+            self.conn.execute("UPDATE tasks SET status = 'failed' "
+                              "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                              (now, MAX_ATTEMPTS))
+            rows = self.conn.execute(
+                "SELECT task_id, request, attempts FROM tasks "
+                "WHERE status = 'ready' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY priority DESC LIMIT ?", (now, limit)).fetchall()
+            self.conn.executemany(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE task_id = ?", [(self.worker_id, now + self.lease_seconds, row[0]) for row in rows])
+            return [(task_id, request, attempts + 1) for task_id, request, attempts in rows]
+
+        claimed = self._transaction(work)
+        self.hold(claimed)
+        return claimed
+
+    def hold(self, claimed):
+        now = time.time()
+        self.held.update((task_id, now) for task_id, _, _ in claimed)
+
+    def track(self, task_id, request):
+        """Remember the request now carrying a held task"""
+        self.in_flight[task_id] = request
+
+    def leases_held(self):
+        """Renew live leases and return their number, forgetting those held too long"""
+        lost = [task_id for task_id in self.held if task_id not in self.in_flight]
+        for task_id in lost:
+            self.retry(task_id)
+        self.lost += len(lost)
+
+        now = time.time()
+        max_hold = self.lease_seconds * (MAX_LEASE_RENEWALS + 1)
+        self.held = {task_id: claimed for task_id, claimed in self.held.items() if now - claimed < max_hold}
+        if self.held and now >= self.next_renewal:
+            self.next_renewal = now + self.lease_seconds / 3
+            self.renew(list(self.held), now + self.lease_seconds)
+        return len(self.held)
+
+    def renew(self, task_ids, expires):
+        self.conn.executemany("UPDATE tasks SET lease_expires = ? WHERE task_id = ? AND status = 'leased' AND worker = ?",
+                              [(expires, task_id, self.worker_id) for task_id in task_ids])
+
+    def complete(self, task_id):
+        self.held.pop(task_id, None)
+        self.conn.execute("UPDATE tasks SET status = 'done', request = x'' WHERE task_id = ?", (task_id,))
+
+    def retry(self, task_id):
+        """Put a failed task back for any worker, or give up after MAX_ATTEMPTS"""
+        self.held.pop(task_id, None)
+        self.conn.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'ready' END "
+                          "WHERE task_id = ? AND status = 'leased'", (MAX_ATTEMPTS, task_id))
+
+    def release(self, task_ids):
+        """Give leased tasks back without counting an attempt"""
+        task_ids = list(task_ids)
+        for task_id in task_ids:
+            self.held.pop(task_id, None)
+        self.conn.executemany("UPDATE tasks SET status = 'ready', attempts = attempts - 1 "
+                              "WHERE task_id = ? AND status = 'leased' AND worker = ?",
+                              [(task_id, self.worker_id) for task_id in task_ids])
+
+    def stop_claiming(self):
+        """Stop taking new tasks (budget spent); leased tasks still finish"""
+        self.claiming = False
+
+    def pending(self):
+        """Tasks not yet done, whoever holds them"""
+        return self.conn.execute("SELECT COUNT(*) FROM tasks WHERE status IN ('ready', 'leased')").fetchone()[0]
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status'))
+
+    def add_places(self, place_ids):
+        """Record place_ids as seen and return those no worker had seen before"""
+        def work():
+            return {place_id for place_id in place_ids
+                    if self.conn.execute('INSERT OR IGNORE INTO places (place_id) VALUES (?)',
+                                         (place_id,)).rowcount == 1}
+        return self._transaction(work) if place_ids else set()
+
+    def add_grid_result(self, grid_id, found):
+        self.conn.execute('INSERT INTO grid_results (grid_id, found) VALUES (?, ?) '
+                          'ON CONFLICT (grid_id) DO UPDATE SET found = found + excluded.found',
+                          (grid_id, found))
+
+    def grid_results(self):
+        return dict(self.conn.execute('SELECT grid_id, found FROM grid_results'))
+
+    def elect(self, name):
+        """True for exactly one worker asking, e.g. to save the priors once"""
+        return self.conn.execute('INSERT OR IGNORE INTO elections (name, worker) VALUES (?, ?)',
+                                 (name, self.worker_id)).rowcount == 1
+
+    def close(self):
+        self.conn.close()
+
+
+class RedisFrontier:
+    """Frontier on a Redis server (or anything speaking its protocol) for multi-machine crawls"""
+
+    PREFIX = 'lagos_restaurants:frontier'
+
+    # Fail tasks leased too often, requeue other expired leases, then pop the
+    # highest-priority ready tasks and lease them, all in one atomic step
+    CLAIM_SCRIPT = """
+    local p, now, lease, limit, max_attempts, worker = KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]),
+        tonumber(ARGV[3]), tonumber(ARGV[4]), ARGV[5]
+    for _, task_id in ipairs(redis.call('ZRANGEBYSCORE', p .. ':leases', '-inf', now)) do
+        redis.call('ZREM', p .. ':leases', task_id)
+        if tonumber(redis.call('HGET', p .. ':attempts', task_id) or 0) >= max_attempts then
+            redis.call('SADD', p .. ':failed', task_id)
+        else
+            redis.call('ZADD', p .. ':ready', redis.call('HGET', p .. ':priority', task_id), task_id)
+        end
+    end
+    local claimed = {}
+    for i, entry in ipairs(redis.call('ZPOPMAX', p .. ':ready', limit)) do
+        if i % 2 == 1 then
+            local attempts = redis.call('HINCRBY', p .. ':attempts', entry, 1)
+            redis.call('ZADD', p .. ':leases', now + lease, entry)
+            redis.call('HSET', p .. ':workers', entry, worker)
+            table.insert(claimed, {entry, redis.call('HGET', p .. ':requests', entry), attempts})
+        end
+    end
+    return claimed
+    """
+
+    ADD_SCRIPT = """
+    local p, task_id = KEYS[1], ARGV[1]
+    if redis.call('HSETNX', p .. ':requests', task_id, ARGV[3]) == 0 then
+        return 0
+    end
+    redis.call('HSET', p .. ':priority', task_id, ARGV[2])
+    redis.call('ZADD', p .. ':ready', ARGV[2], task_id)
+    return 1
+    """
+
+    def __init__(self, url, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("A redis:// frontier needs the redis package (pip install redis)")
+
+        self.path = url
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.held = {}
+        self.in_flight = weakref.WeakValueDictionary()
+        self.lost = 0
+        self.claiming = True
+        self.next_renewal = 0
+
+        self.client = redis.Redis.from_url(url)
+        self.claim_script = self.client.register_script(self.CLAIM_SCRIPT)
+        self.add_script = self.client.register_script(self.ADD_SCRIPT)
+
+    def key(self, name):
+        return f"{self.PREFIX}:{name}"
+
+    def add(self, task_id, priority, request):
+        return self.add_script(keys=[self.PREFIX], args=[task_id, priority, request]) == 1
+
+    def claim(self, limit):
+        if not self.claiming:
+            return []
+        rows = self.claim_script(keys=[self.PREFIX], args=[
+            time.time(), self.lease_seconds, limit, MAX_ATTEMPTS, self.worker_id])
+        claimed = [(task_id.decode(), request, int(attempts)) for task_id, request, attempts in rows]
+        self.hold(claimed)
+        return claimed
+
+    hold = SqliteFrontier.hold
+    track = SqliteFrontier.track
+    leases_held = SqliteFrontier.leases_held
+
+    def renew(self, task_ids, expires):
+        # XX only touches leases still outstanding
+        self.client.zadd(self.key('leases'), dict.fromkeys(task_ids, expires), xx=True)
+
+    def complete(self, task_id):
+        self.held.pop(task_id, None)
+        pipe = self.client.pipeline()
+        pipe.zrem(self.key('leases'), task_id)
+        pipe.sadd(self.key('done'), task_id)
+        # The task id stays in the requests hash (as an empty value) so it is not queued again
+        pipe.hset(self.key('requests'), task_id, b'')
+        pipe.execute()
+
+    def retry(self, task_id):
+        self.held.pop(task_id, None)
+        if not self.client.zrem(self.key('leases'), task_id):
+            return
+        if int(self.client.hget(self.key('attempts'), task_id) or 0) >= MAX_ATTEMPTS:
+            self.client.sadd(self.key('failed'), task_id)
+        else:
+            self.client.zadd(self.key('ready'), {task_id: float(self.client.hget(self.key('priority'), task_id))})
+
+    def release(self, task_ids):
+        task_ids = list(task_ids)
+        for task_id in task_ids:
+            self.held.pop(task_id, None)
+        for task_id in task_ids:
+            if self.client.zrem(self.key('leases'), task_id):
+                self.client.hincrby(self.key('attempts'), task_id, -1)
+                self.client.zadd(self.key('ready'), {task_id: float(self.client.hget(self.key('priority'), task_id))})
+
+    def stop_claiming(self):
+        self.claiming = False
+
+    def pending(self):
+        return self.client.zcard(self.key('ready')) + self.client.zcard(self.key('leases'))
+
+    def counts(self):
+        return {
+            'ready': self.client.zcard(self.key('ready')),
+            'leased': self.client.zcard(self.key('leases')),
+            'done': self.client.scard(self.key('done')),
+            'failed': self.client.scard(self.key('failed')),
+        }
+
+    def add_places(self, place_ids):
+        pipe = self.client.pipeline()
+        for place_id in place_ids:
+            pipe.sadd(self.key('places'), place_id)
+        return {place_id for place_id, added in zip(place_ids, pipe.execute()) if added}
+
+    def add_grid_result(self, grid_id, found):
+        self.client.hincrby(self.key('grid_results'), grid_id, found)
+
+    def grid_results(self):
+        return {grid_id.decode(): int(found) for grid_id, found in self.client.hgetall(self.key('grid_results')).items()}
+
+    def elect(self, name):
+        return bool(self.client.set(self.key(f"elections:{name}"), self.worker_id, nx=True))
+
+    def close(self):
+        self.client.close()
+
+
+def claim_requests(frontier, spider, window):
+    """Claim tasks until window leases are held and rebuild their requests"""
+    room = window - frontier.leases_held()
+    if room <= 0:
+        return []
+
+    requests = []
+    for task_id, data, attempts in frontier.claim(room):
+        request = request_from_dict(pickle.loads(data), spider=spider)
+        request.meta['frontier_task'] = task_id
+        frontier.track(task_id, request)
+        if attempts > 1:
+            # Its previous worker died; an old next_page_token may have expired meanwhile
+            request.meta['resumed_token'] = 'pagetoken=' in request.url
+            spider.crawler.stats.inc_value('frontier/reclaimed')
+        requests.append(request)
+    spider.crawler.stats.inc_value('frontier/claimed', len(requests))
+    return requests
+
+
+def retry_task(frontier, request):
+    """Hand the task of a failed request back for another try, if this worker still holds it"""
+    task_id = request.meta.get('frontier_task')
+    if task_id in frontier.held:
+        frontier.retry(task_id)
+        return True
+    return False
+
+
+class FrontierScheduler(DelayedScheduler):
+    """Scrapy scheduler that keeps requests in the spider's shared frontier.
+
+    Only active when the spider has a frontier (-a frontier=...); otherwise
+    it behaves like DelayedScheduler. Claimed requests wait in a small
+    local queue, and early ones are held back as DelayedScheduler does.
+    Requests whose lease this worker already holds (retries, requests sent
+    back by the rate limiter, a cell restarted by its own callback) stay
+    local instead of going back to the store.
+    """
+
+    def open(self, spider):
+        self.frontier = getattr(spider, 'frontier', None)
+        self.local = deque()
+        # Leases held at once, counting requests held until their
+        # not_before, so one worker cannot hoard the frontier
+        self.window = spider.settings.getint('FRONTIER_WINDOW')
+        self.next_claim = 0
+        self.pending_cache = (0, 0)
+        return super().open(spider)
+
+    def close(self, reason):
+        if self.frontier is not None:
+            if self.frontier.held:
+                # Hand unfinished leases straight back instead of letting them expire
+                self.frontier.release(self.frontier.held)
+            # Held requests went back with their leases
+            self.delayed.clear()
+            self.due.clear()
+        return super().close(reason)
+
+    def has_pending_requests(self):
+        if self.frontier is None:
+            return super().has_pending_requests()
+        if self.local or self.delayed or self.due:
+            return True
+        # Tasks leased by other workers keep this one alive, since their
+        # leases may expire and need picking up
+        return self.frontier.claiming and self.pending() > 0
+
+    def pending(self):
+        checked, count = self.pending_cache
+        if time.monotonic() - checked >= POLL_INTERVAL:
+            count = self.frontier.pending()
+            self.pending_cache = (time.monotonic(), count)
+        return count
+
+    def enqueue_request(self, request):
+        if self.frontier is None:
+            return super().enqueue_request(request)
+        if self.woken(request):
+            return True
+
+        task_id = request.meta.get('frontier_task') or self.crawler.request_fingerprinter.fingerprint(request).hex()
+        if task_id in self.frontier.held:
+            request.meta['frontier_task'] = task_id
+            self.frontier.track(task_id, request)
+            self.local.append(request)
+            self.stats.inc_value('frontier/enqueued/local', spider=self.spider)
+            return True
+
+        if not self.frontier.add(task_id, request.priority, pickle.dumps(request.to_dict(spider=self.spider))):
+            self.stats.inc_value('frontier/duplicate', spider=self.spider)
+            return False
+        self.stats.inc_value('frontier/enqueued', spider=self.spider)
+        return True
+
+    def next_request(self):
+        if self.frontier is None:
+            return super().next_request()
+        self.frontier.leases_held()
+        if self.frontier.lost:
+            self.stats.set_value('frontier/lost', self.frontier.lost, spider=self.spider)
+        return self.next_due(self.next_local)
+
+    def next_local(self):
+        if not self.local and time.monotonic() >= self.next_claim:
+            self.local.extend(claim_requests(self.frontier, self.spider, self.window))
+            if not self.local:
+                self.next_claim = time.monotonic() + POLL_INTERVAL
+
+        if not self.local:
+            return None
+        self.stats.inc_value('scheduler/dequeued', spider=self.spider)
+        return self.local.popleft()
+
+    def __len__(self):
+        if self.frontier is None:
+            return super().__len__()
+        return len(self.local) + len(self.delayed) + len(self.due)
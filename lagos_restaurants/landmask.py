@@ -0,0 +1,135 @@
+# Offline land/water mask for grid planning
+#
+# Loads a bundled simplified region polygon (water bodies cut out as holes,
+# see regions.py) and answers "does this grid cell contain any land?" so the planner
+# can drop lagoon and ocean cells before any Nearby Search is paid for.
+
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+LAGOS_LAND_PATH = os.path.join(DATA_DIR, 'regions', 'lagos.geojson')
+
+
+class Ring:
+    """A closed polygon ring of (lng, lat) points with its bounding box"""
+
+    def __init__(self, points):
+        if points[0] != points[-1]:
+            points = list(points) + [points[0]]
+        self.edges = [(points[i][0], points[i][1], points[i + 1][0], points[i + 1][1])
+                      for i in range(len(points) - 1)]
+        lngs = [p[0] for p in points]
+        lats = [p[1] for p in points]
+        self.bbox = (min(lngs), min(lats), max(lngs), max(lats))
+
+    def contains(self, lng, lat):
+        """Ray-casting point-in-polygon test"""
+        west, south, east, north = self.bbox
+        if lng < west or lng > east or lat < south or lat > north:
+            return False
+
+        inside = False
+        for x1, y1, x2, y2 in self.edges:
+            if (y1 > lat) != (y2 > lat):
+                if lng < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                    inside = not inside
+        return inside
+
+    def crosses_box(self, west, south, east, north):
+        """True if any edge of the ring passes through the box"""
+        r_west, r_south, r_east, r_north = self.bbox
+        if r_east < west or r_west > east or r_north < south or r_south > north:
+            return False
+
+        for edge in self.edges:
+            if _segment_hits_box(edge, west, south, east, north):
+                return True
+        return False
+
+
+def _segment_hits_box(edge, west, south, east, north):
+    """Liang-Barsky clip: does the segment have any part inside the box?"""
+    x1, y1, x2, y2 = edge
+    dx = x2 - x1
+    dy = y2 - y1
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x1 - west), (dx, east - x1), (-dy, y1 - south), (dy, north - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                if t > t1:
+                    return False
+                t0 = max(t0, t)
+            else:
+                if t < t0:
+                    return False
+                t1 = min(t1, t)
+    return True
+
+
+class LandMask:
+    """Land polygons (outer ring minus water holes) with fast cell tests"""
+
+    def __init__(self, polygons):
+        # polygons: list of rings as in GeoJSON, first ring outer, rest holes
+        self.polygons = [(Ring(rings[0]), [Ring(hole) for hole in rings[1:]])
+                         for rings in polygons]
+
+    @classmethod
+    def from_geojson(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        features = data['features'] if data.get('type') == 'FeatureCollection' else [data]
+        polygons = []
+        for feature in features:
+            geometry = feature.get('geometry', feature)
+            if geometry['type'] == 'Polygon':
+                polygons.append(geometry['coordinates'])
+            elif geometry['type'] == 'MultiPolygon':
+                polygons.extend(geometry['coordinates'])
+        return cls(polygons)
+
+    @classmethod
+    def lagos(cls):
+        """The bundled Lagos State land mask"""
+        return cls.from_geojson(LAGOS_LAND_PATH)
+
+    def contains(self, lat, lng):
+        """True if the point is on land"""
+        for outer, holes in self.polygons:
+            if outer.contains(lng, lat) and not any(hole.contains(lng, lat) for hole in holes):
+                return True
+        return False
+
+    def cell_has_land(self, center, cell_span):
+        """True if the cell box around center overlaps any land
+
+        Errs on the side of keeping cells: a box that straddles the coast is
+        kept even when the land inside it is a sliver.
+        """
+        lat, lng = center
+        south, north = lat - cell_span[0] / 2, lat + cell_span[0] / 2
+        west, east = lng - cell_span[1] / 2, lng + cell_span[1] / 2
+        corners = ((west, south), (west, north), (east, south), (east, north))
+
+        for outer, holes in self.polygons:
+            touches_outer = (any(outer.contains(x, y) for x, y in corners)
+                             or outer.crosses_box(west, south, east, north))
+            if not touches_outer:
+                continue
+
+            # Land unless the whole box sits inside a single water body
+            inside_hole = any(
+                all(hole.contains(x, y) for x, y in corners)
+                and not hole.crosses_box(west, south, east, north)
+                for hole in holes
+            )
+            if not inside_hole:
+                return True
+
+        return False
@@ -3,11 +3,26 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import json
+import random
+import sqlite3
+import time
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse, urlunparse
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Request, TextResponse
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, task
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from lagos_restaurants.cache import PlacesCache, split_tiers
+from lagos_restaurants.decoding import places_json, remember
+from lagos_restaurants.frontier import claim_requests, retry_task
+from lagos_restaurants.ratelimit import SqliteTokenBucket, TokenBucket
+
 
 class LagosRestaurantsSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -53,48 +68,476 @@ class LagosRestaurantsSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
-class LagosRestaurantsDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+class PlacesStatusMiddleware:
+    """Act on the status Google Places reports inside HTTP 200 JSON bodies.
+
+    OVER_QUERY_LIMIT and UNKNOWN_ERROR come back as 200 responses, so
+    RETRY_HTTP_CODES never sees them. They are retried here with
+    exponential backoff and jitter up to PLACES_STATUS_RETRY_TIMES; the
+    retry waits in the scheduler (meta['not_before']) without taking a
+    download slot. REQUEST_DENIED
+    (bad key, API disabled, billing off) opens a circuit breaker: live
+    Places requests are dropped until, after PLACES_CIRCUIT_COOLDOWN
+    seconds, a single probe request gets through and comes back allowed.
+    Every non-OK status, retry and drop is counted in the crawl stats.
+    """
+
+    TRANSIENT_STATUSES = ('OVER_QUERY_LIMIT', 'UNKNOWN_ERROR')
+
+    def __init__(self, crawler, retry_times=5, backoff_base=2.0, backoff_max=120.0, cooldown=300.0):
+        self.crawler = crawler
+        self.retry_times = retry_times
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cooldown = cooldown
+        # Circuit breaker: open while open_until is set, half-open once it has passed
+        self.open_until = None
+        self.probing = False
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
-        return s
+        settings = crawler.settings
+        return cls(
+            crawler,
+            retry_times=settings.getint('PLACES_STATUS_RETRY_TIMES', 5),
+            backoff_base=settings.getfloat('PLACES_STATUS_BACKOFF_BASE', 2),
+            backoff_max=settings.getfloat('PLACES_STATUS_BACKOFF_MAX', 120),
+            cooldown=settings.getfloat('PLACES_CIRCUIT_COOLDOWN', 300)
+        )
+
+    def is_places_request(self, request):
+        return PlacesRateLimitMiddleware.endpoint_for(request.url) is not None
+
+    def backoff(self, retries):
+        """Exponential backoff with equal jitter: half the delay fixed, half random"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** retries)
+        return delay / 2 + random.uniform(0, delay / 2)
 
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        if self.open_until is None or not self.is_places_request(request):
+            return None
+        if request.meta.get('places_circuit_probe'):
+            # The probe, sent back by the rate limiter
+            return None
+
+        if time.time() >= self.open_until and not self.probing:
+            # Half-open: let one request through to test whether access is back
+            self.probing = True
+            request.meta['places_circuit_probe'] = True
+            return None
+
+        self.crawler.stats.inc_value('places_status/circuit_dropped')
+        # Nothing can be concluded from places the crawl did not get to see
+        spider.partial_crawl = True
+        raise IgnoreRequest("Places circuit breaker open after REQUEST_DENIED")
+
+    def process_response(self, request, response, spider):
+        if 'cached' in response.flags or response.status != 200 or not self.is_places_request(request):
+            return response
+
+        try:
+            data = places_json(response)
+        except ValueError:
+            return response
+
+        status = data.get('status')
+        probe = request.meta.pop('places_circuit_probe', False)
+        if probe:
+            self.probing = False
+
+        if status == 'REQUEST_DENIED':
+            self.crawler.stats.inc_value('places_status/REQUEST_DENIED')
+            if self.open_until is None or probe:
+                self.crawler.stats.inc_value('places_status/circuit_opened')
+                spider.logger.error(f"Places API denied the request ({data.get('error_message', 'no message')}), "
+                                    f"pausing Places requests for {self.cooldown:.0f}s")
+            self.open_until = time.time() + self.cooldown
+            return response
+
+        if self.open_until is not None:
+            self.crawler.stats.inc_value('places_status/circuit_closed')
+            spider.logger.info("Places API access is back, circuit breaker closed")
+            self.open_until = None
+
+        if status not in self.TRANSIENT_STATUSES:
+            if status not in ('OK', 'ZERO_RESULTS'):
+                self.crawler.stats.inc_value(f'places_status/{status}')
+            return response
+
+        self.crawler.stats.inc_value(f'places_status/{status}')
+        retries = request.meta.get('places_status_retries', 0)
+        if retries >= self.retry_times:
+            self.crawler.stats.inc_value('places_status/gave_up')
+            endpoint = PlacesRateLimitMiddleware.endpoint_for(request.url)
+            spider.logger.error(f"Giving up on {status} for a {endpoint} request after {retries} retries")
+            return response
+
+        delay = self.backoff(retries)
+        self.crawler.stats.inc_value('places_status/retry')
+        spider.logger.info(f"{status}, retry {retries + 1}/{self.retry_times} in {delay:.1f}s")
+        retry = request.replace(dont_filter=True)
+        retry.meta['places_status_retries'] = retries + 1
+        retry.meta['not_before'] = time.time() + delay
+        # A cell already started is not the budget's to drop
+        retry.meta.pop('budget_gated', None)
+        return retry
+
+    def process_exception(self, request, exception, spider):
+        # A probe that never got an answer frees the way for the next one
+        if request.meta.pop('places_circuit_probe', False):
+            self.probing = False
         return None
 
+
+async def sleep(seconds):
+    """Wait without blocking the reactor"""
+    from twisted.internet import reactor
+
+    await maybe_deferred_to_future(task.deferLater(reactor, seconds, lambda: None))
+
+
+class PlacesRateLimitMiddleware:
+    """Pace Google Places API calls with a token bucket per endpoint.
+
+    The limit is enforced when the request reaches the downloader, not when
+    the spider yields it. A request whose token is not due yet is sent back
+    to the scheduler with meta['not_before'] set (DelayedScheduler holds it
+    there without taking a download slot) and takes its token when it comes
+    back. Requests sent back for one endpoint are spaced one token apart so
+    they do not all return at once. Requests fetched outside the scheduler
+    with engine.download (photos) set meta['rate_limit_wait'] and wait here
+    instead, in arrival order. Waits are counted under rate_limit/ in the
+    crawl stats. With PLACES_RATE_LIMIT_DB set, the buckets live in a
+    SQLite file and every spider process pointed at it shares one quota.
+    """
+
+    ENDPOINTS = {
+        '/place/nearbysearch/': 'nearby',
+        '/place/details/': 'details',
+        '/place/textsearch/': 'text',
+        '/place/photo': 'photo',
+    }
+
+    def __init__(self, crawler, qps, burst=1, db_path=None):
+        self.crawler = crawler
+        self.buckets = {}
+        self.queues = {endpoint: defer.DeferredLock() for endpoint in qps}
+        # Endpoint -> earliest not_before for the next request sent back
+        self.booked = {}
+        for endpoint, rate in qps.items():
+            if db_path:
+                self.buckets[endpoint] = SqliteTokenBucket(db_path, f"places_{endpoint}", rate, burst)
+            else:
+                self.buckets[endpoint] = TokenBucket(rate, burst)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        s = cls(
+            crawler,
+            settings.getdict('PLACES_QPS'),
+            burst=settings.getfloat('PLACES_QPS_BURST', 1),
+            db_path=settings.get('PLACES_RATE_LIMIT_DB')
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    @classmethod
+    def endpoint_for(cls, url):
+        for path, endpoint in cls.ENDPOINTS.items():
+            if path in url:
+                return endpoint
+        return None
+
+    async def process_request(self, request, spider):
+        endpoint = self.endpoint_for(request.url)
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            return None
+
+        if request.meta.get('rate_limit_wait'):
+            await self.wait_for_token(endpoint, bucket)
+            return None
+
+        wait = bucket.take()
+        if not wait:
+            return None
+
+        now = time.time()
+        not_before = max(now + wait, self.booked.get(endpoint, 0))
+        self.booked[endpoint] = not_before + 1 / bucket.rate
+        self.crawler.stats.inc_value('rate_limit/delayed')
+        self.crawler.stats.inc_value('rate_limit/wait_seconds', not_before - now)
+        retry = request.replace(dont_filter=True)
+        retry.meta['not_before'] = not_before
+        return retry
+
+    async def wait_for_token(self, endpoint, bucket):
+        queue = self.queues[endpoint]
+        started = time.time()
+        await maybe_deferred_to_future(queue.acquire())
+        try:
+            wait = bucket.take()
+            while wait:
+                await sleep(wait)
+                wait = bucket.take()
+        finally:
+            queue.release()
+
+        waited = time.time() - started
+        if waited > TokenBucket.SLACK:
+            self.crawler.stats.inc_value('rate_limit/delayed')
+            self.crawler.stats.inc_value('rate_limit/wait_seconds', waited)
+
+    def spider_closed(self, spider):
+        for bucket in self.buckets.values():
+            if hasattr(bucket, 'close'):
+                bucket.close()
+
+
+class PlacesCacheMiddleware:
+    """Answer Google Places API requests from the persistent PlacesCache.
+
+    Hits are returned as responses flagged 'cached' before the rate limiter
+    sees them, so they cost neither quota nor a download slot. Live OK
+    responses are stored on the way back. Follow-up pages are matched to
+    their query through the next_page_token found in the previous page.
+    """
+
+    SEARCH_ENDPOINTS = ('nearbysearch', 'textsearch')
+
+    def __init__(self, crawler, cache):
+        self.crawler = crawler
+        self.cache = cache
+        # next_page_token -> (query_key, page, previous page came from cache)
+        self.page_tokens = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PLACES_CACHE_ENABLED', True):
+            raise NotConfigured
+        cache = PlacesCache(
+            settings.get('PLACES_CACHE_PATH', 'places_cache.sqlite'),
+            memory_items=settings.getint('PLACES_CACHE_MEMORY_ITEMS', 2000),
+            ttls=settings.getdict('PLACES_CACHE_TTLS')
+        )
+        s = cls(crawler, cache)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def cache_target(self, request):
+        """('details', place_id, fields) or ('search', query_key, page, chained), else None"""
+        url = urlparse(request.url)
+        params = parse_qs(url.query)
+        endpoint = url.path.rstrip('/').split('/')[-2] if url.path.count('/') >= 2 else ''
+
+        if endpoint == 'details':
+            if 'place_id' not in params or 'fields' not in params:
+                return None
+            return ('details', params['place_id'][0], params['fields'][0].split(','))
+
+        if endpoint in self.SEARCH_ENDPOINTS:
+            if 'pagetoken' in params:
+                known = self.page_tokens.get(params['pagetoken'][0])
+                return ('search',) + known if known else None
+            query = sorted((k, v[0]) for k, v in params.items() if k != 'key')
+            return ('search', f"{endpoint}?{urlencode(query)}", 1, False)
+
+        return None
+
+    def process_request(self, request, spider):
+        # Requests sent back by the rate limiter were looked up already
+        if request.meta.get('places_cache_miss'):
+            return None
+
+        target = self.cache_target(request)
+        if target is None:
+            return None
+
+        if target[0] == 'details':
+            result = self.cache.get_details(target[1], target[2])
+            if result is None and request.meta.get('details_tier'):
+                return self.narrow_to_cheap_tier(request, target)
+            body = {'html_attributions': [], 'result': result, 'status': 'OK'} if result is not None else None
+        else:
+            _, query_key, page, chained = target
+            # Pages after a cached page belong to that cached result set
+            body = self.cache.get_search(query_key, page, allow_stale=chained)
+            if body is not None and body.get('next_page_token'):
+                self.page_tokens[body['next_page_token']] = (query_key, page + 1, True)
+
+        if body is None:
+            request.meta['places_cache_miss'] = True
+            self.crawler.stats.inc_value('places_cache/miss')
+            return None
+
+        self.crawler.stats.inc_value('places_cache/hit')
+        return remember(TextResponse(url=request.url, body=json.dumps(body), encoding='utf-8',
+                                     request=request, flags=['cached']), body)
+
+    def narrow_to_cheap_tier(self, request, target):
+        """Tiered details mode: reuse the cached expensive tier if the place looks unchanged
+
+        Returns a cached response when the cheap tier is cached too, a
+        replacement request for the cheap fields only when it is not, and
+        None (fetch everything in one request) when the expensive tier has
+        to be refreshed.
+        """
+        _, place_id, fields = target
+        tier = request.meta['details_tier']
+        cheap, expensive = split_tiers(fields)
+        reused = self.cache.get_tier(place_id, expensive, tier['signature'], tier['max_age']) if expensive else {}
+        request.meta['places_cache_miss'] = True
+        if reused is None:
+            self.crawler.stats.inc_value('places_cache/miss')
+            self.crawler.stats.inc_value('places_details/full')
+            return None
+
+        self.crawler.stats.inc_value('places_details/tier_reused')
+        cached = self.cache.get_details(place_id, cheap)
+        if cached is not None:
+            self.crawler.stats.inc_value('places_cache/hit')
+            cached.update(reused)
+            body = {'html_attributions': [], 'result': cached, 'status': 'OK'}
+            return remember(TextResponse(url=request.url, body=json.dumps(body), encoding='utf-8',
+                                         request=request, flags=['cached']), body)
+
+        self.crawler.stats.inc_value('places_cache/miss')
+        url = urlparse(request.url)
+        query = [(k, ','.join(cheap) if k == 'fields' else v) for k, v in parse_qsl(url.query)]
+        narrowed = request.replace(url=urlunparse(url._replace(query=urlencode(query, safe=','))),
+                                   dont_filter=True)
+        narrowed.meta['details_tier_result'] = reused
+        return narrowed
+
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        if 'cached' in response.flags or response.status != 200:
+            return response
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        target = self.cache_target(request)
+        if target is None:
+            return response
+
+        try:
+            data = places_json(response)
+        except ValueError:
+            return response
+
+        status = data.get('status')
+        if target[0] == 'details':
+            if status == 'OK':
+                tier = request.meta.get('details_tier')
+                self.store(spider, self.cache.set_details, target[1], target[2], data.get('result', {}),
+                           signature=tier['signature'] if tier else None)
+                # Cheap-tier fetch: merge the reused expensive tier back in
+                reused = request.meta.get('details_tier_result')
+                if reused:
+                    data['result'].update(reused)
+                    return remember(response.replace(body=json.dumps(data).encode('utf-8')), data)
+        elif status in ('OK', 'ZERO_RESULTS'):
+            _, query_key, page, _ = target
+            self.store(spider, self.cache.set_search, query_key, page, data)
+            if data.get('next_page_token'):
+                self.page_tokens[data['next_page_token']] = (query_key, page + 1, False)
         return response
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+    def store(self, spider, method, *args, **kwargs):
+        # The response has been paid for: a cache that can't be written (locked
+        # past its timeout, disk full) must not keep it from the callback
+        try:
+            method(*args, **kwargs)
+        except sqlite3.Error as e:
+            self.crawler.stats.inc_value('places_cache/write_error')
+            spider.logger.warning(f"Places cache write failed, response kept uncached: {e}")
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def spider_closed(self, spider):
+        for key in ('store', 'evicted', 'expired'):
+            self.crawler.stats.set_value(f'places_cache/{key}', self.cache.stats[key])
+        try:
+            self.cache.close()
+        except sqlite3.Error as e:
+            spider.logger.error(f"Places cache could not write its last {len(self.cache.pending)} entries: {e}")
 
-    def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+
+class CrawlBudgetMiddleware:
+    """Drop requests for new grid cells the spider no longer wants to pay for.
+
+    Requests flagged meta['budget_gated'] are checked with
+    spider.skip_grid(request) as they leave the scheduler (call or time
+    budget spent, sweep saturated), so the scheduler's priority order
+    decides which cells get searched. Pages and details of cells already
+    started still go through.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        if not request.meta.get('budget_gated'):
+            return None
+        skip_grid = getattr(spider, 'skip_grid', None)
+        if skip_grid is None or not skip_grid(request):
+            return None
+        self.crawler.stats.inc_value('budget/skipped_grids')
+        raise IgnoreRequest("Grid skipped by crawl budget")
+
+
+class FrontierMiddleware:
+    """Settle shared-frontier tasks (spider and downloader middleware).
+
+    Requests claimed from the frontier carry meta['frontier_task']. As a
+    spider middleware it marks the task done once everything the callback
+    yielded (next pages, details requests) has been queued, so a worker
+    dying mid-callback leaves the task to be claimed again; a callback that
+    re-queued the same task (page token retry) leaves it open, and one that
+    raised hands the task back. The freed lease is refilled from the
+    frontier straight away. As a downloader middleware it gives frontier
+    requests the spider's frontier_failed errback, which Scrapy calls for
+    every failure after the scheduler (download errors, exceptions from
+    process_response, HTTP errors), so a failed task goes back to the
+    frontier instead of holding its lease until it runs out.
+    """
+
+    def process_request(self, request, spider):
+        if request.meta.get('frontier_task') and request.errback is None and getattr(spider, 'frontier', None):
+            request.errback = spider.frontier_failed
+        return None
+
+    def process_spider_output(self, response, result, spider):
+        requeued = False
+        for entry in result:
+            if isinstance(entry, Request) and entry.meta.get('frontier_task') == response.meta.get('frontier_task'):
+                requeued = True
+            yield entry
+        yield from self.settle(response, requeued, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        requeued = False
+        async for entry in result:
+            if isinstance(entry, Request) and entry.meta.get('frontier_task') == response.meta.get('frontier_task'):
+                requeued = True
+            yield entry
+        for request in self.settle(response, requeued, spider):
+            yield request
+
+    def settle(self, response, requeued, spider):
+        """Complete the response's task unless it was re-queued, and return the requests refilling its lease"""
+        task_id = response.meta.get('frontier_task')
+        frontier = getattr(spider, 'frontier', None)
+        if not task_id or frontier is None or requeued:
+            return []
+        frontier.complete(task_id)
+        # Refill the freed lease now; the engine may not ask the scheduler
+        # again until its next heartbeat
+        return claim_requests(frontier, spider, spider.settings.getint('FRONTIER_WINDOW'))
+
+    def process_spider_exception(self, response, exception, spider):
+        frontier = getattr(spider, 'frontier', None)
+        if frontier is not None and retry_task(frontier, response.request):
+            spider.crawler.stats.inc_value('frontier/failed_callbacks')
+        return None
@@ -0,0 +1,191 @@
+# Mapping of spider records onto the MongoDB restaurants collection
+#
+# docs/mongodb_schema_design.md describes the documents the frontend reads.
+# restaurant_update() turns a crawled record into an upsert keyed on
+# place_id. The crawler owns the fields it can observe (name, contact
+# details, address and GeoJSON coordinates, hours, Google features, rating
+# summary) and $sets them by dotted path, so fields the directory maintains
+# itself (landmark, directions, wifi, categories, business_info, ...) are
+# never overwritten. Values the record does not have are left alone rather
+# than nulled. The slug, status, description, images and counters are only
+# written when the document is created.
+
+import re
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+from lagos_restaurants.regions import DEFAULT_REGION, Region
+
+# Restaurants collection indexes from the schema document, plus the upsert key
+RESTAURANT_INDEXES = [
+    ([('place_id', 1)], {'unique': True, 'sparse': True}),
+    ([('location.coordinates', '2dsphere')], {}),
+    ([('name', 'text'), ('description', 'text'), ('cuisine_types', 'text')], {}),
+    ([('slug', 1)], {'unique': True}),
+    ([('status', 1), ('featured', -1), ('rating_summary.average_rating', -1)], {}),
+    ([('categories', 1)], {}),
+    ([('business_info.subscription_tier', 1)], {}),
+    ([('location.coordinates', '2dsphere'), ('categories', 1), ('rating_summary.average_rating', -1)], {}),
+    ([('status', 1), ('featured', -1), ('rating_summary.average_rating', -1), ('created_at', -1)], {}),
+]
+
+# Schema feature -> (feature group, field) pairs of the record; True if any is True
+FEATURES = [
+    ('delivery', [('service_options', 'delivery')]),
+    ('takeaway', [('service_options', 'takeout')]),
+    ('reservations', [('service_options', 'reservable'), ('planning', 'accepts_reservations')]),
+    ('outdoor_seating', [('atmosphere_features', 'outdoor_seating')]),
+    ('live_music', [('atmosphere_features', 'live_music')]),
+    ('wheelchair_accessible', [('accessibility', 'wheelchair_accessible_entrance'),
+                               ('parking', 'wheelchair_accessible_entrance')]),
+    ('kids_friendly', [('atmosphere_features', 'good_for_children'), ('children_features', 'good_for_kids')]),
+    ('pet_friendly', [('offerings', 'allows_dogs')]),
+    ('alcohol_served', [('dining_options', 'serves_beer'), ('dining_options', 'serves_wine'),
+                        ('offerings', 'serves_cocktails')]),
+    ('vegetarian_options', [('dining_options', 'serves_vegetarian_food')]),
+]
+
+# Google business_status -> directory status of a new document
+STATUSES = {
+    'OPERATIONAL': 'active',
+    'CLOSED_TEMPORARILY': 'inactive',
+    'CLOSED_PERMANENTLY': 'inactive',
+}
+
+# Written once, when the crawler creates the document
+INSERT_DEFAULTS = {
+    'featured': False,
+    'trending': False,
+    'business_info': {'claimed': False, 'subscription_tier': 'free', 'verification_status': 'pending'},
+    'view_count': 0,
+    'contact_clicks': 0,
+    'direction_requests': 0,
+}
+
+SLUG_JUNK_RE = re.compile(r'[^a-z0-9]+')
+CLOCK_RE = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*([AP]M)?', re.IGNORECASE)
+
+_cities = {}
+
+
+def slugify(*parts):
+    return SLUG_JUNK_RE.sub('-', ' '.join(p for p in parts if p).lower()).strip('-')
+
+
+def to_24h(clock, meridiem=None):
+    """'9:30 PM' -> '21:30'; a time without AM/PM takes meridiem"""
+    match = CLOCK_RE.search(clock)
+    if not match:
+        return None
+    hour, minute, suffix = int(match.group(1)), int(match.group(2) or 0), (match.group(3) or meridiem or '').upper()
+    if suffix == 'PM' and hour != 12:
+        hour += 12
+    elif suffix == 'AM' and hour == 12:
+        hour = 0
+    return f"{hour:02d}:{minute:02d}"
+
+
+def day_hours(day):
+    """Schema hours of one parsed day: first opening to last closing"""
+    if day['status'] == 'closed':
+        return {'closed': True}
+    if day['status'] == 'open_24h':
+        return {'open': '00:00', 'close': '24:00', 'closed': False}
+    # "11:00 AM – 3:00 PM, 5:00 – 11:00 PM"; Google drops AM/PM shared with the closing time
+    ranges = [r.split('–') for r in day['hours'].split(',')]
+    if any(len(r) != 2 for r in ranges):
+        return None
+    first_close = CLOCK_RE.search(ranges[0][1])
+    meridiem = first_close.group(3) if first_close else None
+    return {'open': to_24h(ranges[0][0], meridiem), 'close': to_24h(ranges[-1][1]), 'closed': False}
+
+
+def city_for(record):
+    region_name = record.get('region') or DEFAULT_REGION
+    city = _cities.get(region_name)
+    if city is None:
+        city = _cities[region_name] = Region.load(region_name).label
+    return city
+
+
+def restaurant_update(record, now):
+    """(filter, update) upserting a spider record into the restaurants collection"""
+    place_id = record['place_id']
+    details = record.get('location_details') or {}
+    fields = {
+        'place_id': place_id,
+        'name': record.get('name'),
+        'website': record.get('website'),
+        'location.address.street': (record.get('formatted_address') or '').split(',')[0] or None,
+        'location.address.area': details.get('area'),
+        'location.address.city': city_for(record),
+        'location.address.state': details.get('state'),
+        'location.address.country': details.get('country'),
+        'location.address.postal_code': details.get('postal_code'),
+        'google.place_id': place_id,
+        'google.maps_url': record.get('google_maps_url'),
+        'google.types': record.get('types'),
+        'google.business_status': record.get('business_status'),
+        'google.price_level': record.get('price_level'),
+        'google.highlights': record.get('highlights'),
+        'google.editorial_summary': record.get('editorial_summary'),
+        'updated_at': now,
+        'last_verified': now,
+    }
+
+    phone = record.get('phone_number_cleaned')
+    if phone:
+        fields['phone'] = [phone]
+
+    lat, lng = record.get('latitude'), record.get('longitude')
+    if lat is not None and lng is not None:
+        fields['location.coordinates'] = {'type': 'Point', 'coordinates': [lng, lat]}
+
+    price_level = record.get('price_level')
+    if price_level:
+        fields['price_range.symbol'] = '₦' * price_level
+
+    parsed = record.get('opening_hours_parsed')
+    if parsed:
+        hours = {day: day_hours(value) for day, value in parsed.items()}
+        fields['hours'] = {day: value for day, value in hours.items() if value}
+
+    for feature, sources in FEATURES:
+        values = [(record.get(group) or {}).get(field) for group, field in sources]
+        known = [value for value in values if value is not None]
+        if known:
+            fields[f'features.{feature}'] = any(known)
+
+    if record.get('rating') is not None:
+        summary = {'average_rating': record['rating'], 'total_reviews': record.get('user_ratings_total') or 0}
+        distribution = (record.get('reviews_summary') or {}).get('rating_distribution')
+        if distribution:
+            summary['rating_distribution'] = {key[0]: count for key, count in distribution.items()}
+        fields['rating_summary'] = summary
+
+    on_insert = dict(INSERT_DEFAULTS,
+                     slug=slugify(record.get('name'), details.get('area'), place_id[-6:]),
+                     status=STATUSES.get(record.get('business_status'), 'pending'),
+                     created_at=now)
+    if record.get('editorial_summary'):
+        on_insert['description'] = record['editorial_summary']
+
+    # Only photos stored locally by PhotoPipeline; raw Places URLs carry the API key.
+    # images belongs to the directory once created, google.photo follows the crawl
+    photo = record.get('photo')
+    if photo:
+        fields['google.photo'] = dict(photo, url=record['photo_url'])
+        on_insert['images'] = [{'url': record['photo_url'], 'is_primary': True}]
+
+    update = {'$set': {key: value for key, value in fields.items() if value is not None},
+              '$setOnInsert': on_insert}
+    return {'place_id': place_id}, update
+
+
+def create_indexes(collection):
+    """Create the restaurants indexes; existing ones are left as they are"""
+    return collection.create_indexes([pymongo.IndexModel(keys, **options)
+                                      for keys, options in RESTAURANT_INDEXES])
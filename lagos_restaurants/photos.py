@@ -0,0 +1,139 @@
+# Local, content-addressed copies of place photos
+#
+# Every photo is stored once under the BLAKE2b hash of its downloaded bytes,
+# as one file per variant and format: <hh>/<hash>-<variant>.<ext>. A file
+# never changes once written, so it can be served with a far-future cache
+# lifetime. photos.sqlite, next to the files, records which hashes have been
+# rendered (and with which variant spec) and which hash each Places photo
+# reference resolved to. A re-run does not download a reference it has seen
+# before, and a new reference whose bytes are already in the store (Google
+# hands out fresh references for the same photo) is not rendered again.
+#
+# render_variants() decodes, resizes and encodes; it is CPU bound and meant
+# to run in a worker process, so it only takes and returns plain data.
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Output formats, in the order pages should offer them
+FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    hash TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS photo_references (
+    reference TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+"""
+
+
+def photo_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def variant_path(digest, name, ext):
+    """Path of a variant file relative to the store"""
+    return f"{digest[:2]}/{digest}-{name}.{ext}"
+
+
+def _target_size(source, width, height):
+    """Output size for a variant: cropped to width x height, or scaled to width"""
+    if height:
+        return width, height
+    if source[0] <= width:
+        return source
+    return width, max(1, round(source[1] * width / source[0]))
+
+
+def render_variants(data, digest, directory, variants, quality=80):
+    """Write every variant of an image as WebP and JPEG and return its photo entry
+
+    variants maps a name to (width, height); a falsy height keeps the aspect
+    ratio and never upscales. Files are written under a temporary name and
+    renamed, so a concurrent render of the same photo cannot leave a
+    half-written file behind.
+    """
+    image = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder scale down by a power of two while decoding
+    largest = max(variants.values(), key=lambda size: size[0])
+    image.draft('RGB', (largest[0], largest[1] or largest[0]))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    os.makedirs(os.path.join(directory, digest[:2]), exist_ok=True)
+    entry = {'hash': digest, 'width': image.width, 'height': image.height, 'variants': {}}
+    for name, (width, height) in variants.items():
+        size = _target_size(image.size, width, height)
+        if size == image.size:
+            resized = image
+        elif height:
+            resized = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            resized = image.resize(size, Image.LANCZOS)
+
+        files = {'width': size[0], 'height': size[1]}
+        for ext, fmt in FORMATS:
+            path = variant_path(digest, name, ext)
+            full_path = os.path.join(directory, path)
+            tmp_path = f"{full_path}.{os.getpid()}.tmp"
+            if fmt == 'JPEG':
+                resized.save(tmp_path, fmt, quality=quality, optimize=True, progressive=True)
+            else:
+                resized.save(tmp_path, fmt, quality=quality, method=4)
+            os.replace(tmp_path, full_path)
+            files[ext] = path
+        entry['variants'][name] = files
+    return entry
+
+
+class PhotoStore:
+    """Photo files under a directory plus the SQLite index of hashes and references"""
+
+    def __init__(self, directory, variants, quality=80):
+        self.directory = directory
+        self.variants = {name: tuple(size) for name, size in variants.items()}
+        self.quality = quality
+        # Entries rendered with other variants or quality are rendered again
+        self.spec = json.dumps({'variants': self.variants, 'quality': quality,
+                                'formats': [ext for ext, _ in FORMATS]}, sort_keys=True)
+
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'photos.sqlite'))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def get(self, digest):
+        """Photo entry for a content hash, or None if not rendered with the current spec"""
+        row = self.conn.execute('SELECT entry FROM photos WHERE hash = ? AND spec = ?',
+                                (digest, self.spec)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def by_reference(self, reference):
+        """Photo entry a Places photo reference resolved to before, or None"""
+        row = self.conn.execute(
+            'SELECT p.entry FROM photo_references r JOIN photos p ON p.hash = r.hash '
+            'WHERE r.reference = ? AND p.spec = ?', (reference, self.spec)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add(self, entry, reference=None):
+        """Record a rendered photo and, optionally, the reference it came from"""
+        self.conn.execute('INSERT OR REPLACE INTO photos (hash, spec, entry) VALUES (?, ?, ?)',
+                          (entry['hash'], self.spec, json.dumps(entry)))
+        if reference:
+            self.conn.execute('INSERT OR REPLACE INTO photo_references (reference, hash) VALUES (?, ?)',
+                              (reference, entry['hash']))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
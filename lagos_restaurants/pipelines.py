@@ -4,10 +4,403 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 
+import json
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse, urlunparse
+
+from scrapy import Request, signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, task, threads
+
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from lagos_restaurants import mongo, photos
+from lagos_restaurants.middlewares import PlacesRateLimitMiddleware
+from lagos_restaurants.snapshot import SnapshotIndex, content_hash
+
 
 class LagosRestaurantsPipeline:
     def process_item(self, item, spider):
         return item
+
+
+class DeltaPipeline:
+    """Reduce an incremental crawl to a delta feed against the previous snapshot.
+
+    Active when the spider was started with -a snapshot= or -a previous=.
+    New and changed places are written to the delta file as upserts and
+    passed on; unchanged places are dropped, so feed exports only carry
+    the changes. A known place whose Place Details lookup failed (marked
+    details_error by the spider) keeps its previous entry and is dropped
+    too, so its listing-only record never overwrites the full one. When the crawl finishes normally, places from the previous
+    snapshot that were not seen again are written as tombstones. The
+    updated index is saved for the next run.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.enabled = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler)
+        # spider_closed carries the finish reason, which close_spider does not
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.enabled = getattr(spider, 'incremental', False)
+        if not self.enabled:
+            return
+
+        self.previous = spider.previous_snapshot
+        self.current = SnapshotIndex()
+        self.counts = Counter()
+        self.delta_file = open(spider.delta_path, 'w', encoding='utf-8')
+        spider.logger.info(f"Incremental crawl against {len(self.previous)} known places, "
+                           f"writing delta to {spider.delta_path}")
+
+    def process_item(self, item, spider):
+        if not self.enabled:
+            return item
+
+        record = ItemAdapter(item).asdict()
+        place_id = record.get('place_id')
+        if not place_id:
+            return item
+
+        old = self.previous.get(place_id)
+        if old is not None and record.get('details_error'):
+            self.current.set(place_id, *old)
+            self.counts['details_failed'] += 1
+            raise DropItem(f"Place Details failed, keeping the previous record: {place_id}")
+
+        digest = content_hash(record)
+        status = record.get('business_status')
+        self.current.set(place_id, digest, status)
+        if old is not None and old[0] == digest:
+            self.counts['unchanged'] += 1
+            raise DropItem(f"Unchanged since previous snapshot: {place_id}")
+
+        entry = {'op': 'upsert', 'place_id': place_id}
+        if old is None:
+            self.counts['new'] += 1
+        else:
+            self.counts['changed'] += 1
+            if old[1] != status:
+                self.counts['status_changed'] += 1
+                entry['previous_business_status'] = old[1]
+        entry['record'] = record
+        self.delta_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return item
+
+    def spider_closed(self, spider, reason):
+        if not self.enabled:
+            return
+
+        # Places found by the crawl but never emitted (e.g. enriched before a
+        # checkpoint resume) are still live
+        seen = getattr(spider, 'processed_place_ids', set())
+        for place_id, (digest, status) in self.previous.entries.items():
+            if place_id in self.current or place_id in seen:
+                if place_id not in self.current:
+                    self.current.set(place_id, digest, status)
+            elif reason == 'finished' and not getattr(spider, 'partial_crawl', False):
+                # Only a complete crawl can tell that a place has disappeared
+                self.counts['tombstone'] += 1
+                self.delta_file.write(json.dumps({'op': 'tombstone', 'place_id': place_id,
+                                                  'business_status': status}) + '\n')
+            else:
+                self.current.set(place_id, digest, status)
+
+        self.delta_file.close()
+        if spider.snapshot_path:
+            self.current.save(spider.snapshot_path)
+
+        for key, value in self.counts.items():
+            self.crawler.stats.set_value(f'delta/{key}', value)
+        spider.logger.info(f"Delta: {self.counts['new']} new, {self.counts['changed']} changed "
+                           f"({self.counts['status_changed']} business_status changes), "
+                           f"{self.counts['unchanged']} unchanged, {self.counts['tombstone']} tombstones, "
+                           f"{self.counts['details_failed']} kept after a failed details lookup")
+
+
+def deferred_from_future(future):
+    """Deferred firing in the reactor thread when a concurrent.futures Future completes"""
+    from twisted.internet import reactor
+
+    d = defer.Deferred()
+
+    def done(future):
+        error = future.exception()
+        if error is not None:
+            reactor.callFromThread(d.errback, error)
+        else:
+            reactor.callFromThread(d.callback, future.result())
+
+    future.add_done_callback(done)
+    return d
+
+
+class PhotoPipeline:
+    """Replace Places photo URLs with local, content-addressed photo variants.
+
+    Active when PHOTOS_STORE is set and Pillow is installed. Photos are
+    fetched through the downloader, so the photo QPS limit applies, at most
+    PHOTOS_CONCURRENCY at a time. Each one is resized into PHOTOS_VARIANTS,
+    as WebP and JPEG, by a pool of PHOTOS_WORKERS processes, so encoding
+    never blocks the reactor. A reference seen in an earlier run is not
+    downloaded again, and bytes whose hash is already stored are not
+    rendered again. photo_url then points at the PHOTOS_DEFAULT_VARIANT JPEG
+    under PHOTOS_URL_PREFIX, and a photo field lists every variant. Records
+    whose photo cannot be fetched keep their Places URL.
+    """
+
+    # Largest maxwidth the Places photo endpoint accepts
+    MAX_WIDTH = 1600
+
+    def __init__(self, crawler, store, url_prefix='/photos', concurrency=4, workers=2, default_variant='card'):
+        self.crawler = crawler
+        self.store = store
+        self.url_prefix = url_prefix.rstrip('/')
+        self.workers = workers
+        self.default_variant = default_variant
+        self.semaphore = defer.DeferredSemaphore(concurrency)
+        self.max_width = min(self.MAX_WIDTH, max(width for width, _ in store.variants.values()))
+        self.pool = None
+        # Photo reference -> Deferreds of items waiting on its download
+        self.fetching = {}
+        # Content hash -> Future of a render in progress, shared by duplicates
+        self.rendering = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        directory = settings.get('PHOTOS_STORE')
+        if not directory:
+            raise NotConfigured
+        if photos.Image is None:
+            raise NotConfigured("PhotoPipeline needs Pillow (pip install Pillow)")
+        store = photos.PhotoStore(
+            directory,
+            settings.getdict('PHOTOS_VARIANTS'),
+            quality=settings.getint('PHOTOS_QUALITY', 80)
+        )
+        return cls(
+            crawler,
+            store,
+            url_prefix=settings.get('PHOTOS_URL_PREFIX', '/photos'),
+            concurrency=settings.getint('PHOTOS_CONCURRENCY', 4),
+            workers=settings.getint('PHOTOS_WORKERS', 2),
+            default_variant=settings.get('PHOTOS_DEFAULT_VARIANT', 'card')
+        )
+
+    def open_spider(self, spider):
+        # spawn: a forked child would inherit the reactor and its threads
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def close_spider(self, spider):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.store.close()
+
+    async def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        url = adapter.get('photo_url')
+        if not url or PlacesRateLimitMiddleware.endpoint_for(url) != 'photo':
+            return item
+
+        reference = parse_qs(urlparse(url).query).get('photoreference', [None])[0]
+        if not reference:
+            return item
+
+        entry = self.store.by_reference(reference)
+        if entry is not None:
+            self.crawler.stats.inc_value('photos/reference_known')
+        elif reference in self.fetching:
+            # Branches of a chain often share a photo: wait for the download under way
+            waiter = defer.Deferred()
+            self.fetching[reference].append(waiter)
+            entry = await maybe_deferred_to_future(waiter)
+        else:
+            self.fetching[reference] = []
+            try:
+                await maybe_deferred_to_future(self.semaphore.acquire())
+                try:
+                    entry = await self.fetch(url, reference, spider)
+                finally:
+                    self.semaphore.release()
+            finally:
+                for waiter in self.fetching.pop(reference):
+                    waiter.callback(entry)
+        if entry is None:
+            return item
+
+        variants = {name: {key: f"{self.url_prefix}/{value}" if key in ('webp', 'jpg') else value
+                           for key, value in files.items()}
+                    for name, files in entry['variants'].items()}
+        default = variants.get(self.default_variant) or next(iter(variants.values()))
+        adapter['photo_url'] = default['jpg']
+        adapter['photo'] = {'hash': entry['hash'], 'width': entry['width'], 'height': entry['height'],
+                            'variants': variants}
+        return item
+
+    async def fetch(self, url, reference, spider):
+        """Download a photo and return its stored entry, rendering it if the bytes are new"""
+        parsed = urlparse(url)
+        query = [(k, str(self.max_width) if k == 'maxwidth' else v) for k, v in parse_qsl(parsed.query)]
+        # The photo endpoint redirects to an image host outside allowed_domains.
+        # engine.download skips the scheduler, so the rate limiter waits in place
+        request = Request(urlunparse(parsed._replace(query=urlencode(query))), dont_filter=True,
+                          meta={'allow_offsite': True, 'rate_limit_wait': True})
+        try:
+            response = await maybe_deferred_to_future(self.crawler.engine.download(request))
+        except Exception as e:
+            self.crawler.stats.inc_value('photos/failed')
+            spider.logger.warning(f"Photo download failed for {reference}: {e!r}")
+            return None
+
+        if response.status != 200 or not response.body:
+            self.crawler.stats.inc_value('photos/failed')
+            spider.logger.warning(f"Photo download failed for {reference}: HTTP {response.status}")
+            return None
+        self.crawler.stats.inc_value('photos/downloaded')
+
+        digest = photos.photo_hash(response.body)
+        entry = self.store.get(digest)
+        if entry is not None:
+            self.crawler.stats.inc_value('photos/duplicate')
+        else:
+            future = self.rendering.get(digest)
+            if future is None:
+                future = self.rendering[digest] = self.pool.submit(
+                    photos.render_variants, response.body, digest, self.store.directory,
+                    self.store.variants, self.store.quality)
+                self.crawler.stats.inc_value('photos/rendered')
+            else:
+                self.crawler.stats.inc_value('photos/duplicate')
+            try:
+                entry = await maybe_deferred_to_future(deferred_from_future(future))
+            except Exception as e:
+                self.crawler.stats.inc_value('photos/failed')
+                spider.logger.warning(f"Could not render photo {reference}: {e!r}")
+                return None
+            finally:
+                self.rendering.pop(digest, None)
+        self.store.add(entry, reference)
+        return entry
+
+
+class MongoPipeline:
+    """Upsert places into the MongoDB restaurants collection in unordered bulk writes.
+
+    Active when MONGO_URI is set and pymongo is installed. Records are
+    mapped onto docs/mongodb_schema_design.md by mongo.restaurant_update and
+    buffered; a batch is written with one unordered bulk_write once
+    MONGO_BATCH_SIZE records are waiting or the oldest has waited
+    MONGO_FLUSH_INTERVAL seconds. Writes run in a thread, one batch at a
+    time, and the item that fills a batch is only passed on once the batch
+    is written, so a slow server holds back the crawl instead of growing
+    the buffer. The collection's indexes are created at spider open.
+    Records without a place_id are passed on untouched.
+    """
+
+    def __init__(self, crawler, collection, batch_size=500, flush_interval=5.0, client=None):
+        self.crawler = crawler
+        self.collection = collection
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.buffered_since = None
+        self.lock = defer.DeferredLock()
+        self.timer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        uri = settings.get('MONGO_URI')
+        if not uri:
+            raise NotConfigured
+        if mongo.pymongo is None:
+            raise NotConfigured("MongoPipeline needs pymongo (pip install pymongo)")
+        client = mongo.pymongo.MongoClient(uri)
+        collection = client[settings.get('MONGO_DATABASE', 'lagos_restaurant_directory')][
+            settings.get('MONGO_COLLECTION', 'restaurants')]
+        return cls(
+            crawler,
+            collection,
+            batch_size=settings.getint('MONGO_BATCH_SIZE', 500),
+            flush_interval=settings.getfloat('MONGO_FLUSH_INTERVAL', 5),
+            client=client
+        )
+
+    def open_spider(self, spider):
+        self.logger = spider.logger
+        mongo.create_indexes(self.collection)
+        self.timer = task.LoopingCall(self.flush_if_due)
+        self.timer.start(min(1.0, self.flush_interval), now=False)
+
+    def close_spider(self, spider):
+        if self.timer is not None and self.timer.running:
+            self.timer.stop()
+        d = self.flush()
+        if self.client is not None:
+            d.addBoth(lambda _: self.client.close())
+        return d
+
+    def process_item(self, item, spider):
+        record = ItemAdapter(item).asdict()
+        if not record.get('place_id'):
+            return item
+
+        filter_, update = mongo.restaurant_update(record, datetime.now(timezone.utc))
+        self.buffer.append(mongo.pymongo.UpdateOne(filter_, update, upsert=True))
+        if self.buffered_since is None:
+            self.buffered_since = time.monotonic()
+        if len(self.buffer) >= self.batch_size:
+            return self.flush().addCallback(lambda _: item)
+        return item
+
+    def flush_if_due(self):
+        if self.buffered_since is not None and time.monotonic() - self.buffered_since >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered upserts; the Deferred fires once they are written"""
+        batch, self.buffer = self.buffer, []
+        self.buffered_since = None
+        if not batch:
+            return defer.succeed(None)
+        d = self.lock.run(threads.deferToThread, self.collection.bulk_write, batch, ordered=False)
+        d.addCallbacks(self.written, self.write_failed, errbackArgs=(len(batch),))
+        return d
+
+    def written(self, result):
+        self.count_writes(result.upserted_count, result.modified_count, result.matched_count)
+
+    def write_failed(self, failure, size):
+        stats = self.crawler.stats
+        if failure.check(mongo.pymongo.errors.BulkWriteError):
+            # Unordered: everything but the failed operations was written
+            details = failure.value.details
+            errors = details.get('writeErrors', [])
+            stats.inc_value('mongo/write_errors', len(errors))
+            self.logger.error(f"MongoDB rejected {len(errors)} of {size} upserts, "
+                              f"first: {errors[0].get('errmsg') if errors else failure.value}")
+            self.count_writes(details.get('nUpserted', 0), details.get('nModified', 0), details.get('nMatched', 0))
+        else:
+            stats.inc_value('mongo/lost', size)
+            self.logger.error(f"MongoDB bulk write of {size} upserts failed: {failure.value!r}")
+
+    def count_writes(self, upserted, modified, matched):
+        stats = self.crawler.stats
+        stats.inc_value('mongo/batches')
+        stats.inc_value('mongo/upserted', upserted)
+        stats.inc_value('mongo/modified', modified)
+        stats.inc_value('mongo/matched', matched)
@@ -0,0 +1,82 @@
+# Per-cell yield history for grid crawl scheduling
+#
+# Remembers how many unique restaurants each grid cell produced in past runs
+# so the next run can search productive cells first (and at a higher Scrapy
+# request priority) and only revisit cells that keep coming back empty every
+# few runs. Cells are keyed by centre and radius rather than by grid_id, so
+# the history survives planner and ordering changes. For type/keyword
+# sweeps beyond the default one the yield counts only places no earlier
+# sweep had found, so sweeps that add little in a cell get pruned there.
+
+import json
+import os
+import zlib
+
+# Weight of the latest run in the moving average of a cell's yield
+YIELD_SMOOTHING = 0.5
+
+# A cell empty this many runs in a row is only searched every Nth run
+EMPTY_STREAK_SKIP = 3
+EMPTY_SAMPLE_EVERY = 5
+
+# Request priority is the expected yield, capped so one cell cannot starve the rest
+MAX_PRIORITY = 60
+
+
+def cell_key(center, radius, sweep=None):
+    """Key for a cell's history; extra sweeps over the same cell get their own"""
+    key = f"{center[0]:.5f},{center[1]:.5f},{radius}"
+    return f"{key},{sweep}" if sweep else key
+
+
+class CellPriors:
+    """JSON-backed {cell key: yield history} store"""
+
+    def __init__(self, path, cells=None, runs=0):
+        self.path = path
+        self.cells = cells if cells is not None else {}
+        self.runs = runs
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(path, data.get('cells', {}), data.get('runs', 0))
+
+    def expected_yield(self, key):
+        """Smoothed unique-restaurant count for a cell, or None if never searched"""
+        entry = self.cells.get(key)
+        return entry['yield'] if entry else None
+
+    def priority(self, key, default=0):
+        expected = self.expected_yield(key)
+        if expected is None:
+            return default
+        return min(MAX_PRIORITY, int(round(expected)))
+
+    def should_search(self, key, min_yield=0):
+        """False for persistently empty (or below min_yield) cells on runs where they are not sampled"""
+        entry = self.cells.get(key)
+        if not entry or (entry['empty_streak'] < EMPTY_STREAK_SKIP and entry['yield'] >= min_yield):
+            return True
+        # Spread sampled cells over runs instead of revisiting them all at once
+        return (self.runs + zlib.crc32(key.encode())) % EMPTY_SAMPLE_EVERY == 0
+
+    def record(self, key, found):
+        entry = self.cells.get(key)
+        if entry is None:
+            entry = self.cells[key] = {'yield': float(found), 'runs': 0, 'empty_streak': 0}
+        else:
+            entry['yield'] = YIELD_SMOOTHING * found + (1 - YIELD_SMOOTHING) * entry['yield']
+        entry['runs'] += 1
+        entry['empty_streak'] = entry['empty_streak'] + 1 if found == 0 else 0
+
+    def save(self):
+        """Write the store atomically and count the run"""
+        self.runs += 1
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'runs': self.runs, 'cells': self.cells}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,80 @@
+# Token-bucket rate limiting for the Google Places API
+#
+# A token is only taken when the caller is about to send: take() either
+# hands one out or says how long until the next one is due, and the caller
+# waits that long before asking again. Nothing is reserved ahead of time, so
+# a request that is still waiting never holds a slot a more urgent request
+# could use, and an abandoned wait costs no quota.
+#
+# SqliteTokenBucket keeps the bucket state in a shared SQLite file so several
+# spider processes using the same API key draw from one quota.
+
+import sqlite3
+import time
+
+
+class TokenBucket:
+    """In-process token bucket"""
+
+    # A token due within this many seconds is handed out now; the small debt
+    # covers timer lateness, which a full bucket would otherwise waste
+    SLACK = 0.01
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.time()
+
+    def take(self):
+        """Take a token and return 0, or return the seconds until one is due"""
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > self.SLACK:
+            return wait
+        self.tokens -= 1
+        return 0.0
+
+
+class SqliteTokenBucket:
+    """Token bucket whose state lives in a SQLite file shared between processes"""
+
+    def __init__(self, path, name, rate, burst=1):
+        self.path = path
+        self.name = name
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        self.conn.execute('INSERT OR IGNORE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                          (name, self.burst, time.time()))
+
+    def take(self):
+        """Take a token and return 0, or return the seconds until one is due"""
+        # BEGIN IMMEDIATE takes the write lock up front so takes from
+        # different processes are serialised
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            tokens, updated = self.conn.execute(
+                'SELECT tokens, updated FROM buckets WHERE name = ?', (self.name,)).fetchone()
+            now = time.time()
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            wait = max(0.0, (1 - tokens) / self.rate)
+            if wait <= TokenBucket.SLACK:
+                wait = 0.0
+                tokens -= 1
+            self.conn.execute('UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?',
+                              (tokens, now, self.name))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,268 @@
+# Readers for spider output files
+#
+# Spider runs are written either as a JSON array (-o file.json), as JSON
+# Lines (-o file.jsonl, optionally .gz or .zst compressed) or as a directory
+# of JSON Lines shards with a manifest (FEED_SHARDS, see feeds.py); tools
+# that consume them go through iter_records so they accept all of them.
+#
+# Files are read as a stream of chunks, decompressed incrementally and
+# parsed one record at a time (a JSON array element by element), so memory
+# stays flat however large the dump is. A file cut short by a crash (a
+# compressed stream without its end, an array without its closing bracket,
+# a half-written last line or element) is read up to its last complete
+# record and then reported: to the reader's on_truncated callback if it
+# was given one, as a TruncatedInput error otherwise.
+
+import codecs
+import itertools
+import json
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST = 'manifest.json'
+CHUNK_SIZE = 1 << 20
+COMPRESSED_READ_SIZE = 1 << 16
+# No record comes close; more unparsable text than this is a broken file, not a long record
+MAX_RECORD_SIZE = 64 << 20
+# Byte ranges of plain JSON Lines files are no smaller than this
+MIN_RANGE_SIZE = 4 << 20
+
+
+class TruncatedInput(ValueError):
+    """Input that ends part-way through, e.g. written by a crashed spider"""
+
+
+def truncated(message, on_truncated):
+    if on_truncated is None:
+        raise TruncatedInput(message)
+    on_truncated(message)
+
+
+def shard_paths(path):
+    """Files of a sharded feed (its directory or manifest), in order; [path] for a plain file"""
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST)
+    if os.path.basename(path) != MANIFEST:
+        return [path]
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(path)
+    return [os.path.join(directory, shard['path']) for shard in manifest['shards']]
+
+
+def iter_chunks(path, on_truncated=None):
+    """Decompressed bytes of a file in chunks of at most about CHUNK_SIZE, up to
+    where a compressed stream was cut off"""
+    if path.endswith('.gz'):
+        decompress, finished = _gzip_decompressor()
+    elif path.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError(f"Reading {path} needs the zstandard package (pip install zstandard)")
+        decompress, finished = _zstd_decompressor()
+    else:
+        decompress = None
+
+    # Dumps compress 10-20x, so compressed input is read in smaller pieces
+    read_size = CHUNK_SIZE if decompress is None else COMPRESSED_READ_SIZE
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(read_size)
+            if not data:
+                if decompress is not None and not finished():
+                    truncated(f"{path} ends part-way through its compressed stream", on_truncated)
+                return
+            if decompress is None:
+                yield data
+            else:
+                yield from decompress(data)
+
+
+def _gzip_decompressor():
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(data):
+        while data:
+            chunk = decompressor.decompress(data, CHUNK_SIZE)
+            if chunk:
+                yield chunk
+            data = decompressor.unconsumed_tail
+    return decompress, lambda: decompressor.eof
+
+
+def _zstd_decompressor():
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(data):
+        chunk = decompressor.decompress(data)
+        if chunk:
+            yield chunk
+    # Older zstandard releases can't tell
+    return decompress, lambda: getattr(decompressor, 'eof', True)
+
+
+def iter_lines(chunks):
+    """Lines of a stream of byte chunks; a last line without newline is yielded too"""
+    rest = b''
+    for chunk in chunks:
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def iter_json_lines(chunks, name='input', partial_tail=True, on_truncated=None):
+    """Records of JSON Lines, up to the last complete line if the input was cut off
+
+    With partial_tail=False an invalid last line is an error too (a byte
+    range of a file, which can't end with a cut-off line).
+    """
+    bad = None
+    for line in iter_lines(chunks):
+        line = line.strip()
+        if not line:
+            continue
+        if bad is not None:
+            # Only the final line may be truncated; anything earlier is a real error
+            raise ValueError(f"Invalid JSON line in {name}: {bad[:80]!r}")
+        try:
+            record = json.loads(line)
+        except ValueError:
+            bad = line
+            continue
+        yield record
+    if bad is not None:
+        if not partial_tail:
+            raise ValueError(f"Invalid JSON line in {name}: {bad[:80]!r}")
+        truncated(f"{name} ends with an incomplete line: {bad[:80]!r}", on_truncated)
+
+
+def iter_json_array(chunks, name='input', on_truncated=None):
+    """Elements of a top-level JSON array, parsed one at a time as the chunks arrive
+
+    Only the element being parsed and the unparsed part of the current
+    chunk are held in memory. An array cut off by a crash (no closing
+    bracket, half an element) yields the elements before the cut.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    started = False
+    chunks = iter(chunks)
+    eof = False
+    while True:
+        # Skip whitespace and separators up to the next element
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer):
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError(f"{name} is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except ValueError as e:
+                if eof:
+                    truncated(f"{name} ends part-way through an array element", on_truncated)
+                    return
+                if len(buffer) - pos > MAX_RECORD_SIZE:
+                    raise ValueError(f"Invalid JSON in {name}: {e}") from e
+            else:
+                # An element ending flush with the buffer may be a number cut short
+                if end < len(buffer) or eof:
+                    pos = end
+                    yield record
+                    continue
+        elif eof:
+            if started:
+                truncated(f"{name} ends before the array's closing bracket", on_truncated)
+            return
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+
+def iter_records(path, on_truncated=None):
+    """Yield records from a JSON array or JSON Lines file, plain, .gz or .zst, or a sharded feed
+
+    Records are read as a stream, so memory does not grow with the file.
+    A shard that was cut off is read up to its last complete record, then
+    passed to on_truncated(message), or raises TruncatedInput without it.
+    """
+    for shard in shard_paths(path):
+        chunks = iter_chunks(shard, on_truncated)
+        head = b''
+        for chunk in chunks:
+            head = chunk
+            if chunk.strip():
+                break
+        if head.lstrip().startswith(b'['):
+            yield from iter_json_array(itertools.chain([head], chunks), shard, on_truncated)
+        else:
+            yield from iter_json_lines(itertools.chain([head], chunks), shard, on_truncated=on_truncated)
+
+
+# Parallel reading: split_records cuts an input into parts that can be read
+# independently, in order: each shard of a sharded feed, and byte ranges of
+# uncompressed JSON Lines files (a range owns the lines that start in it).
+# Compressed files and JSON arrays can't be entered mid-way and stay whole.
+
+def split_records(path, parts):
+    """About parts (path, start, end) parts of path, in record order; end None for a whole file"""
+    shards = shard_paths(path)
+    per_shard = max(1, -(-parts // len(shards)))
+    return [part for shard in shards for part in _split_file(shard, per_shard)]
+
+
+def _split_file(path, parts):
+    if parts == 1 or path.endswith(('.gz', '.zst')):
+        return [(path, 0, None)]
+    with open(path, 'rb') as f:
+        if f.read(4096).lstrip().startswith(b'['):
+            return [(path, 0, None)]
+    size = os.path.getsize(path)
+    step = max(-(-size // parts), MIN_RANGE_SIZE)
+    if step >= size:
+        return [(path, 0, None)]
+    return [(path, start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def iter_line_range(path, start, end):
+    """Lines of a file that start in the byte range [start, end)"""
+    with open(path, 'rb') as f:
+        if start:
+            # The line running over start belongs to the range before
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while position < end:
+            line = f.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line
+
+
+def iter_part(part, on_truncated=None):
+    """Records of a part from split_records"""
+    path, start, end = part
+    if end is None:
+        return iter_records(path, on_truncated)
+    return iter_json_lines(iter_line_range(path, start, end), path,
+                           partial_tail=end >= os.path.getsize(path), on_truncated=on_truncated)
@@ -0,0 +1,110 @@
+# Region definitions for multi-city crawls
+#
+# Each region is a GeoJSON FeatureCollection in data/regions/<name>.geojson.
+# Its features are the land polygons the grid planner masks cells with; a
+# top-level "region" member holds the grid bounding box, the centre and
+# radius used by single-point searches, the state (and the address keywords
+# that identify it) and the known areas used to tag addresses. A region may
+# also have area polygons in data/areas/<name>.geojson (see areas.py), which
+# tag places by their coordinates.
+
+import json
+import os
+
+from lagos_restaurants.areas import AREAS_DIR, AreaIndex, AreaMatcher
+from lagos_restaurants.landmask import DATA_DIR, LandMask
+
+REGIONS_DIR = os.path.join(DATA_DIR, 'regions')
+DEFAULT_REGION = 'lagos'
+
+
+def available_regions():
+    """Names of the bundled regions"""
+    return sorted(name[:-len('.geojson')] for name in os.listdir(REGIONS_DIR) if name.endswith('.geojson'))
+
+
+class Region:
+    """A city the spiders can cover: bounds, centre, land polygons and areas"""
+
+    _loaded = {}
+
+    def __init__(self, name, path, label, state, state_keywords, center, search_radius, bounds, areas):
+        self.name = name
+        self.path = path
+        self.label = label
+        self.state = state
+        self.state_keywords = [keyword.upper() for keyword in state_keywords]
+        self.center = tuple(center)
+        self.search_radius = search_radius
+        self.bounds = bounds
+        self.areas = areas
+        self.areas_path = os.path.join(AREAS_DIR, f"{name}.geojson")
+        self._land_mask = None
+        self._area_index = None
+        self._area_matcher = None
+
+    @classmethod
+    def load(cls, name):
+        """Load a bundled region by name (cached per process)"""
+        if name in cls._loaded:
+            return cls._loaded[name]
+
+        path = os.path.join(REGIONS_DIR, f"{name}.geojson")
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown region '{name}'. Available: {', '.join(available_regions())}")
+        with open(path, 'r', encoding='utf-8') as f:
+            info = json.load(f)['region']
+
+        region = cls._loaded[name] = cls(name, path, info['label'], info['state'], info['state_keywords'],
+                                         info['center'], info['search_radius'], info['bounds'], info['areas'])
+        return region
+
+    def land_mask(self):
+        if self._land_mask is None:
+            self._land_mask = LandMask.from_geojson(self.path)
+        return self._land_mask
+
+    def area_index(self):
+        """Spatial index over the region's area polygons, or None if it has none"""
+        if self._area_index is None and os.path.exists(self.areas_path):
+            self._area_index = AreaIndex.from_geojson(self.areas_path)
+        return self._area_index
+
+    def match_area(self, address, roads=True):
+        """Best known area named in the address, or None (roads as for AreaMatcher.match)"""
+        if self._area_matcher is None:
+            index = self.area_index()
+            self._area_matcher = AreaMatcher(self.areas, index.areas if index else ())
+        return self._area_matcher.match(address, roads)
+
+    def locate(self, lat, lng):
+        """Most specific area polygon containing the point, or None"""
+        index = self.area_index()
+        if index is None or lat is None or lng is None:
+            return None
+        return index.locate(lat, lng)
+
+    def match_state(self, address):
+        """The region's state if the address names it, else None"""
+        address_upper = address.upper()
+        if any(keyword in address_upper for keyword in self.state_keywords):
+            return self.state
+        return None
+
+    def __repr__(self):
+        return f"Region({self.name!r})"
+
+
+def load_regions(spec):
+    """Regions named in a comma-separated list ('all' for every bundled region)"""
+    if spec.strip().lower() == 'all':
+        names = available_regions()
+    else:
+        names = []
+        for name in spec.split(','):
+            name = name.strip().lower()
+            if name and name not in names:
+                names.append(name)
+    if not names:
+        raise ValueError("At least one region is required")
+    return [Region.load(name) for name in names]
@@ -0,0 +1,77 @@
+# Live estimate of how many places a grid sweep has left to find
+#
+# Capture-recapture needs repeated samples of the same area, but a grid
+# sweep partitions the area: two halves of the cells overlap only along
+# their borders, so recaptures are rare and Chapman-style estimates blow
+# up. Instead the sweep's own discovery curve is used: the rate of new
+# unique places per Nearby Search call over the most recent calls,
+# projected over the calls the remaining grids will need. With cells
+# scheduled densest first (cell priors), that rate falls as the sweep
+# reaches the sparse outskirts.
+
+import math
+from collections import deque
+
+from lagos_restaurants.dedup import PlaceIdSet
+
+# z-score for the 95% confidence interval
+Z_95 = 1.96
+
+
+def poisson_interval(count, z=Z_95):
+    """Approximate confidence interval for a Poisson count (square-root transform)"""
+    low = max(math.sqrt(count) - z / 2, 0) ** 2
+    high = (math.sqrt(count + 1) + z / 2) ** 2
+    return low, high
+
+
+class SaturationEstimator:
+    """Tracks new-place discoveries per Nearby Search call"""
+
+    def __init__(self, window=50):
+        # Compact like the spiders' own dedup set: nationwide sweeps see millions of ids
+        self.seen = PlaceIdSet()
+        self.grids = set()
+        self.calls = 0
+        # New places found by each of the most recent Nearby Search calls
+        self.recent = deque(maxlen=window)
+
+    def record(self, grid_id, place_ids):
+        """Record the places returned by one Nearby Search page of a grid"""
+        new = 0
+        for place_id in place_ids:
+            if place_id not in self.seen:
+                self.seen.add(place_id)
+                new += 1
+
+        self.grids.add(grid_id)
+        self.calls += 1
+        self.recent.append(new)
+
+    def marginal_yield(self):
+        """New unique places per Nearby Search call over the recent window"""
+        return sum(self.recent) / len(self.recent) if self.recent else None
+
+    def estimate(self, remaining_grids):
+        """Projected undiscovered places (with 95% interval) if the sweep continues"""
+        calls_per_grid = self.calls / len(self.grids) if self.grids else 1
+        remaining_calls = remaining_grids * calls_per_grid
+
+        window = len(self.recent) or 1
+        found = sum(self.recent)
+        low, high = poisson_interval(found)
+
+        return {
+            'seen': len(self.seen),
+            'marginal_yield': found / window,
+            'remaining_calls': remaining_calls,
+            'undiscovered': found / window * remaining_calls,
+            'undiscovered_low': low / window * remaining_calls,
+            'undiscovered_high': high / window * remaining_calls,
+        }
+
+    def summary(self, remaining_grids):
+        e = self.estimate(remaining_grids)
+        return (f"{e['seen']} seen, ~{e['undiscovered']:.0f} undiscovered in {remaining_grids} remaining grids "
+                f"(95% CI {e['undiscovered_low']:.0f}-{e['undiscovered_high']:.0f}), "
+                f"{e['marginal_yield']:.2f} new places per call over the last {len(self.recent)} calls")
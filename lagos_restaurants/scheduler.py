@@ -0,0 +1,112 @@
+# Scheduler that holds back requests until meta['not_before']
+#
+# Google needs a short pause before a next_page_token becomes valid, quota
+# errors are retried after a backoff, and the rate limiter sends back
+# requests whose token is not due yet. All of them set meta['not_before']
+# to a Unix timestamp. Waiting for it in the downloader would hold one of
+# the CONCURRENT_REQUESTS slots for the whole wait, so an early request is
+# held here instead, outside the downloader, and other requests keep
+# downloading meanwhile.
+
+import heapq
+import itertools
+import time
+from collections import deque
+
+from scrapy.core.scheduler import Scheduler
+
+
+class DelayedScheduler(Scheduler):
+    """Scrapy scheduler that keeps early requests out of the downloader.
+
+    A request leaving the queues before its meta['not_before'] is set
+    aside until then. A timer hands it back through engine.crawl once it is
+    due, which also wakes an engine that had nothing else to do, and it is
+    the next request handed out. Held requests count as pending, so the
+    spider is not closed while one is waiting.
+    """
+
+    def open(self, spider):
+        # (not_before, sequence, request), earliest first
+        self.delayed = []
+        self.sequence = itertools.count()
+        # Due requests, handed out before anything in the queues
+        self.due = deque()
+        # Requests on their way back in through engine.crawl
+        self.waking = {}
+        self.timer = None
+        self.timer_due = None
+        return super().open(spider)
+
+    def close(self, reason):
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        held = list(self.due) + [request for _, _, request in self.delayed]
+        if held and self.dqs is not None:
+            # Keep them for the resumed job; not_before still applies then
+            for request in held:
+                self.dqs.push(request)
+        return super().close(reason)
+
+    def enqueue_request(self, request):
+        if self.woken(request):
+            return True
+        return super().enqueue_request(request)
+
+    def woken(self, request):
+        """Take back a due request the timer sent through engine.crawl"""
+        if self.waking.pop(id(request), None) is not request:
+            return False
+        self.due.append(request)
+        return True
+
+    def next_request(self):
+        return self.next_due(super().next_request)
+
+    def next_due(self, pop):
+        """The next request that may be sent: due held ones first, then pop() past the early ones"""
+        self.release(time.time())
+        if self.due:
+            self.stats.inc_value('scheduler/dequeued/delayed', spider=self.spider)
+            return self.due.popleft()
+        while True:
+            request = pop()
+            if request is None or not self.hold(request):
+                return request
+
+    def hold(self, request):
+        """Set an early request aside until its not_before; False if it is due"""
+        not_before = request.meta.get('not_before')
+        if not not_before or not_before <= time.time():
+            return False
+        heapq.heappush(self.delayed, (not_before, next(self.sequence), request))
+        self.stats.inc_value('scheduler/delayed', spider=self.spider)
+        self.wake_at(self.delayed[0][0])
+        return True
+
+    def release(self, now):
+        while self.delayed and self.delayed[0][0] <= now:
+            self.due.append(heapq.heappop(self.delayed)[2])
+
+    def wake_at(self, when):
+        from twisted.internet import reactor
+
+        if self.timer is not None and self.timer.active():
+            if self.timer_due <= when:
+                return
+            self.timer.cancel()
+        self.timer_due = when
+        self.timer = reactor.callLater(max(0.0, when - time.time()), self.wake)
+
+    def wake(self):
+        self.timer = None
+        now = time.time()
+        while self.delayed and self.delayed[0][0] <= now:
+            request = heapq.heappop(self.delayed)[2]
+            self.waking[id(request)] = request
+            self.crawler.engine.crawl(request)
+        if self.delayed:
+            self.wake_at(self.delayed[0][0])
+
+    def __len__(self):
+        return super().__len__() + len(self.delayed) + len(self.due)
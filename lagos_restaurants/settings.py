@@ -57,15 +57,15 @@ DOWNLOADER_MIDDLEWARES = {
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "lagos_restaurants.feeds.ShardedFeed": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "lagos_restaurants.pipelines.LagosRestaurantsPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "lagos_restaurants.pipelines.MongoPipeline": 400,
+}
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -91,5 +91,67 @@ DOWNLOADER_MIDDLEWARES = {
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
 
+# Sharded JSON Lines output written by lagos_restaurants.feeds.ShardedFeed, e.g.
+# -s FEED_SHARDS=output/%(name)s/%(time)s; read it back with records.iter_records.
+# Compression is gzip, zstd (pip install zstandard) or none
+FEED_SHARDS = None
+FEED_SHARD_COMPRESSION = 'gzip'
+FEED_SHARD_MAX_ITEMS = 50000
+FEED_SHARD_MAX_BYTES = 128 * 1024 * 1024
+
+# Google Places API quota, enforced per endpoint by PlacesRateLimitMiddleware
+PLACES_QPS = {
+    'nearby': 10,
+    'details': 10,
+    'text': 10,
+    'photo': 10,
+}
+PLACES_QPS_BURST = 1
+# Point several spider processes at the same file to share one quota
+PLACES_RATE_LIMIT_DB = None
+
+# Persistent Places API response cache shared by all Google spiders and runs
+PLACES_CACHE_ENABLED = True
+PLACES_CACHE_PATH = 'places_cache.sqlite'
+PLACES_CACHE_MEMORY_ITEMS = 2000
+# Per field group TTLs in seconds, overriding lagos_restaurants.cache.DEFAULT_TTLS
+PLACES_CACHE_TTLS = {}
+
+# Google reports quota and access errors inside HTTP 200 bodies. PlacesStatusMiddleware
+# retries OVER_QUERY_LIMIT/UNKNOWN_ERROR with exponential backoff (seconds, with jitter)
+# and stops sending Places requests for PLACES_CIRCUIT_COOLDOWN seconds after REQUEST_DENIED
+PLACES_STATUS_RETRY_TIMES = 5
+PLACES_STATUS_BACKOFF_BASE = 2
+PLACES_STATUS_BACKOFF_MAX = 120
+PLACES_CIRCUIT_COOLDOWN = 300
+
+# Leases a distributed grid worker (-a frontier=...) holds at once, including
+# requests waiting on the rate limiter or a page token delay
+FRONTIER_WINDOW = 64
+
+# Local photo variants written by PhotoPipeline (needs Pillow). Leave PHOTOS_STORE
+# unset to keep raw Places photo URLs; point the web server's PHOTOS_URL_PREFIX at it
+PHOTOS_STORE = None
+PHOTOS_URL_PREFIX = '/photos'
+PHOTOS_CONCURRENCY = 4
+PHOTOS_WORKERS = 2
+# Variant name -> [width, height]; a height of None scales to the width and keeps the aspect ratio
+PHOTOS_VARIANTS = {
+    'thumbnail': [160, 160],
+    'card': [480, 320],
+    'hero': [1280, None],
+}
+PHOTOS_DEFAULT_VARIANT = 'card'
+PHOTOS_QUALITY = 80
+
+# MongoDB restaurants collection written by MongoPipeline (needs pymongo); leave
+# MONGO_URI unset to crawl without a database. Upserts are sent in unordered bulk
+# writes of MONGO_BATCH_SIZE, or after MONGO_FLUSH_INTERVAL seconds if fewer arrive
+MONGO_URI = None
+MONGO_DATABASE = 'lagos_restaurant_directory'
+MONGO_COLLECTION = 'restaurants'
+MONGO_BATCH_SIZE = 500
+MONGO_FLUSH_INTERVAL = 5
+
 # Rotating proxies configuration
 ROTATING_PROXY_LIST_PATH = 'proxy_list.txt'
@@ -0,0 +1,83 @@
+# Compact index of a crawl's output for incremental re-crawls
+#
+# Stores place_id -> (content hash, business_status) as a small TSV file, so
+# the next run can tell new, changed, unchanged and vanished places apart
+# without loading the previous full dump. The hash covers the enriched
+# record minus fields that change on every crawl without the place changing
+# (grid position, page number, photo URLs, "2 weeks ago" review timestamps).
+# Local photo variants are left out too: a photo download that failed on one
+# run would otherwise look like a changed place.
+
+import hashlib
+import json
+import os
+
+from lagos_restaurants.records import iter_records
+
+VOLATILE_FIELDS = {'source', 'grid_id', 'grid_center', 'grid_index', 'sweep', 'region', 'page', 'photo_url', 'photo'}
+VOLATILE_REVIEW_FIELDS = {'relative_time_description', 'profile_photo_url'}
+
+# A saved index always has this suffix; any other path is read as a dump
+SNAPSHOT_SUFFIX = '.tsv'
+
+
+def content_hash(record):
+    """Stable 64-bit hash of a record's content"""
+    stable = {k: v for k, v in record.items() if k not in VOLATILE_FIELDS}
+    if stable.get('all_reviews'):
+        stable['all_reviews'] = [{k: v for k, v in review.items() if k not in VOLATILE_REVIEW_FIELDS}
+                                 for review in stable['all_reviews']]
+    payload = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class SnapshotIndex:
+    """place_id -> (content hash, business_status)"""
+
+    def __init__(self, entries=None):
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def from_records(cls, records):
+        index = cls()
+        for record in records:
+            if record.get('place_id'):
+                index.set(record['place_id'], content_hash(record), record.get('business_status'))
+        return index
+
+    @classmethod
+    def load(cls, path, on_truncated=None):
+        """Load a saved index, or build one from a previous JSON / JSON Lines dump
+        (on_truncated as for records.iter_records)"""
+        if not path.endswith(SNAPSHOT_SUFFIX):
+            return cls.from_records(iter_records(path, on_truncated))
+
+        entries = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                place_id, digest, status = line.rstrip('\n').split('\t')
+                entries[place_id] = (digest, status or None)
+        return cls(entries)
+
+    def save(self, path):
+        """Write the index atomically (write to a temp file, then rename)"""
+        if not path.endswith(SNAPSHOT_SUFFIX):
+            # load() would read it back as a JSON dump
+            raise ValueError(f"Snapshot path must end in {SNAPSHOT_SUFFIX}: {path}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for place_id, (digest, status) in self.entries.items():
+                f.write(f"{place_id}\t{digest}\t{status or ''}\n")
+        os.replace(tmp_path, path)
+
+    def get(self, place_id):
+        return self.entries.get(place_id)
+
+    def set(self, place_id, digest, status):
+        self.entries[place_id] = (digest, status)
+
+    def __contains__(self, place_id):
+        return place_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -2,9 +2,14 @@ import scrapy
 import json
 import os
 import time
-import hashlib
 from collections import defaultdict
 
+from lagos_restaurants.cache import change_signature
+from lagos_restaurants.decoding import places_json
+from lagos_restaurants.dedup import PlaceIdSet
+from lagos_restaurants.enrichment import FEATURE_ENRICHER, LISTING_ENRICHER
+from lagos_restaurants.regions import DEFAULT_REGION, Region
+
 # Google Places API Spider
 # Requires Google Places API key to be set as environment variable: GOOGLE_PLACES_API_KEY
 # To get an API key: https://console.cloud.google.com/apis/credentials
@@ -20,40 +25,58 @@ class GooglePlacesApiSpider(scrapy.Spider):
             raise ValueError("Google Places API key is required. Set GOOGLE_PLACES_API_KEY environment variable.")
         
         # Performance optimization features
-        self.place_details_cache = {}  # Cache for place details to avoid duplicate API calls
-        self.processed_place_ids = set()  # Track processed places to avoid duplicates
+        self.processed_place_ids = PlaceIdSet()  # Track processed places to avoid duplicates
         self.api_call_count = defaultdict(int)  # Track API usage
-        self.request_timestamps = []  # For rate limiting
-        self.max_requests_per_second = 10  # Google's rate limit
+        
+        # City to search around (-a region=abuja); centre, radius and areas
+        # come from lagos_restaurants/data/regions/<region>.geojson
+        self.region = Region.load(kwargs.get('region', DEFAULT_REGION))
+        self.center = {'lat': self.region.center[0], 'lng': self.region.center[1]}
+        self.search_radius = self.region.search_radius
+        
+        # Details mode: 'full' fetches every field for every place; 'tiered'
+        # (-a details_mode=tiered) always fetches basic and contact fields but
+        # reuses cached reviews/atmosphere fields until the place's rating or
+        # review count changes or they are older than -a tier_max_age days
+        self.details_mode = kwargs.get('details_mode', 'full')
+        if self.details_mode not in ('full', 'tiered'):
+            raise ValueError(f"Unknown details_mode '{self.details_mode}'. Use 'full' or 'tiered'.")
+        self.tier_max_age = float(kwargs.get('tier_max_age', self.EXPENSIVE_TIER_MAX_AGE_DAYS)) * 24 * 60 * 60
     
-    # Lagos Nigeria coordinates
-    lagos_center = {
-        'lat': 6.5244,
-        'lng': 3.3792
-    }
+    # Google needs a short pause before a next_page_token becomes valid
+    NEXT_PAGE_TOKEN_DELAY = 2
+    NEXT_PAGE_TOKEN_RETRIES = 3
     
-    # Search radius in meters (50km to cover Lagos metropolitan area)
-    search_radius = 50000
+    # Reuse cached reviews/atmosphere fields for at most this many days in tiered mode
+    EXPENSIVE_TIER_MAX_AGE_DAYS = 14
+    
+    # Details are requested with basic fields only, so highlights come from the listing
+    ENRICHER = LISTING_ENRICHER
     
     custom_settings = {
-        'DOWNLOAD_DELAY': 0.1,  # Reduced delay for faster processing
+        'DOWNLOAD_DELAY': 0,  # QPS is paced by PlacesRateLimitMiddleware
         'CONCURRENT_REQUESTS': 5,  # Increased concurrency within rate limits
         'CONCURRENT_REQUESTS_PER_DOMAIN': 5,
         'ROBOTSTXT_OBEY': False,
         'RETRY_TIMES': 3,
         'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429],  # Include rate limit errors
-        'AUTOTHROTTLE_ENABLED': True,
-        'AUTOTHROTTLE_START_DELAY': 0.1,
-        'AUTOTHROTTLE_MAX_DELAY': 2.0,
-        'AUTOTHROTTLE_TARGET_CONCURRENCY': 5.0,
-        'AUTOTHROTTLE_DEBUG': True,
+        'AUTOTHROTTLE_ENABLED': False,
         # Disable proxy middleware
         'DOWNLOADER_MIDDLEWARES': {
+            'lagos_restaurants.middlewares.PlacesCacheMiddleware': 40,
+            'lagos_restaurants.middlewares.PlacesStatusMiddleware': 60,
+            'lagos_restaurants.middlewares.PlacesRateLimitMiddleware': 70,
             'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
             'scrapy_user_agents.middlewares.RandomUserAgentMiddleware': 400,
             'rotating_proxies.middlewares.RotatingProxyMiddleware': None,
             'rotating_proxies.middlewares.BanDetectionMiddleware': None,
-        }
+        },
+        'ITEM_PIPELINES': {
+            'lagos_restaurants.pipelines.PhotoPipeline': 200,
+            'lagos_restaurants.pipelines.MongoPipeline': 400,
+        },
+        # Holds page token and retry delays outside the downloader
+        'SCHEDULER': 'lagos_restaurants.scheduler.DelayedScheduler',
     }
     
     def start_requests(self):
@@ -63,7 +86,7 @@ class GooglePlacesApiSpider(scrapy.Spider):
         # Search parameters
         params = {
             'key': self.api_key,
-            'location': f"{self.lagos_center['lat']},{self.lagos_center['lng']}",
+            'location': f"{self.center['lat']},{self.center['lng']}",
             'radius': self.search_radius,
             'type': 'restaurant',
             'keyword': 'restaurant'
@@ -72,8 +95,6 @@ class GooglePlacesApiSpider(scrapy.Spider):
         # Construct URL with parameters
         url = f"{base_url}?" + "&".join([f"{k}={v}" for k, v in params.items()])
         
-        # Apply rate limiting before making request
-        self.apply_rate_limiting()
         self.api_call_count['nearby_search'] += 1
         
         yield scrapy.Request(
@@ -87,12 +108,18 @@ class GooglePlacesApiSpider(scrapy.Spider):
         page = response.meta.get('page', 1)
         
         try:
-            data = json.loads(response.text)
+            data = places_json(response)
         except json.JSONDecodeError:
             self.logger.error(f"Failed to parse JSON response: {response.text[:200]}")
             return
         
         status = data.get('status')
+        if status == 'INVALID_REQUEST' and page > 1:
+            retry = self.retry_page_token(response)
+            if retry:
+                yield retry
+                return
+        
         if status != 'OK':
             self.logger.error(f"API Error: {status} - {data.get('error_message', 'Unknown error')}")
             return
@@ -140,60 +167,68 @@ class GooglePlacesApiSpider(scrapy.Spider):
             
             
             # Make a detailed request for more information including all reviews and service options
+            # Repeat lookups are answered by PlacesCacheMiddleware
             if restaurant['place_id']:
-                # Check cache first to avoid duplicate API calls
-                cache_key = self.get_cache_key(restaurant['place_id'])
-                if cache_key in self.place_details_cache:
-                    self.logger.info(f"Using cached data for {restaurant['name']}")
-                    cached_details = self.place_details_cache[cache_key]
-                    restaurant.update(cached_details)
-                    yield restaurant
-                else:
-                    # Include valid fields for restaurant details (using basic Place Details fields)
-                    fields = [
-                        'name', 'formatted_address', 'formatted_phone_number', 'website', 
-                        'opening_hours', 'reviews', 'editorial_summary', 'url'
-                    ]
-                    detail_url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={restaurant['place_id']}&key={self.api_key}&fields={','.join(fields)}"
-                    
-                    # Apply rate limiting and track API calls
-                    self.apply_rate_limiting()
-                    self.api_call_count['place_details'] += 1
-                    
-                    yield scrapy.Request(
-                        url=detail_url,
-                        callback=self.parse_restaurant_details,
-                        meta={'restaurant': restaurant, 'cache_key': cache_key},
-                        dont_filter=True
-                    )
+                # Include valid fields for restaurant details (using basic Place Details fields)
+                fields = [
+                    'name', 'formatted_address', 'formatted_phone_number', 'website', 
+                    'opening_hours', 'reviews', 'editorial_summary', 'url'
+                ]
+                detail_url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={restaurant['place_id']}&key={self.api_key}&fields={','.join(fields)}"
+                
+                self.api_call_count['place_details'] += 1
+                
+                yield scrapy.Request(
+                    url=detail_url,
+                    callback=self.parse_restaurant_details,
+                    meta=self.details_meta(restaurant),
+                    dont_filter=True
+                )
             else:
                 yield restaurant
         
         # Check for next page (limit for testing)
         next_page_token = data.get('next_page_token')
         if next_page_token and page < 1:  # Limit to 1 page for testing
-            # Google requires a brief delay before using next page token
-            time.sleep(2)
-            
             next_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?pagetoken={next_page_token}&key={self.api_key}"
             
-            # Apply rate limiting and track API calls
-            self.apply_rate_limiting()
             self.api_call_count['nearby_search'] += 1
             
             yield scrapy.Request(
                 url=next_url,
                 callback=self.parse_restaurants,
-                meta={'page': page + 1},
+                # Google requires a brief delay before using next page token
+                meta={'page': page + 1, 'not_before': time.time() + self.NEXT_PAGE_TOKEN_DELAY},
                 dont_filter=True
             )
     
+    def details_meta(self, restaurant):
+        """Request meta for a Place Details call, tagged for tiered refresh if enabled"""
+        meta = {'restaurant': restaurant}
+        if self.details_mode == 'tiered':
+            meta['details_tier'] = {'signature': change_signature(restaurant), 'max_age': self.tier_max_age}
+        return meta
+    
+    def retry_page_token(self, response):
+        """Re-send a page request whose next_page_token was not ready yet"""
+        retries = response.meta.get('token_retries', 0)
+        if retries >= self.NEXT_PAGE_TOKEN_RETRIES:
+            self.logger.error(f"Page token still invalid after {retries} retries: {response.url[:120]}")
+            return None
+        
+        # The dupefilter has seen this URL already, on the first try
+        retry = response.request.replace(dont_filter=True)
+        retry.meta['token_retries'] = retries + 1
+        retry.meta['not_before'] = time.time() + self.NEXT_PAGE_TOKEN_DELAY * (retries + 1)
+        self.api_call_count['nearby_search'] += 1
+        self.logger.info(f"Page token not ready, retry {retries + 1}")
+        return retry
+    
     def parse_restaurant_details(self, response):
         restaurant = response.meta['restaurant']
-        cache_key = response.meta.get('cache_key')
         
         try:
-            data = json.loads(response.text)
+            data = places_json(response)
         except json.JSONDecodeError:
             self.logger.error(f"Failed to parse details JSON: {response.text[:200]}")
             yield restaurant
@@ -204,138 +239,17 @@ class GooglePlacesApiSpider(scrapy.Spider):
             yield restaurant
             return
         
-        result = data.get('result', {})
-        
-        # Add detailed information with enhancements
-        restaurant.update({
-            'formatted_address': result.get('formatted_address'),
-            'phone_number': result.get('formatted_phone_number'),
-            'phone_number_cleaned': self.clean_phone_number(result.get('formatted_phone_number')),
-            'website': result.get('website'),
-            'google_url': f"https://www.google.com/maps/place/?q=place_id:{restaurant['place_id']}"
-        })
-        
-        # Extract and enhance location details
-        restaurant['location_details'] = self.extract_location_details(result.get('formatted_address'))
-        restaurant['price_range_text'] = self.interpret_price_level(restaurant.get('price_level'))
-        
-        # Extract and enhance opening hours
-        opening_hours = result.get('opening_hours', {})
-        restaurant['opening_hours'] = opening_hours.get('weekday_text', [])
-        restaurant['opening_hours_parsed'] = self.parse_opening_hours(opening_hours.get('weekday_text', []))
-        restaurant['is_open_24_7'] = self.check_24_7_operation(opening_hours.get('weekday_text', []))
-        
-        # Extract ALL available reviews (Google Places API returns up to 5 most helpful reviews)
-        reviews = result.get('reviews', [])
-        restaurant['all_reviews'] = []
-        restaurant['reviews_count'] = len(reviews)
-        
-        for review in reviews:
-            review_data = {
-                'author_name': review.get('author_name'),
-                'author_url': review.get('author_url'),
-                'language': review.get('language'),
-                'profile_photo_url': review.get('profile_photo_url'),
-                'rating': review.get('rating'),
-                'relative_time_description': review.get('relative_time_description'),
-                'text': review.get('text'),
-                'time': review.get('time'),
-                'translated': review.get('translated', False)
-            }
-            restaurant['all_reviews'].append(review_data)
-        
-        # Add editorial summary if available
-        restaurant['editorial_summary'] = result.get('editorial_summary', {}).get('overview')
-        
-        # Add direct Google Maps URL
-        restaurant['google_maps_url'] = result.get('url')
-        
-        # Create simple highlights from available data
-        restaurant['highlights'] = []
-        
-        # Basic highlights from price level and rating
-        if restaurant.get('rating') and restaurant['rating'] >= 4.5:
-            restaurant['highlights'].append('Highly rated')
-        if restaurant.get('price_level') == 1:
-            restaurant['highlights'].append('Budget-friendly')
-        elif restaurant.get('price_level') == 4:
-            restaurant['highlights'].append('Fine dining')
-        
-        # Add highlights from restaurant types
-        types = restaurant.get('types', [])
-        if 'meal_delivery' in types:
-            restaurant['highlights'].append('Delivery available')
-        if 'meal_takeaway' in types:
-            restaurant['highlights'].append('Takeout available')
-        if 'bar' in types:
-            restaurant['highlights'].append('Bar available')
-        if 'cafe' in types:
-            restaurant['highlights'].append('Cafe')
-        
-        # Create a comprehensive reviews summary
-        if reviews:
-            ratings = [r.get('rating', 0) for r in reviews if r.get('rating')]
-            if ratings:
-                restaurant['reviews_summary'] = {
-                    'total_reviews_fetched': len(reviews),
-                    'avg_rating_from_reviews': sum(ratings) / len(ratings),
-                    'rating_distribution': {
-                        '5_star': len([r for r in ratings if r == 5]),
-                        '4_star': len([r for r in ratings if r == 4]),
-                        '3_star': len([r for r in ratings if r == 3]),
-                        '2_star': len([r for r in ratings if r == 2]),
-                        '1_star': len([r for r in ratings if r == 1])
-                    }
-                }
-        
-        # Cache the enhanced data for future use
-        if cache_key:
-            cache_data = {
-                'formatted_address': restaurant.get('formatted_address'),
-                'phone_number': restaurant.get('phone_number'),
-                'phone_number_cleaned': restaurant.get('phone_number_cleaned'),
-                'website': restaurant.get('website'),
-                'location_details': restaurant.get('location_details'),
-                'price_range_text': restaurant.get('price_range_text'),
-                'opening_hours_parsed': restaurant.get('opening_hours_parsed'),
-                'is_open_24_7': restaurant.get('is_open_24_7'),
-                'highlights': restaurant.get('highlights'),
-                'all_reviews': restaurant.get('all_reviews'),
-                'reviews_summary': restaurant.get('reviews_summary'),
-                'editorial_summary': restaurant.get('editorial_summary'),
-                'google_maps_url': restaurant.get('google_maps_url')
-            }
-            self.place_details_cache[cache_key] = cache_data
-            self.logger.info(f"Cached details for {restaurant['name']}")
+        # Contact, location, hours, reviews and highlights
+        self.ENRICHER.enrich(restaurant, data.get('result', {}), self.region)
         
         yield restaurant
     
-    def get_cache_key(self, place_id):
-        """Generate cache key for place details"""
-        return hashlib.md5(place_id.encode()).hexdigest()
-    
-    def apply_rate_limiting(self):
-        """Apply rate limiting to respect Google's API limits"""
-        current_time = time.time()
-        
-        # Remove timestamps older than 1 second
-        self.request_timestamps = [ts for ts in self.request_timestamps if current_time - ts < 1.0]
-        
-        # If we're at the rate limit, wait
-        if len(self.request_timestamps) >= self.max_requests_per_second:
-            sleep_time = 1.0 - (current_time - self.request_timestamps[0])
-            if sleep_time > 0:
-                self.logger.info(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
-                time.sleep(sleep_time)
-        
-        # Add current timestamp
-        self.request_timestamps.append(current_time)
-    
     def closed(self, reason):
         """Called when spider closes - log performance statistics"""
         total_requests = sum(self.api_call_count.values())
         unique_places = len(self.processed_place_ids)
-        cache_hits = len(self.place_details_cache)
+        cache_hits = self.crawler.stats.get_value('places_cache/hit', 0)
+        cache_misses = self.crawler.stats.get_value('places_cache/miss', 0)
         
         self.logger.info("=" * 50)
         self.logger.info("PERFORMANCE STATISTICS")
@@ -344,139 +258,41 @@ class GooglePlacesApiSpider(scrapy.Spider):
         self.logger.info(f"Nearby search requests: {self.api_call_count['nearby_search']}")
         self.logger.info(f"Place details requests: {self.api_call_count['place_details']}")
         self.logger.info(f"Unique places processed: {unique_places}")
-        self.logger.info(f"Cache entries created: {cache_hits}")
+        self.logger.info(f"Cache hits/misses: {cache_hits}/{cache_misses}")
         self.logger.info(f"API requests saved by caching: {cache_hits}")
-        if total_requests > 0:
-            efficiency = (cache_hits / total_requests) * 100
+        if cache_hits + cache_misses > 0:
+            efficiency = (cache_hits / (cache_hits + cache_misses)) * 100
             self.logger.info(f"Cache efficiency: {efficiency:.1f}%")
         self.logger.info("=" * 50)
-    
-    def clean_phone_number(self, phone):
-        """Clean and standardize phone number format"""
-        if not phone:
-            return None
-        
-        import re
-        # Remove all non-digit characters except +
-        cleaned = re.sub(r'[^\d+]', '', phone)
-        
-        # Format Nigerian numbers
-        if cleaned.startswith('+234'):
-            return cleaned
-        elif cleaned.startswith('234'):
-            return '+' + cleaned
-        elif cleaned.startswith('0') and len(cleaned) == 11:
-            # Convert local format (0xxx) to international (+234xxx)
-            return '+234' + cleaned[1:]
-        
-        return phone  # Return original if can't parse
-    
-    def extract_location_details(self, address):
-        """Extract detailed location information from address"""
-        if not address:
-            return {}
-        
-        details = {
-            'full_address': address,
-            'area': None,
-            'state': None,
-            'country': None,
-            'postal_code': None
-        }
-        
-        # Common Lagos areas/districts
-        lagos_areas = [
-            'Victoria Island', 'Ikoyi', 'Lekki', 'Ajah', 'Surulere', 'Ikeja', 
-            'Yaba', 'Lagos Island', 'Apapa', 'Festac', 'Gbagada', 'Magodo',
-            'Ojodu', 'Ogba', 'Agege', 'Alaba', 'Badagry', 'Epe', 'Ikorodu'
-        ]
-        
-        address_upper = address.upper()
-        for area in lagos_areas:
-            if area.upper() in address_upper:
-                details['area'] = area
-                break
-        
-        if 'LAGOS' in address_upper:
-            details['state'] = 'Lagos State'
-        if 'NIGERIA' in address_upper:
-            details['country'] = 'Nigeria'
-            
-        # Extract postal code if present
-        import re
-        postal_match = re.search(r'\b\d{6}\b', address)
-        if postal_match:
-            details['postal_code'] = postal_match.group()
-            
-        return details
-    
-    def interpret_price_level(self, price_level):
-        """Convert Google's price level (0-4) to human-readable text"""
-        price_map = {
-            0: 'Free',
-            1: 'Inexpensive (₦)',
-            2: 'Moderate (₦₦)',
-            3: 'Expensive (₦₦₦)',
-            4: 'Very Expensive (₦₦₦₦)'
-        }
-        return price_map.get(price_level, 'Price not available')
-    
-    def parse_opening_hours(self, weekday_text_list):
-        """Parse opening hours into structured format"""
-        if not weekday_text_list:
-            return {}
-        
-        parsed_hours = {}
-        days_map = {
-            'Monday': 'monday', 'Tuesday': 'tuesday', 'Wednesday': 'wednesday',
-            'Thursday': 'thursday', 'Friday': 'friday', 'Saturday': 'saturday', 'Sunday': 'sunday'
-        }
-        
-        for day_text in weekday_text_list:
-            for day_name, day_key in days_map.items():
-                if day_text.startswith(day_name):
-                    time_part = day_text.replace(f'{day_name}: ', '')
-                    if 'Closed' in time_part:
-                        parsed_hours[day_key] = {'status': 'closed', 'hours': None}
-                    elif 'Open 24 hours' in time_part:
-                        parsed_hours[day_key] = {'status': 'open_24h', 'hours': '24 hours'}
-                    else:
-                        parsed_hours[day_key] = {'status': 'open', 'hours': time_part}
-                    break
-        
-        return parsed_hours
-    
-    def check_24_7_operation(self, weekday_text_list):
-        """Check if restaurant operates 24/7"""
-        if not weekday_text_list:
-            return False
-        
-        open_24h_count = sum(1 for day_text in weekday_text_list if 'Open 24 hours' in day_text)
-        return open_24h_count == 7
 
 
 # Alternative spider for text search (more specific results)
 class GooglePlacesTextSearchSpider(GooglePlacesApiSpider):
     name = "google_places_text_search"
     
+    # Details requests here ask for the feature fields too
+    ENRICHER = FEATURE_ENRICHER
+    
+    # {city} is filled in with the region's label
     search_queries = [
-        "restaurants in Lagos Nigeria",
-        "Nigerian restaurants Lagos",
-        "fine dining Lagos Nigeria", 
-        "restaurants Lagos",
-        # "restaurants Ikoyi Lagos",
-        # "restaurants Surulere Lagos",
-        "local food Lagos Nigeria"
+        "restaurants in {city} Nigeria",
+        "Nigerian restaurants {city}",
+        "fine dining {city} Nigeria", 
+        "restaurants {city}",
+        # "restaurants Ikoyi {city}",
+        # "restaurants Surulere {city}",
+        "local food {city} Nigeria"
     ]
     
     def start_requests(self):
         base_url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
         
         for query in self.search_queries:
+            query = query.format(city=self.region.label)
             params = {
                 'key': self.api_key,
                 'query': query,
-                'location': f"{self.lagos_center['lat']},{self.lagos_center['lng']}",
+                'location': f"{self.center['lat']},{self.center['lng']}",
                 'radius': self.search_radius
             }
             
@@ -493,12 +309,18 @@ class GooglePlacesTextSearchSpider(GooglePlacesApiSpider):
         query = response.meta.get('query', '')
         
         try:
-            data = json.loads(response.text)
+            data = places_json(response)
         except json.JSONDecodeError:
             self.logger.error(f"Failed to parse JSON response: {response.text[:200]}")
             return
         
         status = data.get('status')
+        if status == 'INVALID_REQUEST' and page > 1:
+            retry = self.retry_page_token(response)
+            if retry:
+                yield retry
+                return
+        
         if status != 'OK':
             self.logger.error(f"API Error for '{query}': {status} - {data.get('error_message', 'Unknown error')}")
             return
@@ -570,7 +392,7 @@ class GooglePlacesTextSearchSpider(GooglePlacesApiSpider):
                 yield scrapy.Request(
                     url=detail_url,
                     callback=self.parse_restaurant_details,
-                    meta={'restaurant': restaurant}
+                    meta=self.details_meta(restaurant)
                 )
             else:
                 yield restaurant
@@ -578,13 +400,14 @@ class GooglePlacesTextSearchSpider(GooglePlacesApiSpider):
         # Check for next page
         next_page_token = data.get('next_page_token')
         if next_page_token and page < 3:  # Limit to 3 pages per query
-            import time
-            time.sleep(2)
-            
             next_url = f"https://maps.googleapis.com/maps/api/place/textsearch/json?pagetoken={next_page_token}&key={self.api_key}"
             
             yield scrapy.Request(
                 url=next_url,
                 callback=self.parse_restaurants,
-                meta={'page': page + 1, 'query': query}
+                meta={
+                    'page': page + 1,
+                    'query': query,
+                    'not_before': time.time() + self.NEXT_PAGE_TOKEN_DELAY
+                }
             )
\ No newline at end of file
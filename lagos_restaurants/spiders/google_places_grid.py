@@ -1,14 +1,27 @@
 import scrapy
 import json
 import os
+import socket
 import time
-import hashlib
-import math
 from collections import defaultdict
+from urllib.parse import quote
+
+from lagos_restaurants.cache import change_signature
+from lagos_restaurants.checkpoint import CheckpointStore
+from lagos_restaurants.coverage import cell_circumradius, hex_plan, square_plan
+from lagos_restaurants.decoding import places_json
+from lagos_restaurants.dedup import PlaceIdSet
+from lagos_restaurants.enrichment import FEATURE_ENRICHER
+from lagos_restaurants.frontier import DEFAULT_LEASE_SECONDS, open_frontier, retry_task
+from lagos_restaurants.priors import CellPriors, cell_key
+from lagos_restaurants.regions import DEFAULT_REGION, Region, load_regions
+from lagos_restaurants.saturation import SaturationEstimator
+from lagos_restaurants.snapshot import SNAPSHOT_SUFFIX, SnapshotIndex
 
 # Google Places API Grid Spider for Comprehensive Lagos Coverage
 # Requires Google Places API key to be set as environment variable: GOOGLE_PLACES_API_KEY
 # This spider uses a grid-based approach to ensure complete coverage of Lagos restaurants
+# (other cities with -a regions=lagos,abuja,port_harcourt,ibadan)
 
 class GooglePlacesGridSpider(scrapy.Spider):
     name = "google_places_grid"
@@ -20,154 +33,597 @@ class GooglePlacesGridSpider(scrapy.Spider):
             raise ValueError("Google Places API key is required. Set GOOGLE_PLACES_API_KEY environment variable.")
         
         # Performance optimization features
-        self.place_details_cache = {}
-        self.processed_place_ids = set()
+        # (place_ids are kept as 64-bit hashes, ~17 bytes each instead of ~110)
+        self.processed_place_ids = PlaceIdSet()
         self.api_call_count = defaultdict(int)
-        self.request_timestamps = []
-        self.max_requests_per_second = 10
         
         # Grid tracking
         self.total_grids = 0
         self.completed_grids = 0
         self.grid_results = {}
+        
+        # Adaptive mode: split saturated cells into four children (-a adaptive=true)
+        self.adaptive = str(kwargs.get('adaptive', '')).lower() in ('1', 'true', 'yes')
+        self.depth_call_count = defaultdict(int)
+        self.depth_cell_count = defaultdict(int)
+        self.subdivided_grids = 0
+        
+        # Coverage planner: 'hex' (minimal overlap) or 'square' (legacy lattice)
+        self.planner = kwargs.get('planner', 'hex')
+        if self.planner not in ('hex', 'square'):
+            raise ValueError(f"Unknown planner '{self.planner}'. Use 'hex' or 'square'.")
+        self.hex_radius = int(kwargs.get('hex_radius', self.GRID_SEARCH_RADIUS))
+        
+        # Cities to cover in one job (-a regions=lagos,abuja,port_harcourt,ibadan or -a regions=all),
+        # each defined by a data file under lagos_restaurants/data/regions
+        self.regions = load_regions(kwargs.get('regions', DEFAULT_REGION))
+        self.region_found = defaultdict(int)
+        
+        # Skip lagoon and ocean cells using each region's land mask (-a land_mask=false to disable)
+        self.use_land_mask = str(kwargs.get('land_mask', 'true')).lower() in ('1', 'true', 'yes')
+        
+        # Resume support: persist progress to a SQLite checkpoint (-a checkpoint=grid.sqlite)
+        checkpoint_path = kwargs.get('checkpoint')
+        self.checkpoint = CheckpointStore(checkpoint_path) if checkpoint_path else None
+        
+        # Details mode: 'full' fetches every field for every place; 'tiered'
+        # (-a details_mode=tiered) always fetches basic and contact fields but
+        # reuses cached reviews/atmosphere fields until the place's rating or
+        # review count changes or they are older than -a tier_max_age days
+        self.details_mode = kwargs.get('details_mode', 'full')
+        if self.details_mode not in ('full', 'tiered'):
+            raise ValueError(f"Unknown details_mode '{self.details_mode}'. Use 'full' or 'tiered'.")
+        self.tier_max_age = float(kwargs.get('tier_max_age', self.EXPENSIVE_TIER_MAX_AGE_DAYS)) * 24 * 60 * 60
+        
+        # Incremental mode: diff against the previous run and write a delta feed
+        # (-a snapshot=grid_snapshot.tsv, optionally -a previous=last_full_dump.jsonl to seed it)
+        self.snapshot_path = kwargs.get('snapshot')
+        if self.snapshot_path and not self.snapshot_path.endswith(SNAPSHOT_SUFFIX):
+            raise ValueError(f"-a snapshot must be a {SNAPSHOT_SUFFIX} file, got '{self.snapshot_path}'; "
+                             f"seed it from a previous dump with -a previous=")
+        previous_path = kwargs.get('previous')
+        if not previous_path and self.snapshot_path and os.path.exists(self.snapshot_path):
+            previous_path = self.snapshot_path
+        self.incremental = bool(self.snapshot_path or previous_path)
+        # A dump cut short by a crashed run still seeds the snapshot with what it has
+        self.previous_snapshot = (SnapshotIndex.load(previous_path, on_truncated=self.logger.warning)
+                                  if previous_path else SnapshotIndex())
+        self.delta_path = kwargs.get('delta', 'grid_delta.jsonl')
+        
+        # Cell yield history (-a priors=grid_priors.json): dense cells are searched
+        # first at higher priority, persistently empty cells only every few runs
+        priors_path = kwargs.get('priors')
+        self.priors = CellPriors.load(priors_path) if priors_path else None
+        self.cell_keys = {}
+        self.sampled_out_grids = 0
+        
+        # Budgets: stop scheduling new grids after this many live API calls or minutes
+        self.budget_calls = int(kwargs['budget_calls']) if kwargs.get('budget_calls') else None
+        self.budget_deadline = (time.time() + float(kwargs['budget_minutes']) * 60
+                                if kwargs.get('budget_minutes') else None)
+        self.budget_spent = False
+        
+        # Saturation: estimate undiscovered places as the sweep runs and, with
+        # -a saturation_stop=N, stop (or with -a saturation_action=thin, halve)
+        # the remaining grids once fewer than N places are likely left to find
+        self.saturation = SaturationEstimator(window=self.SATURATION_WINDOW)
+        self.saturation_stop = float(kwargs['saturation_stop']) if kwargs.get('saturation_stop') else None
+        self.saturation_action = kwargs.get('saturation_action', 'stop')
+        if self.saturation_action not in ('stop', 'thin'):
+            raise ValueError(f"Unknown saturation_action '{self.saturation_action}'. Use 'stop' or 'thin'.")
+        self.saturated = False
+        
+        # Set when a budget or the saturation rule cut the sweep short, so
+        # nothing is inferred from unseen places
+        self.partial_crawl = False
+        
+        # Type/keyword sweeps run over every cell (-a sweeps=restaurant,buka,cafe or -a sweeps=all).
+        # They share the dedup set and the details cache, so a place found by
+        # several sweeps is enriched once
+        sweeps = kwargs.get('sweeps', self.DEFAULT_SWEEP)
+        self.sweeps = list(self.SWEEPS) if sweeps == 'all' else [s.strip() for s in sweeps.split(',') if s.strip()]
+        unknown = [sweep for sweep in self.sweeps if sweep not in self.SWEEPS]
+        if unknown or not self.sweeps:
+            raise ValueError(f"Unknown sweeps '{sweeps}'. Use any of {', '.join(self.SWEEPS)} or 'all'.")
+        self.sweep_call_count = defaultdict(int)
+        self.sweep_found = defaultdict(int)
+        self.sweep_pruned = defaultdict(int)
+        
+        # Distributed mode: workers share cells, page tokens, details requests and
+        # seen place_ids through a frontier (-a frontier=grid_frontier.sqlite or
+        # -a frontier=redis://host:6379/0), claiming work with leases
+        frontier_url = kwargs.get('frontier')
+        self.frontier = None
+        if frontier_url:
+            if self.checkpoint or self.incremental:
+                raise ValueError("-a frontier cannot be combined with checkpoint or snapshot/previous; "
+                                 "the frontier is the checkpoint, and a worker only sees part of the crawl")
+            self.worker_id = kwargs.get('worker_id') or f"{socket.gethostname()}-{os.getpid()}"
+            lease_seconds = float(kwargs.get('lease_seconds', DEFAULT_LEASE_SECONDS))
+            self.frontier = open_frontier(frontier_url, self.worker_id, lease_seconds)
+            # Each worker sees only its share of the places
+            self.partial_crawl = True
     
-    # Lagos bounding box coordinates (comprehensive coverage)
-    LAGOS_BOUNDS = {
-        'north': 6.7058,   # Northernmost point (Alaba area)
-        'south': 6.3500,   # Southernmost point (Ikorodu area)  
-        'east': 3.6500,    # Easternmost point (Ajah/Sangotedo area)
-        'west': 3.1000     # Westernmost point (Agege area)
-    }
+    # Grid bounds, land masks and area lists come from the region data files
+    # (lagos_restaurants/data/regions/*.geojson)
     
-    # Grid size in degrees (approximately 3km x 3km squares for optimal efficiency)
+    # Grid size in degrees for the legacy square planner (-a planner=square)
     # 0.027 degrees ≈ 3km at Lagos latitude
     GRID_SIZE = 0.027
     
     # Search radius for each grid cell (3km radius for thorough coverage)
+    # The hex planner uses it as the hexagon circumradius unless -a hex_radius is given
     GRID_SEARCH_RADIUS = 3000  # 3km radius
     
+    # Nearby Search returns at most 20 results per page and 3 pages per search
+    RESULTS_PER_PAGE = 20
+    MAX_PAGES_PER_GRID = 3
+    
+    # Google needs a short pause before a next_page_token becomes valid
+    NEXT_PAGE_TOKEN_DELAY = 2
+    NEXT_PAGE_TOKEN_RETRIES = 3
+    
+    # Adaptive subdivision limits (depth 3 ≈ 375m cells)
+    ADAPTIVE_MAX_DEPTH = 3
+    ADAPTIVE_MIN_RADIUS = 250
+    
+    # Reuse cached reviews/atmosphere fields for at most this many days in tiered mode
+    EXPENSIVE_TIER_MAX_AGE_DAYS = 14
+    
+    # Saturation rule: never fires before this share of grids is done; marginal
+    # yield is averaged over this many Nearby Search calls
+    SATURATION_MIN_PROGRESS = 0.3
+    SATURATION_WINDOW = 50
+    
+    # Nearby Search type/keyword per sweep. Bukas, suya spots, cafés, bars and
+    # fast-food places are often not tagged 'restaurant' by Google
+    SWEEPS = {
+        'restaurant': {'type': 'restaurant', 'keyword': 'restaurant'},
+        'buka': {'type': 'restaurant', 'keyword': 'buka'},
+        'suya': {'keyword': 'suya'},
+        'cafe': {'type': 'cafe'},
+        'bar': {'type': 'bar'},
+        'fast_food': {'type': 'meal_takeaway', 'keyword': 'fast food'},
+        'bakery': {'type': 'bakery'},
+    }
+    DEFAULT_SWEEP = 'restaurant'
+    
+    # With -a priors, an extra sweep that found fewer new places than this in a
+    # cell (smoothed over runs) is pruned there and only re-sampled every few runs
+    SWEEP_MIN_NEW_PLACES = 1
+    
+    # Place Details fields requested for every new restaurant
+    DETAILS_FIELDS = [
+        'name', 'formatted_address', 'formatted_phone_number', 'website', 
+        'opening_hours', 'reviews', 'editorial_summary', 'url',
+        'wheelchair_accessible_entrance', 'serves_takeout', 'serves_delivery',
+        'serves_dine_in', 'reservable', 'delivery', 'takeout', 'curbside_pickup',
+        'serves_breakfast', 'serves_lunch', 'serves_dinner', 'serves_beer',
+        'serves_wine', 'serves_brunch', 'serves_vegetarian_food',
+        'outdoor_seating', 'live_music', 'menu_for_children', 'restroom',
+        'good_for_children', 'good_for_groups', 'lgbtq_friendly',
+        'serves_coffee', 'serves_dessert', 'serves_happy_hour_food',
+        'serves_late_night_food', 'serves_cocktails', 'allows_dogs',
+        'has_wheelchair_accessible_parking', 'has_delivery', 'has_takeout',
+        'has_wheelchair_accessible_entrance', 'has_wheelchair_accessible_restroom',
+        'has_wheelchair_accessible_seating', 'allows_children', 'has_high_chairs',
+        'has_changing_table', 'has_kids_menu', 'good_for_kids', 'has_playground',
+        'accepts_reservations', 'accepts_credit_cards', 'accepts_debit_cards',
+        'accepts_cash_only', 'accepts_nfc', 'requires_reservations'
+    ]
+    
+    # Turns DETAILS_FIELDS into feature groups and highlights
+    ENRICHER = FEATURE_ENRICHER
+    
     custom_settings = {
-        'DOWNLOAD_DELAY': 0.15,  # Slightly longer delay for grid searches
+        'DOWNLOAD_DELAY': 0,  # QPS is paced by PlacesRateLimitMiddleware
         'CONCURRENT_REQUESTS': 3,  # Conservative concurrency for grid approach
         'CONCURRENT_REQUESTS_PER_DOMAIN': 3,
         'ROBOTSTXT_OBEY': False,
         'RETRY_TIMES': 3,
         'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429],
-        'AUTOTHROTTLE_ENABLED': True,
-        'AUTOTHROTTLE_START_DELAY': 0.15,
-        'AUTOTHROTTLE_MAX_DELAY': 3.0,
-        'AUTOTHROTTLE_TARGET_CONCURRENCY': 3.0,
-        'AUTOTHROTTLE_DEBUG': True,
+        'AUTOTHROTTLE_ENABLED': False,
         # Disable proxy middleware
         'DOWNLOADER_MIDDLEWARES': {
+            'lagos_restaurants.middlewares.FrontierMiddleware': 30,
+            'lagos_restaurants.middlewares.PlacesCacheMiddleware': 40,
+            'lagos_restaurants.middlewares.CrawlBudgetMiddleware': 45,
+            'lagos_restaurants.middlewares.PlacesStatusMiddleware': 60,
+            'lagos_restaurants.middlewares.PlacesRateLimitMiddleware': 70,
             'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
             'scrapy_user_agents.middlewares.RandomUserAgentMiddleware': 400,
             'rotating_proxies.middlewares.RotatingProxyMiddleware': None,
             'rotating_proxies.middlewares.BanDetectionMiddleware': None,
+        },
+        'ITEM_PIPELINES': {
+            'lagos_restaurants.pipelines.PhotoPipeline': 200,
+            'lagos_restaurants.pipelines.DeltaPipeline': 300,
+            'lagos_restaurants.pipelines.MongoPipeline': 400,
+        },
+        # Stock scheduling unless -a frontier is given
+        'SCHEDULER': 'lagos_restaurants.frontier.FrontierScheduler',
+        'SPIDER_MIDDLEWARES': {
+            'lagos_restaurants.middlewares.FrontierMiddleware': 100,
         }
     }
     
     def start_requests(self):
-        """Generate grid points and create search requests for each"""
-        grid_points = self.generate_grid_points()
-        self.total_grids = len(grid_points)
-        
-        self.logger.info(f"Generated {self.total_grids} grid points for comprehensive Lagos coverage")
-        self.logger.info(f"Grid size: {self.GRID_SIZE} degrees (~3km)")
-        self.logger.info(f"Search radius per grid: {self.GRID_SEARCH_RADIUS}m")
-        
-        for i, (lat, lng) in enumerate(grid_points):
-            # Apply rate limiting
-            self.apply_rate_limiting()
-            self.api_call_count['nearby_search'] += 1
-            
-            # Google Places Nearby Search API
-            base_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-            params = {
-                'key': self.api_key,
-                'location': f"{lat},{lng}",
-                'radius': self.GRID_SEARCH_RADIUS,
-                'type': 'restaurant',
-                'keyword': 'restaurant'
-            }
-            
-            url = f"{base_url}?" + "&".join([f"{k}={v}" for k, v in params.items()])
-            
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse_grid_restaurants,
-                meta={
-                    'grid_id': f"grid_{i}",
-                    'grid_center': (lat, lng),
+        """Plan grid cells and create search requests for each"""
+        plans = [(region, self.plan_coverage(region)) for region in self.regions]
+        self.total_grids = sum(plan.call_count for _, plan in plans) * len(self.sweeps)
+        
+        labels = ', '.join(region.label for region in self.regions)
+        self.logger.info(f"Generated {self.total_grids} grid points for comprehensive {labels} coverage")
+        for region, plan in plans:
+            prefix = f"{region.label}: " if len(plans) > 1 else ""
+            self.logger.info(f"{prefix}Coverage {plan.summary()}")
+            if plan.skipped_cells:
+                self.logger.info(f"{prefix}Land mask skipped {plan.skipped_cells} water or out-of-area cells, "
+                                 f"saving {plan.skipped_cells}-{plan.skipped_cells * self.MAX_PAGES_PER_GRID} Nearby Search calls")
+        
+        if self.adaptive:
+            self.logger.info(f"Adaptive mode: saturated grids split up to depth {self.ADAPTIVE_MAX_DEPTH}")
+        if len(self.sweeps) > 1:
+            self.logger.info(f"Sweeps per cell: {', '.join(self.sweeps)}")
+        
+        restored = self.restore_checkpoint()
+        
+        cells = [(i, dict(cell, region=region.name)) for region, plan in plans for i, cell in enumerate(plan.cells)]
+        if self.priors:
+            cells = self.order_by_priors(cells)
+        
+        for i, cell in cells:
+            for position, sweep in enumerate(self.sweeps):
+                key = self.sweep_key(cell['center'], cell['radius'], sweep)
+                min_yield = 0 if sweep == self.DEFAULT_SWEEP else self.SWEEP_MIN_NEW_PLACES
+                if self.priors and not self.priors.should_search(key, min_yield):
+                    self.sampled_out_grids += 1
+                    self.sweep_pruned[sweep] += 1
+                    self.total_grids -= 1
+                    continue
+                
+                # Within a cell the sweeps run in the order given, so later ones
+                # are credited only with places the earlier ones missed
+                priority = (self.priors.priority(key) if self.priors else 0) - position
+                yield from self.schedule_grid({
+                    'grid_id': self.sweep_grid_id(self.region_cell_id(cell['region'], i), sweep),
+                    'grid_center': cell['center'],
                     'grid_index': i,
-                    'page': 1
-                },
-                dont_filter=True
-            )
+                    'cell_span': cell['cell_span'],
+                    'radius': cell['radius'],
+                    'grid_depth': 0,
+                    'sweep': sweep,
+                    'region': cell['region']
+                }, restored, priority=priority)
+        
+        # Adaptive children scheduled before the previous run stopped
+        for cell_meta in restored['pending_cells'].values():
+            self.total_grids += 1
+            yield from self.schedule_grid(cell_meta, restored)
+        
+        # Place Details requests that were in flight when the previous run stopped
+        for restaurant in restored['pending_places'].values():
+            yield self.build_details_request(restaurant)
     
-    def generate_grid_points(self):
-        """Generate grid points covering the entire Lagos area"""
-        grid_points = []
+    def restore_checkpoint(self):
+        """Load checkpointed progress and seed the in-memory crawl state"""
+        empty = {'done_cells': {}, 'pending_cells': {}, 'page_tokens': {},
+                 'enriched_places': set(), 'pending_places': {}}
+        if not self.checkpoint:
+            return empty
+        
+        restored = self.checkpoint.load()
+        self.processed_place_ids.update(restored['enriched_places'])
+        self.processed_place_ids.update(restored['pending_places'])
+        self.grid_results.update(restored['done_cells'])
+        
+        self.logger.info(f"Resuming from checkpoint {self.checkpoint.path}: "
+                         f"{len(restored['done_cells'])} grids done, "
+                         f"{len(restored['page_tokens'])} grids with followed pages, "
+                         f"{len(restored['enriched_places'])} places enriched, "
+                         f"{len(restored['pending_places'])} details requests to retry")
+        return restored
+    
+    def schedule_grid(self, cell_meta, restored, priority=0):
+        """Yield the request for a grid cell, skipping work the checkpoint says is done"""
+        grid_id = cell_meta['grid_id']
+        self.cell_keys[grid_id] = self.sweep_key(cell_meta['grid_center'], cell_meta['radius'],
+                                                 cell_meta.get('sweep', self.DEFAULT_SWEEP))
+        if grid_id in restored['done_cells']:
+            self.completed_grids += 1
+            return
+        
+        if grid_id in restored['page_tokens']:
+            page, next_page_token = restored['page_tokens'][grid_id]
+            self.completed_grids += 1
+            if next_page_token:
+                # Tokens may have expired; parse_grid_restaurants restarts the cell if so
+                yield self.build_page_request(dict(cell_meta, cell_priority=priority),
+                                              next_page_token, page + 1, resumed=True)
+            return
         
-        # Calculate number of steps in each direction
-        lat_steps = math.ceil((self.LAGOS_BOUNDS['north'] - self.LAGOS_BOUNDS['south']) / self.GRID_SIZE)
-        lng_steps = math.ceil((self.LAGOS_BOUNDS['east'] - self.LAGOS_BOUNDS['west']) / self.GRID_SIZE)
+        yield self.build_grid_request(**cell_meta, priority=priority)
+    
+    def order_by_priors(self, cells):
+        """Sort (index, cell) pairs by historical yield, densest first
+
+        Cells without history are ranked at the average yield of the known
+        ones, so new territory is neither starved nor searched first.
+        """
+        known = [self.priors.expected_yield(cell_key(cell['center'], cell['radius'])) for _, cell in cells]
+        known = [y for y in known if y is not None]
+        default = sum(known) / len(known) if known else 0
+        
+        def expected(pair):
+            y = self.priors.expected_yield(cell_key(pair[1]['center'], pair[1]['radius']))
+            return default if y is None else y
+        
+        self.logger.info(f"Cell priors from {self.priors.path}: {len(known)}/{len(cells)} grids with history, "
+                         f"run {self.priors.runs + 1}")
+        return sorted(cells, key=expected, reverse=True)
+    
+    def region_cell_id(self, region, index):
+        """Id of a planned cell; Lagos keeps the bare grid_N ids of single-city crawls"""
+        return f"grid_{index}" if region == DEFAULT_REGION else f"{region}/grid_{index}"
+    
+    def get_region(self, name):
+        """Region by name, defaulting to Lagos for cells checkpointed before regions existed"""
+        return Region.load(name or DEFAULT_REGION)
+    
+    def sweep_grid_id(self, cell_id, sweep):
+        """Grid id of one sweep over a cell; the default sweep keeps the bare cell id"""
+        return cell_id if sweep == self.DEFAULT_SWEEP else f"{sweep}:{cell_id}"
+    
+    def sweep_key(self, center, radius, sweep):
+        """Priors key of one sweep over a cell"""
+        return cell_key(center, radius, None if sweep == self.DEFAULT_SWEEP else sweep)
+    
+    def skip_grid(self, request):
+        """Called by CrawlBudgetMiddleware as a new grid's first request is about to be sent"""
+        task_id = request.meta.get('frontier_task')
+        if self.budget_exhausted():
+            # With a frontier the cell goes back to workers with budget left
+            if task_id:
+                self.frontier.release([task_id])
+            return True
+        if self.saturation_stop is not None and self.check_saturation():
+            # 'thin' keeps every other remaining grid, 'stop' drops them all
+            skip = self.saturation_action == 'stop' or request.meta.get('grid_index', 0) % 2 == 1
+            if skip and task_id:
+                self.frontier.complete(task_id)
+            return skip
+        return False
+    
+    def claim_places(self, place_ids):
+        """Return the place_ids seen for the first time, by this worker or any other"""
+        new = set()
+        for place_id in place_ids:
+            if place_id not in self.processed_place_ids:
+                self.processed_place_ids.add(place_id)
+                new.add(place_id)
+        if self.frontier and new:
+            shared = self.frontier.add_places([place_id for place_id in new if place_id])
+            new = {place_id for place_id in new if not place_id or place_id in shared}
+        return new
+    
+    def frontier_failed(self, failure):
+        """Errback FrontierMiddleware gives frontier requests: the task goes back for another try"""
+        if retry_task(self.frontier, failure.request):
+            self.crawler.stats.inc_value('frontier/failed_requests')
+        return failure
+    
+    def budget_exhausted(self):
+        """True once the call or time budget is spent"""
+        if self.budget_spent:
+            return True
+        
+        if self.budget_calls is not None:
+            live_calls = sum(self.api_call_count.values()) - self.crawler.stats.get_value('places_cache/hit', 0)
+            if live_calls >= self.budget_calls:
+                self.budget_spent = True
+                self.logger.info(f"Call budget of {self.budget_calls} spent, not scheduling further grids")
+        
+        if self.budget_deadline is not None and time.time() >= self.budget_deadline:
+            self.budget_spent = True
+            self.logger.info("Time budget spent, not scheduling further grids")
+        
+        if self.budget_spent:
+            self.partial_crawl = True
+            if self.frontier:
+                self.frontier.stop_claiming()
+        return self.budget_spent
+    
+    def remaining_grids(self):
+        return max(self.total_grids - self.completed_grids, 0)
+    
+    def check_saturation(self):
+        """True once the upper bound on undiscovered places drops below -a saturation_stop"""
+        if self.saturated:
+            return True
+        if self.completed_grids < self.total_grids * self.SATURATION_MIN_PROGRESS:
+            return False
         
-        self.logger.info(f"Grid dimensions: {lat_steps} x {lng_steps} = {lat_steps * lng_steps} total grids")
+        if self.saturation.estimate(self.remaining_grids())['undiscovered_high'] < self.saturation_stop:
+            self.saturated = True
+            self.partial_crawl = True
+            action = 'stopping' if self.saturation_action == 'stop' else 'thinning out'
+            self.logger.info(f"Sweep saturated ({self.saturation.summary(self.remaining_grids())}), {action} remaining grids")
+        return self.saturated
+    
+    def plan_coverage(self, region=None):
+        """Build a region's coverage plan selected with -a planner=hex|square"""
+        region = region or self.regions[0]
+        if self.planner == 'square':
+            plan = square_plan(region.bounds, self.GRID_SIZE, self.GRID_SEARCH_RADIUS)
+        else:
+            plan = hex_plan(region.bounds, self.hex_radius)
+        
+        if self.use_land_mask:
+            plan = plan.mask_land(region.land_mask())
+        return plan
+    
+    def build_grid_request(self, grid_id, grid_center, grid_index, cell_span, radius, grid_depth,
+                           sweep=None, region=None, priority=0):
+        """Build the first-page Nearby Search request for one sweep over a grid cell"""
+        lat, lng = grid_center
+        sweep = sweep or self.DEFAULT_SWEEP
+        self.cell_keys[grid_id] = self.sweep_key(grid_center, radius, sweep)
+        
+        # Google Places Nearby Search API
+        base_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+        params = {
+            'key': self.api_key,
+            'location': f"{lat},{lng}",
+            'radius': radius,
+            **self.SWEEPS[sweep]
+        }
         
-        # Generate grid center points
-        for i in range(lat_steps):
-            for j in range(lng_steps):
-                lat = self.LAGOS_BOUNDS['south'] + (i + 0.5) * self.GRID_SIZE
-                lng = self.LAGOS_BOUNDS['west'] + (j + 0.5) * self.GRID_SIZE
-                
-                # Ensure we don't go outside bounds
-                if (lat <= self.LAGOS_BOUNDS['north'] and 
-                    lng <= self.LAGOS_BOUNDS['east']):
-                    grid_points.append((lat, lng))
+        url = f"{base_url}?" + "&".join([f"{k}={quote(str(v), safe=',')}" for k, v in params.items()])
         
-        return grid_points
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_grid_restaurants,
+            meta={
+                'grid_id': grid_id,
+                'grid_center': grid_center,
+                'grid_index': grid_index,
+                'cell_span': cell_span,
+                'radius': radius,
+                'grid_depth': grid_depth,
+                'sweep': sweep,
+                'region': region or DEFAULT_REGION,
+                'cell_priority': priority,
+                # New grids are dropped by CrawlBudgetMiddleware once the budget is spent
+                'budget_gated': True,
+                'page': 1
+            },
+            priority=priority,
+            dont_filter=True
+        )
+    
+    def build_page_request(self, meta, next_page_token, page, resumed=False):
+        """Build the request following a grid cell's next_page_token"""
+        next_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?pagetoken={next_page_token}&key={self.api_key}"
+        
+        return scrapy.Request(
+            url=next_url,
+            callback=self.parse_grid_restaurants,
+            meta={
+                'grid_id': meta['grid_id'],
+                'grid_center': meta['grid_center'],
+                'grid_index': meta['grid_index'],
+                'cell_span': meta['cell_span'],
+                'radius': meta['radius'],
+                'grid_depth': meta.get('grid_depth', 0),
+                'sweep': meta.get('sweep', self.DEFAULT_SWEEP),
+                'region': meta.get('region', DEFAULT_REGION),
+                'cell_priority': meta.get('cell_priority', 0),
+                'page': page,
+                'resumed_token': resumed,
+                # Delay (without blocking) until the token is valid; checkpointed tokens are old already
+                'not_before': None if resumed else time.time() + self.NEXT_PAGE_TOKEN_DELAY
+            },
+            # Finish cells already started before opening new ones
+            priority=meta.get('cell_priority', 0) + 1,
+            dont_filter=True
+        )
+    
+    def build_details_request(self, restaurant, priority=0):
+        """Build the Place Details request for a newly found restaurant"""
+        detail_url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={restaurant['place_id']}&key={self.api_key}&fields={','.join(self.DETAILS_FIELDS)}"
+        
+        return scrapy.Request(
+            url=detail_url,
+            callback=self.parse_restaurant_details,
+            meta=self.details_meta(restaurant),
+            priority=priority,
+            dont_filter=True
+        )
+    
+    def details_meta(self, restaurant):
+        """Request meta for a Place Details call, tagged for tiered refresh if enabled"""
+        meta = {'restaurant': restaurant}
+        if self.details_mode == 'tiered':
+            meta['details_tier'] = {'signature': change_signature(restaurant), 'max_age': self.tier_max_age}
+        return meta
+    
+    def generate_grid_points(self):
+        """Generate grid points covering every selected region"""
+        return [center for region in self.regions for center in self.plan_coverage(region).centers]
     
     def parse_grid_restaurants(self, response):
         """Parse restaurants from a grid search"""
         grid_id = response.meta['grid_id']
         grid_center = response.meta['grid_center']
         grid_index = response.meta['grid_index']
+        depth = response.meta.get('grid_depth', 0)
+        sweep = response.meta.get('sweep', self.DEFAULT_SWEEP)
+        region = response.meta.get('region', DEFAULT_REGION)
         page = response.meta.get('page', 1)
         
+        # Calls are counted as their responses come back, so requests that were
+        # queued but never sent (budget spent, claimed by another worker) are not
+        self.api_call_count['nearby_search'] += 1
+        self.depth_call_count[depth] += 1
+        self.sweep_call_count[sweep] += 1
+        if page == 1:
+            self.depth_cell_count[depth] += 1
+        
         try:
-            data = json.loads(response.text)
+            data = places_json(response)
         except json.JSONDecodeError:
             self.logger.error(f"Failed to parse JSON for {grid_id}: {response.text[:200]}")
             return
         
         status = data.get('status')
+        if status == 'INVALID_REQUEST' and response.meta.get('resumed_token'):
+            # The checkpointed page token expired, start the cell again from page 1
+            self.logger.info(f"{grid_id} - Checkpointed page token expired, restarting grid")
+            yield self.build_grid_request(**{k: response.meta[k] for k in (
+                'grid_id', 'grid_center', 'grid_index', 'cell_span', 'radius', 'grid_depth', 'sweep', 'region')},
+                priority=response.meta.get('cell_priority', 0))
+            return
+        
+        if status == 'INVALID_REQUEST' and page > 1:
+            retry = self.retry_page_token(response)
+            if retry:
+                yield retry
+                return
+        
         if status != 'OK':
             if status == 'ZERO_RESULTS':
                 self.logger.info(f"{grid_id} - No restaurants found")
+                self.saturation.record(grid_id, [])
+                if self.checkpoint:
+                    self.checkpoint.mark_cell_done(grid_id, self.grid_results.get(grid_id, 0))
             else:
+                # Still failing after PlacesStatusMiddleware's retries: the cell was
+                # not searched, so it teaches the priors nothing and rules out tombstones
                 self.logger.error(f"{grid_id} - API Error: {status} - {data.get('error_message', 'Unknown error')}")
+                self.partial_crawl = True
             
             # Mark grid as completed even with no results
             if page == 1:
                 self.completed_grids += 1
-                self.grid_results[grid_id] = 0
+                if status == 'ZERO_RESULTS':
+                    self.grid_results[grid_id] = 0
                 self.log_progress()
             return
         
         results = data.get('results', [])
         restaurants_found = 0
+        self.saturation.record(grid_id, [place.get('place_id') for place in results if place.get('place_id')])
         
         self.logger.info(f"{grid_id} (center: {grid_center[0]:.4f}, {grid_center[1]:.4f}) - Found {len(results)} restaurants on page {page}")
+        new_place_ids = self.claim_places([place.get('place_id') for place in results])
         
         for place in results:
             place_id = place.get('place_id')
             
-            # Skip if already processed (deduplication across grids)
-            if place_id in self.processed_place_ids:
+            # Skip if already processed (deduplication across grids and workers)
+            if place_id not in new_place_ids:
                 continue
             
-            self.processed_place_ids.add(place_id)
             restaurants_found += 1
             
             # Extract basic information
@@ -184,6 +640,8 @@ class GooglePlacesGridSpider(scrapy.Spider):
                 'grid_id': grid_id,
                 'grid_center': grid_center,
                 'grid_index': grid_index,
+                'sweep': sweep,
+                'region': region,
                 'page': page
             }
             
@@ -201,74 +659,88 @@ class GooglePlacesGridSpider(scrapy.Spider):
                     restaurant['photo_url'] = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_ref}&key={self.api_key}"
             
             
-            # Get detailed information
+            # Get detailed information (repeat lookups are answered by PlacesCacheMiddleware)
             if restaurant['place_id']:
-                cache_key = self.get_cache_key(restaurant['place_id'])
-                if cache_key in self.place_details_cache:
-                    cached_details = self.place_details_cache[cache_key]
-                    restaurant.update(cached_details)
-                    yield restaurant
-                else:
-                    # Request detailed information
-                    fields = [
-                        'name', 'formatted_address', 'formatted_phone_number', 'website', 
-                        'opening_hours', 'reviews', 'editorial_summary', 'url',
-                        'wheelchair_accessible_entrance', 'serves_takeout', 'serves_delivery',
-                        'serves_dine_in', 'reservable', 'delivery', 'takeout', 'curbside_pickup',
-                        'serves_breakfast', 'serves_lunch', 'serves_dinner', 'serves_beer',
-                        'serves_wine', 'serves_brunch', 'serves_vegetarian_food',
-                        'outdoor_seating', 'live_music', 'menu_for_children', 'restroom',
-                        'good_for_children', 'good_for_groups', 'lgbtq_friendly',
-                        'serves_coffee', 'serves_dessert', 'serves_happy_hour_food',
-                        'serves_late_night_food', 'serves_cocktails', 'allows_dogs',
-                        'has_wheelchair_accessible_parking', 'has_delivery', 'has_takeout',
-                        'has_wheelchair_accessible_entrance', 'has_wheelchair_accessible_restroom',
-                        'has_wheelchair_accessible_seating', 'allows_children', 'has_high_chairs',
-                        'has_changing_table', 'has_kids_menu', 'good_for_kids', 'has_playground',
-                        'accepts_reservations', 'accepts_credit_cards', 'accepts_debit_cards',
-                        'accepts_cash_only', 'accepts_nfc', 'requires_reservations'
-                    ]
-                    detail_url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={restaurant['place_id']}&key={self.api_key}&fields={','.join(fields)}"
-                    
-                    self.apply_rate_limiting()
-                    self.api_call_count['place_details'] += 1
-                    
-                    yield scrapy.Request(
-                        url=detail_url,
-                        callback=self.parse_restaurant_details,
-                        meta={'restaurant': restaurant, 'cache_key': cache_key},
-                        dont_filter=True
-                    )
+                if self.checkpoint:
+                    self.checkpoint.mark_place_pending(place_id, restaurant)
+                yield self.build_details_request(restaurant, priority=response.meta.get('cell_priority', 0) + 1)
             else:
                 yield restaurant
         
         # Update grid results on first page
+        self.grid_results[grid_id] = self.grid_results.get(grid_id, 0) + restaurants_found
+        self.sweep_found[sweep] += restaurants_found
+        self.region_found[region] += restaurants_found
+        if self.frontier:
+            self.frontier.add_grid_result(grid_id, restaurants_found)
         if page == 1:
             self.completed_grids += 1
-            self.grid_results[grid_id] = restaurants_found
             self.log_progress()
         
         # Handle pagination for this grid
         next_page_token = data.get('next_page_token')
-        if next_page_token and page < 3:  # Limit to 3 pages per grid
-            time.sleep(2)  # Required delay for next page token
-            
-            next_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?pagetoken={next_page_token}&key={self.api_key}"
-            
-            self.apply_rate_limiting()
-            self.api_call_count['nearby_search'] += 1
-            
-            yield scrapy.Request(
-                url=next_url,
-                callback=self.parse_grid_restaurants,
-                meta={
-                    'grid_id': grid_id,
-                    'grid_center': grid_center, 
-                    'grid_index': grid_index,
-                    'page': page + 1
-                },
-                dont_filter=True
-            )
+        if page >= self.MAX_PAGES_PER_GRID:
+            next_page_token = None
+        
+        if self.checkpoint:
+            self.checkpoint.mark_page(grid_id, page, next_page_token)
+            if not next_page_token:
+                self.checkpoint.mark_cell_done(grid_id, self.grid_results[grid_id])
+        
+        if next_page_token:
+            yield self.build_page_request(response.meta, next_page_token, page + 1)
+        
+        # A full last page means Google capped the results, so split the cell
+        if (self.adaptive and page == self.MAX_PAGES_PER_GRID
+                and len(results) >= self.RESULTS_PER_PAGE):
+            yield from self.subdivide_grid(response.meta)
+    
+    def retry_page_token(self, response):
+        """Re-send a page request whose next_page_token was not ready yet"""
+        retries = response.meta.get('token_retries', 0)
+        if retries >= self.NEXT_PAGE_TOKEN_RETRIES:
+            self.logger.error(f"{response.meta['grid_id']} - Page token still invalid after {retries} retries")
+            return None
+        
+        # The dupefilter has seen this URL already, on the first try
+        retry = response.request.replace(dont_filter=True)
+        retry.meta['token_retries'] = retries + 1
+        retry.meta['not_before'] = time.time() + self.NEXT_PAGE_TOKEN_DELAY * (retries + 1)
+        self.logger.info(f"{response.meta['grid_id']} - Page token not ready, retry {retries + 1}")
+        return retry
+    
+    def subdivide_grid(self, meta):
+        """Split a saturated grid cell into four children with a smaller radius"""
+        depth = meta.get('grid_depth', 0)
+        lat_span, lng_span = meta['cell_span']
+        child_span = (lat_span / 2, lng_span / 2)
+        lat, lng = meta['grid_center']
+        child_radius = cell_circumradius(lat, child_span)
+        
+        if depth >= self.ADAPTIVE_MAX_DEPTH or child_radius < self.ADAPTIVE_MIN_RADIUS:
+            self.logger.info(f"{meta['grid_id']} - Saturated at max depth {depth}, not splitting")
+            return
+        
+        self.subdivided_grids += 1
+        self.total_grids += 4
+        self.logger.info(f"{meta['grid_id']} - Saturated, splitting into 4 cells (radius {child_radius}m)")
+        
+        offsets = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+        for k, (dlat, dlng) in enumerate(offsets):
+            child_center = (lat + dlat * child_span[0] / 2, lng + dlng * child_span[1] / 2)
+            child_meta = {
+                'grid_id': f"{meta['grid_id']}.{k}",
+                'grid_center': child_center,
+                'grid_index': meta['grid_index'],
+                'cell_span': child_span,
+                'radius': child_radius,
+                'grid_depth': depth + 1,
+                'sweep': meta.get('sweep', self.DEFAULT_SWEEP),
+                'region': meta.get('region', DEFAULT_REGION)
+            }
+            if self.checkpoint:
+                self.checkpoint.mark_cell_pending(child_meta['grid_id'], child_meta)
+            yield self.build_grid_request(**child_meta, priority=meta.get('cell_priority', 0))
     
     def log_progress(self):
         """Log grid search progress"""
@@ -277,255 +749,51 @@ class GooglePlacesGridSpider(scrapy.Spider):
             total_restaurants = len(self.processed_place_ids)
             
             self.logger.info(f"GRID PROGRESS: {self.completed_grids}/{self.total_grids} grids ({progress_pct:.1f}%) - {total_restaurants} unique restaurants found")
+            if self.saturation.calls:
+                self.logger.info(f"SATURATION: {self.saturation.summary(self.remaining_grids())}")
+            if self.frontier:
+                counts = self.frontier.counts()
+                self.logger.info(f"FRONTIER ({self.worker_id}): " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
     
     def parse_restaurant_details(self, response):
         """Parse detailed restaurant information"""
         restaurant = response.meta['restaurant']
-        cache_key = response.meta.get('cache_key')
+        self.api_call_count['place_details'] += 1
         
         try:
-            data = json.loads(response.text)
+            data = places_json(response)
         except json.JSONDecodeError:
             self.logger.error(f"Failed to parse details JSON: {response.text[:200]}")
+            # Listing fields only; DeltaPipeline keeps the previous record
+            restaurant['details_error'] = 'unparsable'
+            if self.checkpoint:
+                self.checkpoint.mark_place_enriched(restaurant['place_id'])
             yield restaurant
             return
         
         if data.get('status') != 'OK':
             self.logger.warning(f"Details API error for {restaurant['name']}: {data.get('status')}")
+            restaurant['details_error'] = data.get('status')
+            if self.checkpoint:
+                self.checkpoint.mark_place_enriched(restaurant['place_id'])
             yield restaurant
             return
         
-        result = data.get('result', {})
-        
-        # Add detailed information with enhancements
-        restaurant.update({
-            'formatted_address': result.get('formatted_address'),
-            'phone_number': result.get('formatted_phone_number'),
-            'phone_number_cleaned': self.clean_phone_number(result.get('formatted_phone_number')),
-            'website': result.get('website'),
-            'google_url': f"https://www.google.com/maps/place/?q=place_id:{restaurant['place_id']}"
-        })
-        
-        # Extract and enhance location details
-        restaurant['location_details'] = self.extract_location_details(result.get('formatted_address'))
-        restaurant['price_range_text'] = self.interpret_price_level(restaurant.get('price_level'))
-        
-        # Extract and enhance opening hours
-        opening_hours = result.get('opening_hours', {})
-        restaurant['opening_hours'] = opening_hours.get('weekday_text', [])
-        restaurant['opening_hours_parsed'] = self.parse_opening_hours(opening_hours.get('weekday_text', []))
-        restaurant['is_open_24_7'] = self.check_24_7_operation(opening_hours.get('weekday_text', []))
-        
-        # Extract reviews
-        reviews = result.get('reviews', [])
-        restaurant['all_reviews'] = []
-        restaurant['reviews_count'] = len(reviews)
-        
-        for review in reviews:
-            review_data = {
-                'author_name': review.get('author_name'),
-                'author_url': review.get('author_url'),
-                'language': review.get('language'),
-                'profile_photo_url': review.get('profile_photo_url'),
-                'rating': review.get('rating'),
-                'relative_time_description': review.get('relative_time_description'),
-                'text': review.get('text'),
-                'time': review.get('time'),
-                'translated': review.get('translated', False)
-            }
-            restaurant['all_reviews'].append(review_data)
-        
-        restaurant['editorial_summary'] = result.get('editorial_summary', {}).get('overview')
-        restaurant['google_maps_url'] = result.get('url')
-        
-        # Extract all feature categories
-        restaurant['service_options'] = {
-            'delivery': result.get('serves_delivery') or result.get('delivery'),
-            'takeout': result.get('serves_takeout') or result.get('takeout'), 
-            'dine_in': result.get('serves_dine_in'),
-            'curbside_pickup': result.get('curbside_pickup'),
-            'reservable': result.get('reservable')
-        }
-        
-        restaurant['accessibility'] = {
-            'wheelchair_accessible_entrance': result.get('wheelchair_accessible_entrance'),
-            'restroom': result.get('restroom')
-        }
-        
-        restaurant['dining_options'] = {
-            'serves_breakfast': result.get('serves_breakfast'),
-            'serves_lunch': result.get('serves_lunch'),
-            'serves_dinner': result.get('serves_dinner'),
-            'serves_brunch': result.get('serves_brunch'),
-            'serves_beer': result.get('serves_beer'),
-            'serves_wine': result.get('serves_wine'),
-            'serves_vegetarian_food': result.get('serves_vegetarian_food')
-        }
-        
-        restaurant['atmosphere_features'] = {
-            'outdoor_seating': result.get('outdoor_seating'),
-            'live_music': result.get('live_music'),
-            'good_for_children': result.get('good_for_children'),
-            'good_for_groups': result.get('good_for_groups'),
-            'menu_for_children': result.get('menu_for_children'),
-            'lgbtq_friendly': result.get('lgbtq_friendly')
-        }
-        
-        restaurant['offerings'] = {
-            'serves_coffee': result.get('serves_coffee'),
-            'serves_dessert': result.get('serves_dessert'),
-            'serves_happy_hour_food': result.get('serves_happy_hour_food'),
-            'serves_late_night_food': result.get('serves_late_night_food'),
-            'serves_cocktails': result.get('serves_cocktails'),
-            'allows_dogs': result.get('allows_dogs')
-        }
-        
-        restaurant['parking'] = {
-            'wheelchair_accessible_parking': result.get('has_wheelchair_accessible_parking'),
-            'wheelchair_accessible_entrance': result.get('has_wheelchair_accessible_entrance'),
-            'wheelchair_accessible_restroom': result.get('has_wheelchair_accessible_restroom'),
-            'wheelchair_accessible_seating': result.get('has_wheelchair_accessible_seating')
-        }
+        # Contact, location, hours, reviews, feature groups and highlights
+        self.ENRICHER.enrich(restaurant, data.get('result', {}), self.get_region(restaurant.get('region')))
         
-        restaurant['children_features'] = {
-            'allows_children': result.get('allows_children'),
-            'high_chairs': result.get('has_high_chairs'),
-            'changing_table': result.get('has_changing_table'),
-            'kids_menu': result.get('has_kids_menu'),
-            'good_for_kids': result.get('good_for_kids'),
-            'playground': result.get('has_playground')
-        }
-        
-        restaurant['planning'] = {
-            'accepts_reservations': result.get('accepts_reservations'),
-            'requires_reservations': result.get('requires_reservations'),
-            'accepts_credit_cards': result.get('accepts_credit_cards'),
-            'accepts_debit_cards': result.get('accepts_debit_cards'),
-            'accepts_cash_only': result.get('accepts_cash_only'),
-            'accepts_nfc': result.get('accepts_nfc')
-        }
-        
-        # Create highlights summary
-        restaurant['highlights'] = []
-        
-        # Service highlights
-        if restaurant['service_options']['delivery']:
-            restaurant['highlights'].append('Delivery available')
-        if restaurant['service_options']['takeout']:
-            restaurant['highlights'].append('Takeout available')
-        if restaurant['service_options']['dine_in']:
-            restaurant['highlights'].append('Dine-in available')
-        if restaurant['service_options']['reservable']:
-            restaurant['highlights'].append('Reservations accepted')
-        if restaurant['service_options']['curbside_pickup']:
-            restaurant['highlights'].append('Curbside pickup')
-            
-        # Accessibility highlights
-        if restaurant['accessibility']['wheelchair_accessible_entrance']:
-            restaurant['highlights'].append('Wheelchair accessible')
-            
-        # Dining highlights
-        if restaurant['dining_options']['serves_vegetarian_food']:
-            restaurant['highlights'].append('Vegetarian options')
-        if restaurant['dining_options']['serves_beer']:
-            restaurant['highlights'].append('Serves beer')
-        if restaurant['dining_options']['serves_wine']:
-            restaurant['highlights'].append('Serves wine')
-            
-        # Atmosphere highlights
-        if restaurant['atmosphere_features']['outdoor_seating']:
-            restaurant['highlights'].append('Outdoor seating')
-        if restaurant['atmosphere_features']['live_music']:
-            restaurant['highlights'].append('Live music')
-        if restaurant['atmosphere_features']['good_for_children']:
-            restaurant['highlights'].append('Good for kids')
-        if restaurant['atmosphere_features']['good_for_groups']:
-            restaurant['highlights'].append('Good for groups')
-        if restaurant['atmosphere_features']['lgbtq_friendly']:
-            restaurant['highlights'].append('LGBTQ+ friendly')
-            
-        # Offerings highlights
-        if restaurant['offerings']['serves_coffee']:
-            restaurant['highlights'].append('Serves coffee')
-        if restaurant['offerings']['serves_dessert']:
-            restaurant['highlights'].append('Serves dessert')
-        if restaurant['offerings']['serves_happy_hour_food']:
-            restaurant['highlights'].append('Happy hour food')
-        if restaurant['offerings']['serves_late_night_food']:
-            restaurant['highlights'].append('Late night food')
-        if restaurant['offerings']['serves_cocktails']:
-            restaurant['highlights'].append('Serves cocktails')
-        if restaurant['offerings']['allows_dogs']:
-            restaurant['highlights'].append('Dog-friendly')
-            
-        # Children highlights
-        if restaurant['children_features']['good_for_kids']:
-            restaurant['highlights'].append('Kid-friendly')
-        if restaurant['children_features']['kids_menu']:
-            restaurant['highlights'].append('Kids menu')
-        if restaurant['children_features']['high_chairs']:
-            restaurant['highlights'].append('High chairs available')
-        if restaurant['children_features']['playground']:
-            restaurant['highlights'].append('Has playground')
-            
-        # Planning highlights
-        if restaurant['planning']['accepts_reservations']:
-            restaurant['highlights'].append('Accepts reservations')
-        if restaurant['planning']['accepts_credit_cards']:
-            restaurant['highlights'].append('Accepts credit cards')
-        if restaurant['planning']['accepts_cash_only']:
-            restaurant['highlights'].append('Cash only')
-        
-        # Create reviews summary
-        if reviews:
-            ratings = [r.get('rating', 0) for r in reviews if r.get('rating')]
-            if ratings:
-                restaurant['reviews_summary'] = {
-                    'total_reviews_fetched': len(reviews),
-                    'avg_rating_from_reviews': sum(ratings) / len(ratings),
-                    'rating_distribution': {
-                        '5_star': len([r for r in ratings if r == 5]),
-                        '4_star': len([r for r in ratings if r == 4]),
-                        '3_star': len([r for r in ratings if r == 3]),
-                        '2_star': len([r for r in ratings if r == 2]),
-                        '1_star': len([r for r in ratings if r == 1])
-                    }
-                }
-        
-        # Cache the enhanced data
-        if cache_key:
-            cache_data = {k: v for k, v in restaurant.items() 
-                         if k not in ['name', 'place_id', 'source', 'grid_id', 'grid_center', 'grid_index', 'page']}
-            self.place_details_cache[cache_key] = cache_data
+        if self.checkpoint:
+            self.checkpoint.mark_place_enriched(restaurant['place_id'])
         
         yield restaurant
     
     # Include all the helper methods from the original spider
-    def get_cache_key(self, place_id):
-        """Generate cache key for place details"""
-        return hashlib.md5(place_id.encode()).hexdigest()
-    
-    def apply_rate_limiting(self):
-        """Apply rate limiting to respect Google's API limits"""
-        current_time = time.time()
-        
-        # Remove timestamps older than 1 second
-        self.request_timestamps = [ts for ts in self.request_timestamps if current_time - ts < 1.0]
-        
-        # If we're at the rate limit, wait
-        if len(self.request_timestamps) >= self.max_requests_per_second:
-            sleep_time = 1.0 - (current_time - self.request_timestamps[0])
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-        
-        # Add current timestamp
-        self.request_timestamps.append(current_time)
-    
     def closed(self, reason):
         """Called when spider closes - log comprehensive statistics"""
         total_requests = sum(self.api_call_count.values())
         unique_places = len(self.processed_place_ids)
-        cache_hits = len(self.place_details_cache)
+        cache_hits = self.crawler.stats.get_value('places_cache/hit', 0)
+        cache_misses = self.crawler.stats.get_value('places_cache/miss', 0)
         
         self.logger.info("=" * 60)
         self.logger.info("GRID-BASED COMPREHENSIVE SEARCH COMPLETED")
@@ -536,10 +804,10 @@ class GooglePlacesGridSpider(scrapy.Spider):
         self.logger.info(f"Nearby search requests: {self.api_call_count['nearby_search']}")
         self.logger.info(f"Place details requests: {self.api_call_count['place_details']}")
         self.logger.info(f"Unique restaurants found: {unique_places}")
-        self.logger.info(f"Cache entries created: {cache_hits}")
+        self.logger.info(f"Cache hits/misses: {cache_hits}/{cache_misses}")
         self.logger.info(f"API requests saved by caching: {cache_hits}")
-        if total_requests > 0:
-            efficiency = (cache_hits / total_requests) * 100
+        if cache_hits + cache_misses > 0:
+            efficiency = (cache_hits / (cache_hits + cache_misses)) * 100
             self.logger.info(f"Cache efficiency: {efficiency:.1f}%")
         
         # Log top performing grids
@@ -549,104 +817,59 @@ class GooglePlacesGridSpider(scrapy.Spider):
             for grid_id, count in sorted_grids[:5]:
                 self.logger.info(f"  {grid_id}: {count} restaurants")
         
-        self.logger.info("=" * 60)
-    
-    # All the enhancement methods
-    def clean_phone_number(self, phone):
-        """Clean and standardize phone number format"""
-        if not phone:
-            return None
-        
-        import re
-        cleaned = re.sub(r'[^\d+]', '', phone)
-        
-        if cleaned.startswith('+234'):
-            return cleaned
-        elif cleaned.startswith('234'):
-            return '+' + cleaned
-        elif cleaned.startswith('0') and len(cleaned) == 11:
-            return '+234' + cleaned[1:]
-        
-        return phone
-    
-    def extract_location_details(self, address):
-        """Extract detailed location information from address"""
-        if not address:
-            return {}
-        
-        details = {
-            'full_address': address,
-            'area': None,
-            'state': None,
-            'country': None,
-            'postal_code': None
-        }
-        
-        lagos_areas = [
-            'Victoria Island', 'Ikoyi', 'Lekki', 'Ajah', 'Surulere', 'Ikeja', 
-            'Yaba', 'Lagos Island', 'Apapa', 'Festac', 'Gbagada', 'Magodo',
-            'Ojodu', 'Ogba', 'Agege', 'Alaba', 'Badagry', 'Epe', 'Ikorodu',
-            'Mushin', 'Oshodi', 'Isolo', 'Ketu', 'Mile 12', 'Berger', 'Ojota'
-        ]
-        
-        address_upper = address.upper()
-        for area in lagos_areas:
-            if area.upper() in address_upper:
-                details['area'] = area
-                break
-        
-        if 'LAGOS' in address_upper:
-            details['state'] = 'Lagos State'
-        if 'NIGERIA' in address_upper:
-            details['country'] = 'Nigeria'
-            
-        import re
-        postal_match = re.search(r'\b\d{6}\b', address)
-        if postal_match:
-            details['postal_code'] = postal_match.group()
-            
-        return details
-    
-    def interpret_price_level(self, price_level):
-        """Convert Google's price level (0-4) to human-readable text"""
-        price_map = {
-            0: 'Free',
-            1: 'Inexpensive (₦)',
-            2: 'Moderate (₦₦)',
-            3: 'Expensive (₦₦₦)',
-            4: 'Very Expensive (₦₦₦₦)'
-        }
-        return price_map.get(price_level, 'Price not available')
-    
-    def parse_opening_hours(self, weekday_text_list):
-        """Parse opening hours into structured format"""
-        if not weekday_text_list:
-            return {}
-        
-        parsed_hours = {}
-        days_map = {
-            'Monday': 'monday', 'Tuesday': 'tuesday', 'Wednesday': 'wednesday',
-            'Thursday': 'thursday', 'Friday': 'friday', 'Saturday': 'saturday', 'Sunday': 'sunday'
-        }
-        
-        for day_text in weekday_text_list:
-            for day_name, day_key in days_map.items():
-                if day_text.startswith(day_name):
-                    time_part = day_text.replace(f'{day_name}: ', '')
-                    if 'Closed' in time_part:
-                        parsed_hours[day_key] = {'status': 'closed', 'hours': None}
-                    elif 'Open 24 hours' in time_part:
-                        parsed_hours[day_key] = {'status': 'open_24h', 'hours': '24 hours'}
-                    else:
-                        parsed_hours[day_key] = {'status': 'open', 'hours': time_part}
-                    break
-        
-        return parsed_hours
-    
-    def check_24_7_operation(self, weekday_text_list):
-        """Check if restaurant operates 24/7"""
-        if not weekday_text_list:
-            return False
+        # Log Nearby Search spend per subdivision depth
+        if self.depth_call_count:
+            self.logger.info(f"Nearby search calls by depth ({self.subdivided_grids} grids subdivided):")
+            for depth in sorted(self.depth_call_count):
+                self.logger.info(f"  depth {depth}: {self.depth_cell_count[depth]} grids, {self.depth_call_count[depth]} calls")
+        
+        # Nearby Search spend per sweep against the places only that sweep found
+        # (each new place also costs one Place Details call, whichever sweep found it)
+        if len(self.sweeps) > 1:
+            self.logger.info("Sweeps:")
+            for sweep in self.sweeps:
+                calls = self.sweep_call_count[sweep]
+                found = self.sweep_found[sweep]
+                cost = f"{calls / found:.2f} calls per new place" if found else "no new places"
+                self.logger.info(f"  {sweep}: {calls} calls, {found} new places, {cost}, "
+                                 f"{self.sweep_pruned[sweep]} grids pruned by priors")
+        
+        if len(self.regions) > 1:
+            self.logger.info("Regions: " + ", ".join(f"{region.label} {self.region_found[region.name]}"
+                                                     for region in self.regions))
+        
+        if self.saturation.calls:
+            self.logger.info(f"Saturation: {self.saturation.summary(self.remaining_grids())}")
+        
+        if self.checkpoint:
+            self.checkpoint.close()
+            self.logger.info(f"Checkpoint saved to {self.checkpoint.path}")
+        
+        # Fold this run's per-grid yields into the scheduling priors. With a
+        # frontier the yields of all workers are saved once, by whichever
+        # worker finds the frontier drained first
+        grid_results = self.grid_results
+        if self.priors and self.frontier:
+            if self.frontier.pending() == 0 and self.frontier.elect('priors'):
+                grid_results = self.frontier.grid_results()
+            else:
+                grid_results = None
+                self.logger.info("Cell priors left for the worker that finishes the frontier")
+        if self.priors and grid_results is not None:
+            for grid_id, found in grid_results.items():
+                key = self.cell_keys.get(grid_id)
+                if key:
+                    self.priors.record(key, found)
+            self.priors.save()
+            self.logger.info(f"Cell priors saved to {self.priors.path} "
+                             f"({self.sampled_out_grids} persistently empty grids skipped this run)")
+        if self.budget_spent or self.saturated:
+            skipped = self.crawler.stats.get_value('budget/skipped_grids', 0)
+            self.logger.info(f"Sweep cut short: {skipped} grids left unsearched keep their priors")
+        
+        if self.frontier:
+            counts = self.frontier.counts()
+            self.logger.info(f"Frontier {self.frontier.path}: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+            self.frontier.close()
         
-        open_24h_count = sum(1 for day_text in weekday_text_list if 'Open 24 hours' in day_text)
-        return open_24h_count == 7
\ No newline at end of file
+        self.logger.info("=" * 60)
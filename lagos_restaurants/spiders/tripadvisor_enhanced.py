@@ -4,6 +4,8 @@ import re
 import random
 from urllib.parse import urljoin
 
+from lagos_restaurants.regions import DEFAULT_REGION, Region
+
 class TripAdvisorEnhancedSpider(scrapy.Spider):
     name = "tripadvisor_enhanced"
     allowed_domains = ["tripadvisor.com"]
@@ -504,19 +506,15 @@ class TripAdvisorEnhancedSpider(scrapy.Spider):
             '.geo a::text'
         ]
         
-        # Lagos areas to match against
-        lagos_areas = [
-            'Victoria Island', 'Ikoyi', 'Lekki', 'Ajah', 'Surulere', 'Ikeja',
-            'Yaba', 'Lagos Island', 'Apapa', 'Festac', 'Gbagada', 'Magodo',
-            'Ojodu', 'Ogba', 'Agege', 'Alaba', 'Badagry', 'Epe', 'Ikorodu'
-        ]
+        # Same area names (and tie-breaking) as the Google spiders' addresses
+        region = Region.load(DEFAULT_REGION)
         
         for selector in area_selectors:
             location_elements = response.css(selector).getall()
             for element in location_elements:
-                for area in lagos_areas:
-                    if area.lower() in element.lower():
-                        return area
+                area = region.match_area(element)
+                if area:
+                    return area
         
         return None
     
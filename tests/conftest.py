@@ -0,0 +1,21 @@
+# Shared fixtures. Modules that expire things read time.time(); the clock
+# fixture replaces it so tests move time forward instead of sleeping.
+
+import time
+
+import pytest
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
@@ -0,0 +1,20 @@
+# Area assignment against the bundled Lagos area polygons
+
+import pytest
+
+from lagos_restaurants.enrichment import extract_location_details
+
+
+@pytest.mark.parametrize('address, lat, lng, area', [
+    # Inside a neighbourhood polygon: the polygon decides
+    ('Adeola Odeku St, Victoria Island, Lagos', 6.4300, 3.4200, 'Victoria Island'),
+    # Only inside a rough LGA box: an area the address names wins
+    ('12 Ikorodu Rd, Maryland, Lagos', 6.5720, 3.3670, 'Maryland'),
+    ('Sangotedo, Ajah, Lagos', 6.4700, 3.6300, 'Sangotedo'),
+    # ...but not a road named after another area
+    ('5 Ikorodu Road, Lagos', 6.5720, 3.3670, 'Ikeja'),
+    # No coordinates: the address alone
+    ('Bode Thomas St, Surulere, Lagos', None, None, 'Surulere'),
+])
+def test_area(address, lat, lng, area):
+    assert extract_location_details(address, lat=lat, lng=lng)['area'] == area
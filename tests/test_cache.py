@@ -0,0 +1,96 @@
+# Offline checks of the Places response cache. Time is moved forward with
+# the clock fixture (conftest.py).
+
+import pytest
+
+from lagos_restaurants.cache import DAY, DEFAULT_TTLS, PlacesCache
+
+
+@pytest.fixture
+def places_cache(tmp_path, clock):
+    places_cache = PlacesCache(str(tmp_path / 'cache.sqlite'))
+    yield places_cache
+    places_cache.close()
+
+
+def test_refreshing_one_field_keeps_the_others_expiring(places_cache, clock):
+    places_cache.set_details('p1', ['rating', 'reviews'], {'rating': 4.1, 'reviews': ['good']})
+
+    # Another spider refetches only the rating two days later
+    clock.now += 2 * DAY
+    places_cache.set_details('p1', ['rating'], {'rating': 4.3})
+
+    clock.now += 2 * DAY
+    assert places_cache.get_details('p1', ['rating']) == {'rating': 4.3}
+    assert places_cache.get_details('p1', ['reviews']) is None
+    assert places_cache.get_details('p1', ['rating', 'reviews']) is None
+
+
+def test_tier_signature_is_kept_per_field(places_cache, clock):
+    old = {'rating': 4.1, 'user_ratings_total': 10}
+    new = {'rating': 4.3, 'user_ratings_total': 12}
+    places_cache.set_details('p1', ['reviews'], {'reviews': ['good']}, signature=old)
+    assert places_cache.get_tier('p1', ['reviews'], old, max_age=14 * DAY) == {'reviews': ['good']}
+
+    # A spider asking for other atmosphere fields after the place got new reviews
+    places_cache.set_details('p1', ['rating'], {'rating': 4.3}, signature=new)
+    assert places_cache.get_tier('p1', ['rating'], new, max_age=14 * DAY) == {'rating': 4.3}
+    assert places_cache.get_tier('p1', ['reviews'], new, max_age=14 * DAY) is None
+
+
+def test_details_expire_after_their_group_ttl(places_cache, clock):
+    places_cache.set_details('p1', ['formatted_address', 'website', 'rating'],
+                             {'formatted_address': '1 Broad St, Lagos', 'website': 'https://example.com',
+                              'rating': 4.1})
+
+    clock.now += DEFAULT_TTLS['atmosphere'] + 1
+    assert places_cache.get_details('p1', ['formatted_address', 'website']) == {
+        'formatted_address': '1 Broad St, Lagos', 'website': 'https://example.com'}
+    assert places_cache.get_details('p1', ['rating']) is None
+
+    clock.now += DEFAULT_TTLS['contact']
+    assert places_cache.get_details('p1', ['formatted_address']) == {'formatted_address': '1 Broad St, Lagos'}
+    assert places_cache.get_details('p1', ['website']) is None
+
+
+def test_expiry_survives_reopening(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite')
+    places_cache = PlacesCache(path)
+    places_cache.set_details('p1', ['rating'], {'rating': 4.1})
+    places_cache.set_search('lagos', 0, {'status': 'OK', 'results': []})
+    places_cache.close()
+
+    clock.now += DAY
+    places_cache = PlacesCache(path)
+    assert places_cache.get_details('p1', ['rating']) == {'rating': 4.1}
+    assert places_cache.get_search('lagos', 0) == {'status': 'OK', 'results': []}
+
+    clock.now += DEFAULT_TTLS['search']
+    assert places_cache.get_details('p1', ['rating']) is None
+    assert places_cache.get_search('lagos', 0) is None
+    assert places_cache.get_search('lagos', 0, allow_stale=True) == {'status': 'OK', 'results': []}
+    places_cache.close()
+
+
+def test_tier_is_reused_past_its_ttl_while_the_place_is_unchanged(places_cache, clock):
+    signature = {'rating': 4.1, 'user_ratings_total': 10}
+    places_cache.set_details('p1', ['reviews'], {'reviews': ['good']}, signature=signature)
+
+    clock.now += DEFAULT_TTLS['atmosphere'] + DAY
+    assert places_cache.get_details('p1', ['reviews']) is None
+    assert places_cache.get_tier('p1', ['reviews'], signature, max_age=14 * DAY) == {'reviews': ['good']}
+    assert places_cache.get_tier('p1', ['reviews'], dict(signature, user_ratings_total=11),
+                                 max_age=14 * DAY) is None
+
+    clock.now += 14 * DAY
+    assert places_cache.get_tier('p1', ['reviews'], signature, max_age=14 * DAY) is None
+
+
+def test_refetch_without_signature_keeps_the_tier_signature(places_cache, clock):
+    signature = {'rating': 4.1, 'user_ratings_total': 10}
+    places_cache.set_details('p1', ['reviews'], {'reviews': ['good']}, signature=signature)
+
+    # A spider outside tiered mode refreshes the reviews
+    clock.now += DAY
+    places_cache.set_details('p1', ['reviews'], {'reviews': ['good', 'great']})
+    assert places_cache.get_tier('p1', ['reviews'], signature, max_age=14 * DAY) == {'reviews': ['good', 'great']}
@@ -0,0 +1,98 @@
+# Offline checks of the SQLite frontier shared by grid workers: two workers
+# open the same file, time is moved forward with the clock fixture.
+
+import pytest
+from scrapy import Request
+
+from lagos_restaurants.frontier import MAX_ATTEMPTS, SqliteFrontier, retry_task
+
+LEASE = 60
+
+
+@pytest.fixture
+def workers(tmp_path, clock):
+    path = str(tmp_path / 'frontier.sqlite')
+    first, second = SqliteFrontier(path, 'w1', LEASE), SqliteFrontier(path, 'w2', LEASE)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(workers, clock):
+    first, second = workers
+    assert first.add('cell-1', 0, b'request')
+    assert not second.add('cell-1', 0, b'request')
+
+    assert first.claim(10) == [('cell-1', b'request', 1)]
+    assert second.claim(10) == []
+
+    # The first worker dies without finishing the task
+    clock.now += LEASE + 1
+    assert second.claim(10) == [('cell-1', b'request', 2)]
+    assert first.counts() == {'leased': 1}
+
+    # A lease renewed by the dead worker's leftovers does not take it back
+    first.renew(['cell-1'], clock.now + LEASE)
+    clock.now += LEASE / 2
+    assert first.claim(10) == []
+
+    second.complete('cell-1')
+    assert second.counts() == {'done': 1}
+    assert second.pending() == 0
+
+
+def test_renewed_lease_is_not_reclaimed(workers, clock):
+    first, second = workers
+    first.add('cell-1', 0, b'request')
+    first.claim(10)
+
+    clock.now += LEASE - 1
+    first.renew(['cell-1'], clock.now + LEASE)
+    clock.now += 2
+    assert second.claim(10) == []
+
+
+def test_task_fails_after_max_attempts_of_expired_leases(workers, clock):
+    first, second = workers
+    first.add('cell-1', 0, b'request')
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        assert first.claim(10) == [('cell-1', b'request', attempt)]
+        clock.now += LEASE + 1
+
+    assert second.claim(10) == []
+    assert second.counts() == {'failed': 1}
+    assert second.pending() == 0
+
+
+def test_retry_task_hands_the_task_back(workers, clock):
+    first, second = workers
+    first.add('cell-1', 0, b'request')
+    first.claim(10)
+    request = Request('https://example.com/cell-1', meta={'frontier_task': 'cell-1'})
+
+    # Only the worker holding the lease can hand it back
+    assert not retry_task(second, request)
+    assert retry_task(first, request)
+    assert 'cell-1' not in first.held
+    assert first.counts() == {'ready': 1}
+
+    # Not held any more, so a second failure report does nothing
+    assert not retry_task(first, request)
+    assert second.claim(10) == [('cell-1', b'request', 2)]
+
+
+def test_retry_task_gives_up_after_max_attempts(workers, clock):
+    first, _ = workers
+    first.add('cell-1', 0, b'request')
+    request = Request('https://example.com/cell-1', meta={'frontier_task': 'cell-1'})
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        assert first.claim(10) == [('cell-1', b'request', attempt)]
+        assert retry_task(first, request)
+
+    assert first.claim(10) == []
+    assert first.counts() == {'failed': 1}
+
+
+def test_requests_without_a_task_are_not_retried(workers):
+    first, _ = workers
+    assert not retry_task(first, Request('https://example.com/no-task'))
@@ -0,0 +1,52 @@
+# Offline checks of the Places API spiders: requests are fed through a real
+# Scrapy scheduler (and its dupefilter), responses are built locally. Run
+# from the repository root:
+#
+#   python -m pytest -q
+
+import json
+
+import pytest
+from scrapy.core.scheduler import Scheduler
+from scrapy.crawler import Crawler
+from scrapy.http import TextResponse
+
+from lagos_restaurants.spiders.google_places_api import GooglePlacesTextSearchSpider
+
+
+def places_response(request, data):
+    return TextResponse(url=request.url, body=json.dumps(data).encode(), encoding='utf-8', request=request)
+
+
+@pytest.fixture
+def text_search(monkeypatch):
+    """A text search spider and an open scheduler with the stock dupefilter"""
+    monkeypatch.setenv('GOOGLE_PLACES_API_KEY', 'test-key')
+    crawler = Crawler(GooglePlacesTextSearchSpider, {'TWISTED_REACTOR': None})
+    crawler._apply_settings()
+    crawler.spider = crawler._create_spider()
+    scheduler = Scheduler.from_crawler(crawler)
+    scheduler.open(crawler.spider)
+    yield crawler.spider, scheduler
+    scheduler.close('finished')
+
+
+def test_page_token_retry_passes_dupefilter(text_search):
+    spider, scheduler = text_search
+    first = next(iter(spider.start_requests()))
+    assert scheduler.enqueue_request(first)
+
+    page_1 = places_response(first, {'status': 'OK', 'results': [], 'next_page_token': 'token'})
+    next_page = next(request for request in spider.parse_restaurants(page_1))
+    assert next_page.meta['page'] == 2
+    assert scheduler.enqueue_request(next_page)
+
+    # Google answers INVALID_REQUEST until the token is ready; the retry is the same URL
+    not_ready = places_response(next_page, {'status': 'INVALID_REQUEST'})
+    retry = next(iter(spider.parse_restaurants(not_ready)))
+    assert retry.url == next_page.url
+    assert retry.meta['token_retries'] == 1
+    assert scheduler.enqueue_request(retry)
+
+    # A page the spider asks for twice is still filtered
+    assert not scheduler.enqueue_request(next_page.replace())
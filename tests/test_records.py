@@ -0,0 +1,66 @@
+# Offline checks of the spider output readers on complete and cut-off input.
+# Input is fed in small chunks so records straddle chunk boundaries.
+
+import pytest
+
+from lagos_restaurants.records import TruncatedInput, iter_json_array, iter_json_lines
+
+
+def chunked(text, size=5):
+    data = text.encode()
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def read(reader, text, **kwargs):
+    """Records read before the reader stopped, and the truncation messages passed to on_truncated"""
+    messages = []
+    records = list(reader(chunked(text), 'dump', on_truncated=messages.append, **kwargs))
+    return records, messages
+
+
+def test_json_array_reads_every_element():
+    text = '[\n{"name": "Amala Spot", "rating": 4.5},\n{"name": "Ofada Hut", "price_level": 1}, 12345\n]\n'
+    assert read(iter_json_array, text) == (
+        [{'name': 'Amala Spot', 'rating': 4.5}, {'name': 'Ofada Hut', 'price_level': 1}, 12345], [])
+
+
+@pytest.mark.parametrize('text, message', [
+    ('[{"n": 1}, {"n": 2}, {"n": ', "dump ends part-way through an array element"),
+    ('[{"n": 1}, {"n": 2},\n', "dump ends before the array's closing bracket"),
+    ('[{"n": 1}, {"n": 2}', "dump ends before the array's closing bracket"),
+])
+def test_json_array_stops_at_the_cut(text, message):
+    assert read(iter_json_array, text) == ([{'n': 1}, {'n': 2}], [message])
+
+
+def test_json_array_number_split_across_chunks_is_read_whole():
+    assert list(iter_json_array([b'[{"n": 1}, 123', b'45, 6', b'7]'])) == [{'n': 1}, 12345, 67]
+
+
+def test_json_array_truncation_raises_without_callback():
+    reader = iter_json_array(chunked('[{"n": 1}, {"n"'), 'dump')
+    assert next(reader) == {'n': 1}
+    with pytest.raises(TruncatedInput, match='part-way through an array element'):
+        next(reader)
+
+
+def test_json_lines_stop_at_a_cut_last_line():
+    records, messages = read(iter_json_lines, '{"n": 1}\n{"n": 2}\n{"n": 3, "na')
+    assert records == [{'n': 1}, {'n': 2}]
+    assert messages == ["dump ends with an incomplete line: b'{\"n\": 3, \"na'"]
+
+
+def test_json_lines_truncation_raises_without_callback():
+    with pytest.raises(TruncatedInput):
+        list(iter_json_lines(chunked('{"n": 1}\n{"n": '), 'dump'))
+
+
+def test_json_lines_bad_line_before_the_end_is_an_error():
+    with pytest.raises(ValueError) as raised:
+        list(iter_json_lines(chunked('{"n": 1}\n{"n": \n{"n": 3}\n'), 'dump', on_truncated=print))
+    assert not isinstance(raised.value, TruncatedInput)
+
+
+def test_json_lines_range_cannot_end_with_a_cut_line():
+    with pytest.raises(ValueError, match='Invalid JSON line'):
+        list(iter_json_lines(chunked('{"n": 1}\n{"n": '), 'dump', partial_tail=False))
@@ -0,0 +1,51 @@
+# Offline checks of DelayedScheduler: requests go through a real Scrapy
+# scheduler queue, nothing is downloaded.
+
+import time
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.crawler import Crawler
+
+from lagos_restaurants.scheduler import DelayedScheduler
+
+
+@pytest.fixture
+def scheduler():
+    crawler = Crawler(Spider, {'TWISTED_REACTOR': None})
+    crawler._apply_settings()
+    crawler.spider = crawler._create_spider('delayed')
+    crawler.stats.open_spider(crawler.spider)
+    scheduler = DelayedScheduler.from_crawler(crawler)
+    scheduler.open(crawler.spider)
+    yield scheduler
+    scheduler.close('finished')
+
+
+def test_early_request_waits_outside_the_queue(scheduler):
+    early = Request('https://example.com/page-2', meta={'not_before': time.time() + 0.2}, priority=10)
+    other = Request('https://example.com/other')
+    assert scheduler.enqueue_request(early)
+    assert scheduler.enqueue_request(other)
+
+    # The early request is set aside and the next one goes out meanwhile
+    assert scheduler.next_request() is other
+    assert scheduler.next_request() is None
+    assert scheduler.has_pending_requests()
+    assert len(scheduler) == 1
+
+    time.sleep(0.25)
+    assert scheduler.next_request() is early
+    assert not scheduler.has_pending_requests()
+
+
+def test_due_request_is_handed_out_first(scheduler):
+    due = Request('https://example.com/due', meta={'not_before': time.time() + 0.05})
+    assert scheduler.enqueue_request(due)
+    assert scheduler.next_request() is None
+
+    time.sleep(0.1)
+    assert scheduler.enqueue_request(Request('https://example.com/fresh', priority=10))
+    assert scheduler.next_request() is due
+    assert scheduler.next_request().url == 'https://example.com/fresh'
+
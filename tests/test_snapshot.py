@@ -0,0 +1,21 @@
+# Offline checks of the incremental crawl snapshot index
+
+import pytest
+
+from lagos_restaurants.snapshot import SnapshotIndex
+
+
+def test_saved_index_loads_back(tmp_path):
+    path = str(tmp_path / 'grid_snapshot.tsv')
+    index = SnapshotIndex()
+    index.set('p1', 'a1b2c3d4e5f60718', 'OPERATIONAL')
+    index.set('p2', '0123456789abcdef', None)
+    index.save(path)
+    assert SnapshotIndex.load(path).entries == index.entries
+
+
+def test_index_is_only_saved_as_tsv(tmp_path):
+    path = tmp_path / 'grid_snapshot.jsonl'
+    with pytest.raises(ValueError, match=r'\.tsv'):
+        SnapshotIndex().save(str(path))
+    assert not list(tmp_path.iterdir())